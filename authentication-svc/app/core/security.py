@@ -40,7 +40,8 @@ def create_access_token(
         "exp": int(exp.timestamp()),
         "jti": secrets.token_urlsafe(16),
     }
-    return jwt.encode(payload, settings.jwt_private_key, algorithm="RS256")
+    # kid matches the JWKS entry so verifiers can select the key without trial decoding
+    return jwt.encode(payload, settings.jwt_private_key, algorithm="RS256", headers={"kid": settings.token_issuer})
 
 def create_token_pair(
     *, user_id: uuid.UUID, role: str, org_ids: list[uuid.UUID]
@@ -9,6 +9,10 @@ class Settings(BaseSettings):
     # Auth (for organiser/attendee endpoints)
     auth_jwks_url: str = Field(..., alias="AUTH_JWKS_URL")
     token_issuer: str = Field("authentication-svc", alias="TOKEN_ISSUER")
+    jwks_ttl_seconds: int = Field(default=3600, alias="JWKS_TTL_SECONDS")
+    jwks_refresh_ahead_seconds: int = Field(default=300, alias="JWKS_REFRESH_AHEAD_SECONDS")
+    jwks_unknown_kid_cooldown_seconds: int = Field(default=30, alias="JWKS_UNKNOWN_KID_COOLDOWN_SECONDS")
+    claims_cache_max_entries: int = Field(default=10000, alias="CLAIMS_CACHE_MAX_ENTRIES")
 
     # NATS
     nats_urls: str = Field("nats://127.0.0.1:4222", alias="NATS_URLS")
@@ -9,6 +9,7 @@ from datetime import datetime
 from .db import init_db, async_session_maker
 from .core.config import get_settings
 from .core.nats import nats_connect, nats_close, subscribe_checkins
+from .core.jwks import get_keystore
 from .services.ingest import ingest_checkin_evt
 from .services.ranks import rebuild_ranks_for_period
 from .routers import attendance, leaderboard
@@ -23,6 +24,8 @@ def current_ym() -> int:
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
+    # JWKS keys are fetched and refreshed ahead of expiry in the background
+    await get_keystore().start()
 
     # NATS consumer: checkins.recorded -> ingest + increment aggregates
     if settings.enable_nats_consumer:
@@ -53,6 +56,7 @@ async def lifespan(app: FastAPI):
 
     yield
 
+    await get_keystore().stop()
     try:
         scheduler.shutdown(wait=False)
     except Exception:
@@ -0,0 +1,76 @@
+from __future__ import annotations
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
+
+from prometheus_client import Counter, Gauge
+
+from .config import get_settings
+
+_settings = get_settings()
+
+CLAIMS_CACHE_REQUESTS = Counter(
+    "auth_claims_cache_requests_total",
+    "Verified-token claims cache lookups",
+    ["result"],  # hit | miss
+)
+CLAIMS_CACHE_SIZE = Gauge("auth_claims_cache_entries", "Verified-token claims currently cached")
+
+class ClaimsCache:
+    """
+    Bounded LRU of verified access-token claims keyed by SHA-256 of the token.
+
+    Entries live until the token's own `exp`, so a cached hit never outlives
+    what a full RS256 verification would have accepted.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    @staticmethod
+    def _digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def get(self, token: str) -> Dict[str, Any] | None:
+        if self.max_entries <= 0:
+            return None
+        key = self._digest(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            CLAIMS_CACHE_REQUESTS.labels("miss").inc()
+            return None
+        exp, claims = entry
+        if exp <= time.time():
+            del self._entries[key]
+            CLAIMS_CACHE_SIZE.set(len(self._entries))
+            CLAIMS_CACHE_REQUESTS.labels("miss").inc()
+            return None
+        self._entries.move_to_end(key)
+        CLAIMS_CACHE_REQUESTS.labels("hit").inc()
+        # callers get their own copy; the cached dict stays pristine
+        return dict(claims)
+
+    def put(self, token: str, claims: Dict[str, Any]) -> None:
+        exp = claims.get("exp")
+        if self.max_entries <= 0 or not isinstance(exp, (int, float)):
+            return
+        key = self._digest(token)
+        self._entries[key] = (float(exp), dict(claims))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        CLAIMS_CACHE_SIZE.set(len(self._entries))
+
+    def clear(self) -> None:
+        self._entries.clear()
+        CLAIMS_CACHE_SIZE.set(0)
+
+_claims_cache: ClaimsCache | None = None
+
+def get_claims_cache() -> ClaimsCache:
+    global _claims_cache
+    if _claims_cache is None:
+        _claims_cache = ClaimsCache(max_entries=_settings.claims_cache_max_entries)
+    return _claims_cache
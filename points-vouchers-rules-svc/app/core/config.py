@@ -6,12 +6,50 @@ class Settings(BaseSettings):
     database_url: str = Field(..., alias="DATABASE_URL")
     auth_jwks_url: str = Field(..., alias="AUTH_JWKS_URL")
     token_issuer: str = Field("authentication-svc", alias="TOKEN_ISSUER")
+    jwks_ttl_seconds: int = Field(default=3600, alias="JWKS_TTL_SECONDS")
+    jwks_refresh_ahead_seconds: int = Field(default=300, alias="JWKS_REFRESH_AHEAD_SECONDS")
+    jwks_unknown_kid_cooldown_seconds: int = Field(default=30, alias="JWKS_UNKNOWN_KID_COOLDOWN_SECONDS")
+    claims_cache_max_entries: int = Field(default=10000, alias="CLAIMS_CACHE_MAX_ENTRIES")
 
     default_checkin_points: int = Field(10, alias="DEFAULT_CHECKIN_POINTS")
+    # per-org rule cache on the award path; writes invalidate it (and other replicas via NATS)
+    rule_cache_ttl_seconds: float = Field(default=300.0, alias="RULE_CACHE_TTL_SECONDS")
+    rule_cache_max_entries: int = Field(default=10000, alias="RULE_CACHE_MAX_ENTRIES")
 
     nats_urls: str = Field("nats://127.0.0.1:4222", alias="NATS_URLS")
     nats_subject_checkin: str = Field("checkins.recorded", alias="NATS_SUBJECT_CHECKIN")
+    nats_subject_rules: str = Field("rules.changed", alias="NATS_SUBJECT_RULES")
+    # JetStream: durable pull consumer for check-ins, redelivery backoff per attempt
+    # (comma-separated seconds; dead-lettered once exhausted)
+    nats_stream_checkins: str = Field("CHECKINS", alias="NATS_STREAM_CHECKINS")
+    nats_stream_checkins_dlq: str = Field("CHECKINS_DLQ", alias="NATS_STREAM_CHECKINS_DLQ")
+    nats_subject_checkin_dlq: str = Field("checkins.recorded.dlq", alias="NATS_SUBJECT_CHECKIN_DLQ")
+    nats_stream_max_age_seconds: float = Field(default=7 * 86400, alias="NATS_STREAM_MAX_AGE_SECONDS")
+    nats_durable_checkins: str = Field("points-svc", alias="NATS_DURABLE_CHECKINS")
+    nats_max_ack_pending: int = Field(default=1000, alias="NATS_MAX_ACK_PENDING")
+    nats_ack_wait_seconds: float = Field(default=30.0, alias="NATS_ACK_WAIT_SECONDS")
+    nats_fetch_batch: int = Field(default=200, alias="NATS_FETCH_BATCH")
+    nats_fetch_timeout_seconds: float = Field(default=1.0, alias="NATS_FETCH_TIMEOUT_SECONDS")
+    nats_retry_backoff_seconds: str = Field("1,5,30,120", alias="NATS_RETRY_BACKOFF_SECONDS")
+    nats_lag_interval_seconds: float = Field(default=5.0, alias="NATS_LAG_INTERVAL_SECONDS")
     enable_nats_consumer: bool = Field(default=True, alias="ENABLE_NATS_CONSUMER")
+    # check-in consumer micro-batches: flush at this many events or this long after the first,
+    # at most this many queued before the subscription is pushed back on
+    points_batch_max_size: int = Field(default=200, alias="POINTS_BATCH_MAX_SIZE")
+    points_batch_max_wait_ms: float = Field(default=20.0, alias="POINTS_BATCH_MAX_WAIT_MS")
+    points_batch_max_pending: int = Field(default=5000, alias="POINTS_BATCH_MAX_PENDING")
+    # worker shards (by user_id) flushing batches concurrently; 0 = the DB connection pool size
+    points_workers: int = Field(default=0, alias="POINTS_WORKERS")
+
+    # Redis (Idempotency-Key records)
+    redis_url: str = Field("redis://127.0.0.1:6379/0", alias="REDIS_URL")
+    # Idempotency-Key on retried POSTs: stored response TTL, claim TTL while the first
+    # request runs, how long a concurrent duplicate waits for it, largest response kept
+    idempotency_enabled: bool = Field(default=True, alias="IDEMPOTENCY_ENABLED")
+    idempotency_ttl_seconds: int = Field(default=86400, alias="IDEMPOTENCY_TTL_SECONDS")
+    idempotency_lock_seconds: int = Field(default=30, alias="IDEMPOTENCY_LOCK_SECONDS")
+    idempotency_wait_seconds: float = Field(default=10.0, alias="IDEMPOTENCY_WAIT_SECONDS")
+    idempotency_max_body_bytes: int = Field(default=262144, alias="IDEMPOTENCY_MAX_BODY_BYTES")
 
     class Config:
         env_file = ".env"
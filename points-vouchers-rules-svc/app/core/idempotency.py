@@ -0,0 +1,233 @@
+from __future__ import annotations
+import asyncio
+import base64
+import hashlib
+import json
+import re
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Iterable, Pattern, Tuple
+
+from prometheus_client import Counter
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config import get_settings
+from .redis import get_redis
+
+settings = get_settings()
+
+# Idempotency-Key support for retried POSTs (ASGI middleware, so the request
+# body can be fingerprinted and the response captured as it is sent).
+#   idem:{sha256(sub|method|path|key)}   sub = the caller's verified token subject
+#     {"state": "pending", "owner": ..., "fp": ...}                   while the first request runs
+#     {"state": "done", "fp": ..., "status": ..., "headers": ..., "body": ...}  afterwards, for the TTL
+# Duplicates replay the stored response (Idempotent-Replayed: true). Duplicates
+# arriving while the first one is still running wait for it instead of running
+# the handler again: on the same replica through a local future, across replicas
+# by polling the record. 5xx / 408 / 429 and crashed handlers are not stored,
+# so the next retry executes again. Requests whose token doesn't verify pass
+# straight through (the route rejects them).
+IDEMPOTENCY = Counter(
+    "idempotency_requests_total",
+    "Requests carrying an Idempotency-Key by outcome",
+    ["result"],  # executed | replayed | collapsed | mismatch | in_progress | invalid | unauthenticated | bypass
+)
+
+HEADER = "idempotency-key"
+_KEY_RE = re.compile(r"^[\x21-\x7e]{1,255}$")  # printable ASCII, no spaces
+_NOT_STORED = {408, 429}
+_SKIP_HEADERS = {b"date", b"server", b"content-length"}
+_POLL_MIN, _POLL_MAX = 0.02, 0.25
+
+# compare-and-set on our own pending record: store the response (ARGV[2]) or,
+# when ARGV[2] is empty, release the claim so a retry can execute
+_FINISH_LUA = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then return 0 end
+if ARGV[2] == '' then
+  redis.call('DEL', KEYS[1])
+else
+  redis.call('SET', KEYS[1], ARGV[2], 'EX', tonumber(ARGV[3]))
+end
+return 1
+"""
+_finish_script = None
+
+def _finish():
+    global _finish_script
+    if _finish_script is None:
+        _finish_script = get_redis().register_script(_FINISH_LUA)
+    return _finish_script
+
+def _json_response(status: int, detail: str, extra: Iterable[Tuple[bytes, bytes]] = ()) -> Tuple[int, list, bytes]:
+    body = json.dumps({"detail": detail}).encode("utf-8")
+    return status, [(b"content-type", b"application/json"), *extra], body
+
+async def _send_stored(send: Send, status: int, headers: list, body: bytes) -> None:
+    await send({"type": "http.response.start", "status": status,
+                "headers": [*headers, (b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
+
+def _decode(raw: str) -> dict | None:
+    try:
+        return json.loads(raw)
+    except Exception:
+        return None
+
+class IdempotencyMiddleware:
+    """
+    Honour an Idempotency-Key header on the given (method, path regex) routes.
+    Records are scoped to the `sub` of the token verified by `claims` (the
+    service's get_claims), so the same caller retrying with a refreshed token
+    still matches. Requests without the header, on other routes, with a token
+    that doesn't verify, or while Redis is down pass straight through.
+    """
+
+    def __init__(
+        self, app: ASGIApp, routes: Iterable[Tuple[str, str]],
+        claims: Callable[[str | None], Awaitable[Dict[str, Any]]],
+    ):
+        self.app = app
+        self.claims = claims
+        self.routes: list[Tuple[str, Pattern[str]]] = [(m.upper(), re.compile(p + r"\Z")) for m, p in routes]
+        self._inflight: Dict[str, asyncio.Future] = {}  # redis key -> resolved when the first request finishes (same-replica duplicates)
+
+    def _applies(self, scope: Scope) -> bool:
+        return scope["type"] == "http" and any(
+            scope["method"] == m and p.match(scope["path"]) for m, p in self.routes
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if not settings.idempotency_enabled or not self._applies(scope):
+            return await self.app(scope, receive, send)
+        headers = dict(scope["headers"])
+        raw_key = headers.get(HEADER.encode())
+        if raw_key is None:
+            return await self.app(scope, receive, send)
+        key = raw_key.decode("latin-1")
+        if not _KEY_RE.match(key):
+            IDEMPOTENCY.labels("invalid").inc()
+            return await _send_stored(send, *_json_response(400, "Invalid Idempotency-Key"))
+        authorization = headers.get(b"authorization")
+        try:
+            claims = await self.claims(authorization.decode("latin-1") if authorization is not None else None)
+            sub = str(claims["sub"])
+        except Exception:
+            IDEMPOTENCY.labels("unauthenticated").inc()
+            return await self.app(scope, receive, send)
+
+        # buffer the body (small JSON payloads) so it can be fingerprinted and replayed to the app
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+        body = b"".join(chunks)
+        fp = hashlib.sha256(scope.get("query_string", b"") + b"\n" + body).hexdigest()
+        scope_id = b"|".join([sub.encode(), scope["method"].encode(), scope["path"].encode(), raw_key])
+        rkey = "idem:" + hashlib.sha256(scope_id).hexdigest()
+
+        replayed = False
+        async def replay_receive() -> Message:
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        deadline = time.monotonic() + settings.idempotency_wait_seconds
+        poll = _POLL_MIN
+        waited = False
+        while True:
+            owner = uuid.uuid4().hex
+            pending = json.dumps({"state": "pending", "owner": owner, "fp": fp})
+            try:
+                # claim, or get the existing record, in one round trip (SET NX GET, Redis >= 7)
+                existing = await get_redis().set(rkey, pending, nx=True, get=True, ex=settings.idempotency_lock_seconds)
+            except Exception:
+                IDEMPOTENCY.labels("bypass").inc()
+                return await self.app(scope, replay_receive, send)
+            if existing is None:
+                return await self._execute(scope, replay_receive, send, rkey, pending, fp)
+
+            record = _decode(existing) or {}
+            if record.get("fp") != fp:
+                IDEMPOTENCY.labels("mismatch").inc()
+                return await _send_stored(send, *_json_response(
+                    422, "Idempotency-Key was already used with a different request"))
+            if record.get("state") == "done":
+                IDEMPOTENCY.labels("collapsed" if waited else "replayed").inc()
+                return await self._replay(send, record)
+
+            # still running somewhere: wait for it rather than executing again
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                IDEMPOTENCY.labels("in_progress").inc()
+                return await _send_stored(send, *_json_response(
+                    409, "A request with this Idempotency-Key is still in progress",
+                    [(b"retry-after", b"1")]))
+            waited = True
+            local = self._inflight.get(rkey)
+            if local is not None:
+                try:
+                    await asyncio.wait_for(asyncio.shield(local), remaining)
+                except Exception:
+                    pass  # timed out or the first request failed: re-check the record
+            else:
+                await asyncio.sleep(min(poll, remaining))
+                poll = min(poll * 2, _POLL_MAX)
+
+    async def _execute(self, scope: Scope, receive: Receive, send: Send, rkey: str, pending: str, fp: str) -> None:
+        IDEMPOTENCY.labels("executed").inc()
+        done: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._inflight[rkey] = done
+        status = 0
+        resp_headers: list = []
+        body = bytearray()
+        finished = False
+
+        async def finish(record: str) -> None:
+            nonlocal finished
+            if finished:
+                return
+            finished = True
+            try:
+                await _finish()(keys=[rkey], args=[pending, record, settings.idempotency_ttl_seconds])
+            except Exception:
+                pass
+            finally:
+                if self._inflight.get(rkey) is done:
+                    del self._inflight[rkey]
+                if not done.done():
+                    done.set_result(None)
+
+        async def capture(message: Message) -> None:
+            nonlocal status, resp_headers
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                resp_headers = [(k, v) for k, v in message.get("headers", []) if k.lower() not in _SKIP_HEADERS]
+            elif message["type"] == "http.response.body" and not finished:
+                body.extend(message.get("body", b""))
+                if len(body) > settings.idempotency_max_body_bytes:
+                    await finish("")  # too large to keep: just don't dedupe this one
+            await send(message)
+            # store once the response is complete, before any background tasks run
+            if message["type"] == "http.response.body" and not message.get("more_body") and not finished:
+                keep = status < 500 and status not in _NOT_STORED
+                await finish(json.dumps({
+                    "state": "done", "fp": fp, "status": status,
+                    "headers": [[k.decode("latin-1"), v.decode("latin-1")] for k, v in resp_headers],
+                    "body": base64.b64encode(bytes(body)).decode("ascii"),
+                }) if keep else "")
+
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            await finish("")  # no-op if already stored; releases the claim if the handler failed
+
+    async def _replay(self, send: Send, record: dict) -> None:
+        headers = [(k.encode("latin-1"), v.encode("latin-1")) for k, v in record.get("headers", [])]
+        headers.append((b"idempotent-replayed", b"true"))
+        await _send_stored(send, int(record["status"]), headers, base64.b64decode(record.get("body", "")))
@@ -1,7 +1,14 @@
 from __future__ import annotations
+import asyncio
 import json
+import time
 from typing import Sequence, Awaitable, Callable
 from nats.aio.client import Client as NATS
+from nats.aio.msg import Msg
+from nats.errors import TimeoutError as NatsTimeoutError
+from nats.js.api import AckPolicy, ConsumerConfig, DeliverPolicy, StreamConfig
+from nats.js.errors import NotFoundError
+from prometheus_client import Counter, Gauge
 from ..core.config import get_settings
 
 _settings = get_settings()
@@ -19,9 +26,230 @@ async def nats_close():
     except Exception:
         pass
 
-async def subscribe_checkins(cb: Callable[[dict], Awaitable[None]]):
+async def publish_event(subject: str, evt: dict):
+    await nats_connect()
+    await _nats.publish(subject, json.dumps(evt).encode("utf-8"))
+
+async def subscribe_json(subject: str, cb: Callable[[dict], Awaitable[None]]):
+    """Subscribe to `subject` and invoke cb(evt_dict) for each JSON message."""
+    await nats_connect()
+    async def _handler(msg):
+        try:
+            await cb(json.loads(msg.data))
+        except Exception:
+            pass
+    await _nats.subscribe(subject, cb=_handler)
+
+# checkins.recorded is consumed through JetStream, so events published while
+# this service is down or deploying wait in the stream instead of being lost:
+#   stream   NATS_STREAM_CHECKINS on NATS_SUBJECT_CHECKIN (created if missing)
+#   consumer durable pull consumer NATS_DURABLE_CHECKINS, explicit acks, at most
+#            NATS_MAX_ACK_PENDING delivered and unacknowledged across replicas
+#   retries  nak with the NATS_RETRY_BACKOFF_SECONDS delay for the delivery count;
+#            once those are used up (or the payload is unusable) the message is
+#            copied to NATS_SUBJECT_CHECKIN_DLQ (own stream) and terminated
+#   progress deliveries still unsettled (e.g. queued in the batcher) get an
+#            in-progress ack every NATS_ACK_WAIT_SECONDS / 3, so a slow batch
+#            doesn't trigger an ack_wait redelivery that would use up a retry
+CONSUMER_LAG = Gauge(
+    "points_checkin_consumer_lag",
+    "checkins.recorded messages in the stream not yet delivered to the durable consumer",
+)
+CONSUMER_ACK_PENDING = Gauge(
+    "points_checkin_consumer_ack_pending",
+    "checkins.recorded messages delivered but not yet acknowledged",
+)
+CONSUMER_MESSAGES = Counter(
+    "points_checkin_consumer_messages_total",
+    "checkins.recorded deliveries by outcome",
+    ["result"],  # ack | retry | dead_letter | fetch_error
+)
+
+def _backoff() -> list[float]:
+    return [float(x) for x in _settings.nats_retry_backoff_seconds.split(",") if x.strip()]
+
+async def ensure_checkin_streams():
+    """Create the check-in stream and its dead-letter stream if they don't exist yet."""
+    await nats_connect()
+    js = _nats.jetstream()
+    for name, subject in ((_settings.nats_stream_checkins, _settings.nats_subject_checkin),
+                          (_settings.nats_stream_checkins_dlq, _settings.nats_subject_checkin_dlq)):
+        try:
+            await js.stream_info(name)
+        except NotFoundError:
+            await js.add_stream(StreamConfig(
+                name=name, subjects=[subject], max_age=_settings.nats_stream_max_age_seconds,
+            ))
+
+class Delivery:
+    """One JetStream delivery: ack() once handled, retry() to redeliver after a backoff, reject() to dead-letter."""
+
+    def __init__(self, msg: Msg, unsettled: set | None = None):
+        self.msg = msg
+        try:
+            self.num_delivered = msg.metadata.num_delivered
+        except Exception:
+            self.num_delivered = 1
+        self._unsettled = unsettled  # the consumer keeps these alive until settled
+        if unsettled is not None:
+            unsettled.add(self)
+
+    def _settled(self):
+        if self._unsettled is not None:
+            self._unsettled.discard(self)
+
+    async def ack(self):
+        try:
+            await self.msg.ack()
+        finally:
+            self._settled()
+        CONSUMER_MESSAGES.labels("ack").inc()
+
+    async def retry(self, reason: str = "handler failed"):
+        backoff = _backoff()
+        if self.num_delivered > len(backoff):
+            return await self.reject(reason)
+        try:
+            await self.msg.nak(delay=backoff[self.num_delivered - 1])
+        finally:
+            self._settled()
+        CONSUMER_MESSAGES.labels("retry").inc()
+
+    async def reject(self, reason: str):
+        try:
+            await self._reject(reason)
+        finally:
+            self._settled()
+
+    async def _reject(self, reason: str):
+        headers = {"Dlq-Reason": reason[:200], "Dlq-Deliveries": str(self.num_delivered)}
+        try:
+            headers["Dlq-Stream-Seq"] = str(self.msg.metadata.sequence.stream)
+        except Exception:
+            pass
+        try:
+            await _nats.jetstream().publish(_settings.nats_subject_checkin_dlq, self.msg.data, headers=headers)
+        except Exception:
+            # dead-letter stream unavailable: keep the message rather than drop it
+            await self.msg.nak(delay=_backoff()[-1] if _backoff() else None)
+            CONSUMER_MESSAGES.labels("retry").inc()
+            return
+        await self.msg.term()
+        CONSUMER_MESSAGES.labels("dead_letter").inc()
+
+class CheckinConsumer:
+    """
+    Pull loop for the durable check-in consumer. Each message is handed to
+    cb(evt, delivery); the callback owns the ack. Fetching only continues while
+    cb keeps up (it may block), and the server never hands out more than
+    NATS_MAX_ACK_PENDING unacknowledged messages.
+    """
+
+    def __init__(self, cb: Callable[[dict, Delivery], Awaitable[None]]):
+        self.cb = cb
+        self._sub = None
+        self._task: asyncio.Task | None = None
+        self._keepalive_task: asyncio.Task | None = None
+        self._unsettled: set[Delivery] = set()
+        self._lag_at = 0.0
+
+    async def _update_lag(self):
+        if time.monotonic() < self._lag_at:
+            return
+        self._lag_at = time.monotonic() + _settings.nats_lag_interval_seconds
+        try:
+            info = await self._sub.consumer_info()
+        except Exception:
+            return
+        CONSUMER_LAG.set(info.num_pending or 0)
+        CONSUMER_ACK_PENDING.set(info.num_ack_pending or 0)
+
+    async def _run(self):
+        while True:
+            await self._update_lag()
+            try:
+                msgs = await self._sub.fetch(_settings.nats_fetch_batch, timeout=_settings.nats_fetch_timeout_seconds)
+            except (NatsTimeoutError, asyncio.TimeoutError):
+                continue  # nothing to do
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                CONSUMER_MESSAGES.labels("fetch_error").inc()
+                await asyncio.sleep(1.0)  # reconnecting, or the stream is being recreated
+                continue
+            for i, msg in enumerate(msgs):
+                try:
+                    await self._handle(msg)
+                except asyncio.CancelledError:
+                    for rest in msgs[i:]:  # stopping: hand the rest back now rather than after ack_wait
+                        try:
+                            await rest.nak()
+                        except Exception:
+                            pass
+                    raise
+                except Exception:
+                    pass  # ack/nak failed (connection lost): redelivered after ack_wait
+
+    async def _keepalive(self):
+        interval = _settings.nats_ack_wait_seconds / 3
+        while True:
+            await asyncio.sleep(interval)
+            for delivery in list(self._unsettled):
+                try:
+                    await delivery.msg.in_progress()
+                except Exception:
+                    pass  # connection lost: redelivered after ack_wait, as before
+
+    async def _handle(self, msg: Msg):
+        delivery = Delivery(msg, self._unsettled)
+        try:
+            evt = json.loads(msg.data)
+            if not isinstance(evt, dict):
+                raise ValueError("not a JSON object")
+        except Exception as e:
+            return await delivery.reject(f"malformed payload: {e}")
+        try:
+            await self.cb(evt, delivery)
+        except Exception as e:
+            await delivery.retry(f"handler failed: {e}")
+
+    async def start(self):
+        await ensure_checkin_streams()
+        self._sub = await _nats.jetstream().pull_subscribe(
+            _settings.nats_subject_checkin,
+            durable=_settings.nats_durable_checkins,
+            stream=_settings.nats_stream_checkins,
+            config=ConsumerConfig(
+                ack_policy=AckPolicy.EXPLICIT,
+                deliver_policy=DeliverPolicy.ALL,
+                ack_wait=_settings.nats_ack_wait_seconds,
+                max_ack_pending=_settings.nats_max_ack_pending,
+                max_deliver=-1,  # dead-lettering is done here, so nothing is dropped silently
+            ),
+        )
+        self._task = asyncio.create_task(self._run())
+        self._keepalive_task = asyncio.create_task(self._keepalive())
+
+    async def stop(self):
+        """Stop fetching; messages already handed to cb are still acked through their Delivery."""
+        for task in (self._task, self._keepalive_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+        self._task = self._keepalive_task = None
+        if self._sub is not None:
+            try:
+                await self._sub.unsubscribe()  # the durable consumer itself stays on the server
+            except Exception:
+                pass
+            self._sub = None
+
+async def subscribe_checkins(cb: Callable[[dict, Delivery], Awaitable[None]]) -> CheckinConsumer:
     """
-    Subscribe to checkins.recorded and invoke cb(evt_dict).
+    Consume checkins.recorded from JetStream and invoke cb(evt_dict, delivery).
     evt example:
       {
         "trail_id": "...",
@@ -32,11 +260,6 @@ async def subscribe_checkins(cb: Callable[[dict], Awaitable[None]]):
       }
     """
     await nats_connect()
-    async def _handler(msg):
-        try:
-            data = json.loads(msg.data)
-            await cb(data)
-        except Exception:
-            # swallow to avoid breaking subscription; add logging if you want
-            pass
-    await _nats.subscribe(_settings.nats_subject_checkin, cb=_handler)
+    consumer = CheckinConsumer(cb)
+    await consumer.start()
+    return consumer
@@ -1,5 +1,6 @@
 from __future__ import annotations
 from typing import AsyncGenerator
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
 from .core.config import get_settings
@@ -9,9 +10,18 @@ settings = get_settings()
 engine = create_async_engine(settings.database_url, echo=False, future=True)
 async_session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
+# columns added after the first release; create_all() only creates missing tables
+_PG_UPGRADES = (
+    "ALTER TABLE points_ledger ADD COLUMN IF NOT EXISTS dedupe_key VARCHAR(160)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_ledger_dedupe_key ON points_ledger (dedupe_key)",
+)
+
 async def init_db() -> None:
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        if conn.dialect.name == "postgresql":
+            for ddl in _PG_UPGRADES:
+                await conn.execute(text(ddl))
 
 async def get_session() -> AsyncGenerator[AsyncSession, None]:
     async with async_session_maker() as session:
@@ -5,51 +5,49 @@ from fastapi.middleware.cors import CORSMiddleware
 from prometheus_fastapi_instrumentator import Instrumentator
 
 from .routers import points, vouchers, rules
-from .db import init_db, async_session_maker
+from .db import init_db
 from .core.config import get_settings
-from .core.nats import nats_connect, nats_close, subscribe_checkins
-from .services.points import award_checkin_points
+from .core.nats import nats_connect, nats_close, subscribe_checkins, subscribe_json
+from .core.jwks import get_keystore
+from .core.idempotency import IdempotencyMiddleware
+from .deps import get_claims
+from .services.checkin_batcher import get_checkin_batcher
+from .services.rule_cache import apply_rules_event
 
 settings = get_settings()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
+    # JWKS keys are fetched and refreshed ahead of expiry in the background
+    await get_keystore().start()
+
+    # rule writes on other replicas invalidate this replica's rule cache (TTL covers NATS being down)
+    try:
+        await subscribe_json(settings.nats_subject_rules, apply_rules_event)
+    except Exception:
+        pass
 
     # Start NATS consumer (optional toggle)
+    batcher = get_checkin_batcher()
+    consumer = None
     if settings.enable_nats_consumer:
         try:
             await nats_connect()
-
-            async def handle_checkin(evt: dict):
-                import uuid
-                # expected keys: trail_id, org_id, user_id
-                try:
-                    trail_id = uuid.UUID(evt["trail_id"])
-                    org_id = uuid.UUID(evt["org_id"])
-                    user_id = uuid.UUID(evt["user_id"])
-                except Exception:
-                    return  # malformed payload
-
-                # IMPORTANT: idempotency is recommended at your award layer.
-                # If award_checkin_points is already idempotent (e.g., checks ledger),
-                # this is safe. Otherwise consider adding a guard there.
-                async with async_session_maker() as db:
-                    await award_checkin_points(
-                        db,
-                        user_id=user_id,
-                        org_id=org_id,
-                        trail_id=trail_id,
-                        details="qr-checkin-nats"
-                    )
-
-            await subscribe_checkins(handle_checkin)
+            # durable JetStream consumer; events are awarded in micro-batches and acked after
+            # commit. Redeliveries are harmless: the ledger dedupes on the producer's idempotency_key
+            await batcher.start()
+            consumer = await subscribe_checkins(batcher.submit)
         except Exception:
             # You can log the error; service still runs without NATS
             pass
 
     yield
 
+    await get_keystore().stop()
+    if consumer is not None:
+        await consumer.stop()
+    await batcher.stop()  # write and ack what was already fetched
     try:
         await nats_close()
     except Exception:
@@ -57,6 +55,10 @@ async def lifespan(app: FastAPI):
 
 app = FastAPI(title="points-vouchers-rules-svc", lifespan=lifespan)
 
+# retried redemptions with the same Idempotency-Key replay the first response instead of deducting again
+# (added before CORS so CORS wraps replays too)
+app.add_middleware(IdempotencyMiddleware, routes=[("POST", r"/vouchers/[^/]+/redeem")], claims=get_claims)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
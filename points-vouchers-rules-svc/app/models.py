@@ -51,12 +51,15 @@ class PointsLedger(Base):
     reason: Mapped[str] = mapped_column(String(64), nullable=False)  # e.g., "checkin", "voucher_redeem", "manual"
     trail_id: Mapped[uuid.UUID | None] = mapped_column(nullable=True)
     details: Mapped[str | None] = mapped_column(Text)
+    # one ledger row per source event, e.g. "checkin:{trail_id}:{user_id}"; NULL for manual entries
+    dedupe_key: Mapped[str | None] = mapped_column(String(160), nullable=True)
     occurred_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow)
 
     __table_args__ = (
         Index("ix_ledger_user", "user_id"),
         Index("ix_ledger_org", "org_id"),
         Index("ix_ledger_reason", "reason"),
+        Index("uq_ledger_dedupe_key", "dedupe_key", unique=True),
     )
 
 class Rule(Base):
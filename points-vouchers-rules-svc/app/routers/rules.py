@@ -7,6 +7,7 @@ from sqlalchemy import select
 from ..deps import get_db, get_claims
 from ..models import Rule, RuleType
 from ..schemas import RuleCreate, RuleUpdate, RuleRead
+from ..services.rule_cache import rules_changed
 
 router = APIRouter(prefix="/orgs/{org_id}/rules", tags=["rules"])
 
@@ -33,6 +34,7 @@ async def create_rule(org_id: uuid.UUID, payload: RuleCreate, claims: dict = Dep
         raise HTTPException(status_code=400, detail="Invalid rule type")
     r = Rule(org_id=org_id, type=rtype, points=payload.points, name=payload.name, description=payload.description, active=payload.active)
     db.add(r); await db.commit(); await db.refresh(r)
+    await rules_changed(org_id)
     return RuleRead(id=r.id, org_id=r.org_id, type=r.type.value, points=r.points, name=r.name, description=r.description, active=r.active)
 
 @router.patch("/{rule_id}", response_model=RuleRead)
@@ -46,4 +48,5 @@ async def update_rule(org_id: uuid.UUID, rule_id: uuid.UUID, payload: RuleUpdate
     if payload.description is not None: r.description = payload.description
     if payload.active is not None: r.active = payload.active
     await db.commit(); await db.refresh(r)
+    await rules_changed(org_id)
     return RuleRead(id=r.id, org_id=r.org_id, type=r.type.value, points=r.points, name=r.name, description=r.description, active=r.active)
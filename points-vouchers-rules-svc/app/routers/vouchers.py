@@ -5,8 +5,9 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
 
 from ..deps import get_db, get_claims
-from ..models import Voucher, VoucherStatus, Redemption, UserPoints, PointsLedger
+from ..models import Voucher, VoucherStatus, Redemption
 from ..schemas import VoucherCreate, VoucherUpdate, VoucherRead, RedemptionRead
+from ..services.vouchers import RedemptionRejected, redeem_voucher as redeem
 
 router = APIRouter(prefix="/vouchers", tags=["vouchers"])
 
@@ -54,26 +55,12 @@ async def update_voucher(voucher_id: uuid.UUID, payload: VoucherUpdate, claims:
 @router.post("/{voucher_id}/redeem", response_model=RedemptionRead, status_code=201)
 async def redeem_voucher(voucher_id: uuid.UUID, claims: dict = Depends(get_claims), db: AsyncSession = Depends(get_db)):
     user_id = uuid.UUID(claims["sub"])
-    v = (await db.execute(select(Voucher).where(Voucher.id == voucher_id))).scalar_one_or_none()
-    if not v: raise HTTPException(status_code=404, detail="Voucher not found")
-    if v.status != VoucherStatus.ACTIVE:
-        raise HTTPException(status_code=400, detail="Voucher not active")
-    if v.total_quantity is not None and v.redeemed_count >= v.total_quantity:
-        raise HTTPException(status_code=409, detail="Voucher exhausted")
-
-    # points balance
-    up = (await db.execute(select(UserPoints).where(UserPoints.user_id == user_id, UserPoints.org_id == v.org_id))).scalar_one_or_none()
-    if not up or up.balance < v.points_cost:
-        raise HTTPException(status_code=400, detail="Insufficient points")
-
-    # deduct & log
-    up.balance -= v.points_cost
-    red = Redemption(voucher_id=v.id, user_id=user_id, org_id=v.org_id)
-    v.redeemed_count += 1
-    db.add(red)
-    db.add(PointsLedger(user_id=user_id, org_id=v.org_id, delta=-v.points_cost, reason="voucher_redeem", details=f"voucher:{v.code}"))
-    await db.commit(); await db.refresh(red)
-    return RedemptionRead(id=red.id, voucher_id=red.voucher_id, user_id=red.user_id, org_id=red.org_id, status=red.status.value, redeemed_at=red.redeemed_at)
+    # stock and balance are checked and written atomically (no oversell under a rush on a limited voucher)
+    try:
+        red = await redeem(db, voucher_id=voucher_id, user_id=user_id)
+    except RedemptionRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return RedemptionRead(id=red.id, voucher_id=red.voucher_id, user_id=red.user_id, org_id=red.org_id, status=red.status, redeemed_at=red.redeemed_at)
 
 @router.get("/users/me/redemptions", response_model=list[RedemptionRead])
 async def my_redemptions(claims: dict = Depends(get_claims), db: AsyncSession = Depends(get_db)):
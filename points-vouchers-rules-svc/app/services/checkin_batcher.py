@@ -0,0 +1,276 @@
+from __future__ import annotations
+import asyncio
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, Tuple
+
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.config import get_settings
+from ..core.nats import Delivery
+from ..db import async_session_maker, engine
+from ..models import PointsLedger, RuleType, UserPoints, utcnow
+from .points import award_checkin_points, checkin_dedupe_key
+from .rule_cache import get_rule_cache
+
+settings = get_settings()
+
+# checkins.recorded consumer: events are queued and flushed in micro-batches of
+# up to POINTS_BATCH_MAX_SIZE events or POINTS_BATCH_MAX_WAIT_MS after the first
+# one, whichever comes first, by POINTS_WORKERS shards keyed on user_id (so each
+# user's events stay in order). One flush is one transaction:
+#   rules     every org in the batch, from the rule cache (misses in one query)
+#   ledger    one multi-row INSERT ... ON CONFLICT (dedupe_key) DO NOTHING RETURNING
+#   balances  one multi-row upsert of the per-(user, org) sums of the inserted rows
+# and events are acknowledged only after it commits. Events that could not be
+# written are handed back for a delayed redelivery (dead-lettered once retries run out).
+BATCH_SIZE = Histogram(
+    "points_checkin_batch_size",
+    "Check-in events per flushed batch",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 200, 500, 1000),
+)
+BATCH_FLUSH_SECONDS = Histogram(
+    "points_checkin_batch_flush_seconds",
+    "Time to write one batch (rules, ledger, balances, commit)",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+BATCH_LATENCY_SECONDS = Histogram(
+    "points_checkin_batch_latency_seconds",
+    "Time from an event being queued to its acknowledgement",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+BATCH_BACKLOG = Gauge(
+    "points_checkin_batch_backlog",
+    "Check-in events queued and not yet flushed, per worker shard",
+    ["shard"],
+)
+BATCH_WORKERS = Gauge("points_checkin_batch_workers", "Check-in worker shards")
+BATCH_BUSY = Gauge("points_checkin_batch_busy_workers", "Check-in worker shards currently writing a batch")
+CHECKIN_EVENTS = Counter(
+    "points_checkin_events_total",
+    "Consumed check-in events by outcome",
+    ["result"],  # awarded | duplicate | no_points | invalid | failed
+)
+
+@dataclass
+class _Pending:
+    user_id: uuid.UUID
+    org_id: uuid.UUID
+    trail_id: uuid.UUID
+    dedupe_key: str
+    delivery: Delivery | None = None
+    queued_at: float = field(default_factory=time.perf_counter)
+
+def _parse(evt: dict, delivery: Delivery | None) -> _Pending | None:
+    # expected keys: trail_id, org_id, user_id (+ idempotency_key "trail_id:user_id")
+    try:
+        trail_id = uuid.UUID(evt["trail_id"])
+        org_id = uuid.UUID(evt["org_id"])
+        user_id = uuid.UUID(evt["user_id"])
+    except Exception:
+        return None
+    key = f"checkin:{evt['idempotency_key']}" if evt.get("idempotency_key") else checkin_dedupe_key(trail_id, user_id)
+    return _Pending(user_id=user_id, org_id=org_id, trail_id=trail_id, dedupe_key=key, delivery=delivery)
+
+async def award_checkin_batch(db: AsyncSession, events: list[_Pending], *, details: str | None = None) -> Dict[str, str]:
+    """
+    Award a batch of check-ins in one transaction. Returns dedupe_key ->
+    "awarded" | "duplicate" | "no_points". Rows are written in key order so
+    concurrent batches (other replicas, redeliveries) lock in the same order.
+    """
+    by_key: Dict[str, _Pending] = {}
+    for ev in events:
+        by_key.setdefault(ev.dedupe_key, ev)  # the same check-in twice in one batch
+    rules = await get_rule_cache().get_many(db, {ev.org_id for ev in by_key.values()})
+    outcome: Dict[str, str] = {}
+    now = utcnow()
+    rows = []
+    for key in sorted(by_key):
+        ev = by_key[key]
+        pts = rules[ev.org_id].get(RuleType.CHECKIN, settings.default_checkin_points)
+        if pts <= 0:
+            outcome[key] = "no_points"
+            continue
+        rows.append(dict(
+            id=uuid.uuid4(), user_id=ev.user_id, org_id=ev.org_id, delta=pts, reason="checkin",
+            trail_id=ev.trail_id, details=details, occurred_at=now, dedupe_key=key,
+        ))
+
+    deltas: Dict[Tuple[uuid.UUID, uuid.UUID], int] = defaultdict(int)
+    if rows:
+        ledger = PointsLedger.__table__
+        inserted = (await db.execute(
+            pg_insert(ledger).values(rows)
+            .on_conflict_do_nothing(index_elements=["dedupe_key"])
+            .returning(ledger.c.dedupe_key, ledger.c.user_id, ledger.c.org_id, ledger.c.delta)
+        )).all()
+        for key, user_id, org_id, delta in inserted:
+            outcome[key] = "awarded"
+            deltas[(user_id, org_id)] += delta
+    for row in rows:
+        outcome.setdefault(row["dedupe_key"], "duplicate")
+
+    if deltas:
+        balances = UserPoints.__table__
+        up = pg_insert(balances).values([
+            dict(id=uuid.uuid4(), user_id=user_id, org_id=org_id, balance=delta, updated_at=now)
+            for (user_id, org_id), delta in sorted(deltas.items())
+        ])
+        await db.execute(up.on_conflict_do_update(
+            index_elements=["user_id", "org_id"],
+            set_={"balance": balances.c.balance + up.excluded.balance, "updated_at": up.excluded.updated_at},
+        ))
+    await db.commit()
+    return outcome
+
+class CheckinBatcher:
+    """
+    Micro-batching consumer for checkins.recorded, sharded by user. submit()
+    only queues (the pull loop can fetch the next messages at once) onto the
+    shard for the event's user_id; each shard has its own flush task, so one
+    slow transaction only holds up its own users. A user's events always land
+    on the same shard, so they are written in order and two shards never
+    update the same balance row. Bounded queues stop the fetching when the
+    database falls behind.
+    """
+
+    def __init__(self, max_size: int = 200, max_wait_ms: float = 20.0, max_pending: int = 5000, workers: int = 1):
+        self.max_size = max(1, max_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.workers = max(1, workers)
+        per_shard = max(max_pending // self.workers, self.max_size)
+        self._queues: list[asyncio.Queue[_Pending | None]] = [asyncio.Queue(maxsize=per_shard) for _ in range(self.workers)]
+        self._tasks: list[asyncio.Task] = []
+        BATCH_WORKERS.set(self.workers)
+
+    def _shard(self, user_id: uuid.UUID) -> int:
+        return user_id.int % self.workers
+
+    async def submit(self, evt: dict, delivery: Delivery | None = None) -> None:
+        pending = _parse(evt, delivery)
+        if pending is None:
+            CHECKIN_EVENTS.labels("invalid").inc()
+            if delivery is not None:
+                await delivery.reject("invalid check-in event")  # redelivering it won't help
+            return
+        shard = self._shard(pending.user_id)
+        queue = self._queues[shard]
+        await queue.put(pending)
+        BATCH_BACKLOG.labels(str(shard)).set(queue.qsize())
+
+    async def _collect(self, queue: asyncio.Queue) -> Tuple[list[_Pending], bool]:
+        """Next batch from one shard, and whether stop() was requested."""
+        first = await queue.get()
+        if first is None:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_size:
+            try:
+                item = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+    async def _flush(self, batch: list[_Pending]) -> None:
+        BATCH_SIZE.observe(len(batch))
+        started = time.perf_counter()
+        outcome: Dict[str, str] = {}
+        try:
+            async with async_session_maker() as db:
+                outcome = await award_checkin_batch(db, batch, details="qr-checkin-nats")
+        except Exception:
+            # e.g. a deadlock with another replica, or one bad row: award one by one
+            for ev in batch:
+                if ev.dedupe_key in outcome:
+                    continue
+                try:
+                    async with async_session_maker() as db:
+                        pts = await award_checkin_points(
+                            db, user_id=ev.user_id, org_id=ev.org_id, trail_id=ev.trail_id,
+                            details="qr-checkin-nats", dedupe_key=ev.dedupe_key,
+                        )
+                    outcome[ev.dedupe_key] = "awarded" if pts else "duplicate"
+                except Exception:
+                    pass
+        BATCH_FLUSH_SECONDS.observe(time.perf_counter() - started)
+
+        counted: set[str] = set()
+        for ev in batch:
+            result = outcome.get(ev.dedupe_key)
+            if result is None:
+                CHECKIN_EVENTS.labels("failed").inc()
+                if ev.delivery is not None:
+                    try:
+                        await ev.delivery.retry()
+                    except Exception:
+                        pass  # redelivered after ack_wait instead
+                continue
+            # repeats of one check-in within the batch count as duplicates
+            CHECKIN_EVENTS.labels(result if ev.dedupe_key not in counted else "duplicate").inc()
+            counted.add(ev.dedupe_key)
+            if ev.delivery is not None:
+                try:
+                    await ev.delivery.ack()
+                except Exception:
+                    pass  # redelivered later; the ledger dedupes it
+            BATCH_LATENCY_SECONDS.observe(time.perf_counter() - ev.queued_at)
+
+    async def _run(self, shard: int) -> None:
+        queue = self._queues[shard]
+        while True:
+            batch, stopping = await self._collect(queue)
+            BATCH_BACKLOG.labels(str(shard)).set(queue.qsize())
+            if batch:
+                BATCH_BUSY.inc()
+                try:
+                    await self._flush(batch)
+                except Exception:
+                    pass  # unacknowledged events are redelivered after ack_wait
+                finally:
+                    BATCH_BUSY.dec()
+            if stopping:
+                return
+
+    async def start(self) -> None:
+        if not self._tasks or all(t.done() for t in self._tasks):
+            self._tasks = [asyncio.create_task(self._run(i)) for i in range(self.workers)]
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Flush what is queued, then stop (call after the subscription is drained)."""
+        if not self._tasks:
+            return
+        for queue, task in zip(self._queues, self._tasks):
+            if not task.done():
+                await queue.put(None)
+        try:
+            await asyncio.wait_for(asyncio.gather(*self._tasks, return_exceptions=True), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError, Exception):
+            pass
+        self._tasks = []
+
+_batcher: CheckinBatcher | None = None
+
+def get_checkin_batcher() -> CheckinBatcher:
+    global _batcher
+    if _batcher is None:
+        _batcher = CheckinBatcher(
+            max_size=settings.points_batch_max_size,
+            max_wait_ms=settings.points_batch_max_wait_ms,
+            max_pending=settings.points_batch_max_pending,
+            # one shard per pooled connection unless set: more would only wait for a connection
+            workers=settings.points_workers or engine.pool.size(),
+        )
+    return _batcher
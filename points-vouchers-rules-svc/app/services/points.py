@@ -1,21 +1,19 @@
 from __future__ import annotations
 import uuid
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import select, text
 
 from ..core.config import get_settings
-from ..models import UserPoints, PointsLedger, Rule, RuleType
+from ..models import UserPoints, PointsLedger, RuleType, utcnow
+from .rule_cache import get_rule_cache
 
 settings = get_settings()
 
 async def _get_rule_points(db: AsyncSession, org_id: uuid.UUID, rtype: RuleType) -> int:
-    # prefer an active rule; otherwise default
-    row = (await db.execute(
-        select(Rule).where(Rule.org_id == org_id, Rule.type == rtype, Rule.active == True)
-        .order_by(Rule.updated_at.desc())
-    )).scalars().first()
-    if row:
-        return row.points
+    # prefer an active rule (per-org cache, no DB round trip on a hit); otherwise default
+    rules = await get_rule_cache().get(db, org_id)
+    if rtype in rules:
+        return rules[rtype]
     # defaults
     if rtype == RuleType.CHECKIN:
         return settings.default_checkin_points
@@ -30,15 +28,53 @@ async def _get_or_create_balance(db: AsyncSession, user_id: uuid.UUID, org_id: u
     await db.flush()
     return up
 
-async def award_checkin_points(db: AsyncSession, *, user_id: uuid.UUID, org_id: uuid.UUID, trail_id: uuid.UUID, details: str | None = None) -> int:
+def checkin_dedupe_key(trail_id: uuid.UUID | str, user_id: uuid.UUID | str) -> str:
+    """Same value for the NATS event (its idempotency_key is "trail_id:user_id") and the HTTP ingest."""
+    return f"checkin:{trail_id}:{user_id}"
+
+# Hand-written because SQLAlchemy never caches the compiled form of a
+# postgresql insert(...).on_conflict_*() construct (its Insert sets
+# inherit_cache = False), so the Core version was recompiled on every award.
+_AWARD_CHECKIN = text("""
+WITH led AS (
+    INSERT INTO points_ledger (id, user_id, org_id, delta, reason, trail_id, details, occurred_at, dedupe_key)
+    VALUES (:ledger_id, :user_id, :org_id, :delta, 'checkin', :trail_id, :details, :now, :dedupe_key)
+    ON CONFLICT (dedupe_key) DO NOTHING
+    RETURNING delta
+)
+INSERT INTO user_points (id, user_id, org_id, balance, updated_at)
+SELECT :balance_id, :user_id, :org_id, led.delta, :now FROM led
+ON CONFLICT (user_id, org_id) DO UPDATE
+    SET balance = user_points.balance + excluded.balance, updated_at = excluded.updated_at
+RETURNING balance
+""")
+
+async def award_checkin_points(
+    db: AsyncSession, *, user_id: uuid.UUID, org_id: uuid.UUID, trail_id: uuid.UUID,
+    details: str | None = None, dedupe_key: str | None = None,
+) -> int:
+    """
+    Award check-in points at most once per (trail, user), in one statement:
+
+        WITH led AS (INSERT INTO points_ledger ... ON CONFLICT (dedupe_key) DO NOTHING RETURNING delta)
+        INSERT INTO user_points ... SELECT ... FROM led
+        ON CONFLICT (user_id, org_id) DO UPDATE SET balance = user_points.balance + excluded.balance
+
+    A redelivered event (or the same check-in via both NATS and HTTP ingest)
+    inserts no ledger row, so the balance is not touched. Concurrent awards
+    for one user serialise on the balance row instead of losing updates.
+    Returns the points awarded (0 for a duplicate).
+    """
     pts = await _get_rule_points(db, org_id, RuleType.CHECKIN)
     if pts <= 0:
         return 0
-    bal = await _get_or_create_balance(db, user_id, org_id)
-    bal.balance += pts
-    db.add(PointsLedger(user_id=user_id, org_id=org_id, delta=pts, reason="checkin", trail_id=trail_id, details=details))
+    awarded = (await db.execute(_AWARD_CHECKIN, {
+        "ledger_id": uuid.uuid4(), "balance_id": uuid.uuid4(), "user_id": user_id, "org_id": org_id,
+        "trail_id": trail_id, "delta": pts, "details": details, "now": utcnow(),
+        "dedupe_key": dedupe_key or checkin_dedupe_key(trail_id, user_id),
+    })).first()
     await db.commit()
-    return pts
+    return pts if awarded is not None else 0
 
 async def adjust_points(db: AsyncSession, *, user_id: uuid.UUID, org_id: uuid.UUID, delta: int, reason: str, details: str | None = None) -> int:
     bal = await _get_or_create_balance(db, user_id, org_id)
@@ -0,0 +1,178 @@
+from __future__ import annotations
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Tuple
+
+from prometheus_client import Counter, Gauge
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.config import get_settings
+from ..core.nats import publish_event
+from ..models import Rule, RuleType
+
+settings = get_settings()
+
+RULE_CACHE_REQUESTS = Counter(
+    "points_rule_cache_requests_total",
+    "Per-org rule lookups on the award path",
+    ["result"],  # hit | miss
+)
+RULE_CACHE_INVALIDATIONS = Counter(
+    "points_rule_cache_invalidations_total",
+    "Per-org rule cache invalidations",
+    ["source"],  # local | nats
+)
+RULE_CACHE_SIZE = Gauge("points_rule_cache_entries", "Organisations whose rules are cached")
+
+# this replica's id, so it can ignore its own rules.changed events
+INSTANCE_ID = uuid.uuid4().hex
+
+OrgRules = Dict[RuleType, int]
+
+async def _load_many(db: AsyncSession, org_ids: list[uuid.UUID]) -> Dict[uuid.UUID, OrgRules]:
+    """Effective points per rule type for each org: the most recently updated active rule wins."""
+    rows = (await db.execute(
+        select(Rule.org_id, Rule.type, Rule.points)
+        .where(Rule.org_id.in_(org_ids), Rule.active == True)
+        .order_by(Rule.updated_at.desc())
+    )).all()
+    out: Dict[uuid.UUID, OrgRules] = {org_id: {} for org_id in org_ids}
+    for org_id, rtype, points in rows:
+        out[org_id].setdefault(rtype, points)
+    return out
+
+async def _load(db: AsyncSession, org_id: uuid.UUID) -> OrgRules:
+    return (await _load_many(db, [org_id]))[org_id]
+
+class RuleCache:
+    """
+    Bounded LRU of each org's effective rules. Rules change rarely, so entries
+    live for `ttl_seconds` as a safety net and are otherwise dropped by
+    invalidate() — called after writes through routers/rules.py on this
+    replica, and from `rules.changed` events for the others. Concurrent misses
+    for one org share a single load; a load that raced an invalidation is
+    returned to its callers but not cached.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[uuid.UUID, Tuple[float, OrgRules]]" = OrderedDict()
+        self._loading: Dict[uuid.UUID, asyncio.Future] = {}
+        self._generation: Dict[uuid.UUID, int] = {}
+
+    async def get(self, db: AsyncSession, org_id: uuid.UUID) -> OrgRules:
+        entry = self._entries.get(org_id)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(org_id)
+            RULE_CACHE_REQUESTS.labels("hit").inc()
+            return entry[1]
+        RULE_CACHE_REQUESTS.labels("miss").inc()
+        pending = self._loading.get(org_id)
+        if pending is not None:
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise  # we were cancelled, not the load
+            # the loading request was cancelled: load ourselves
+
+        fut: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._loading[org_id] = fut
+        generation = self._generation.get(org_id, 0)
+        try:
+            rules = await _load(db, org_id)
+        except Exception as e:
+            fut.set_exception(e)
+            fut.exception()  # mark retrieved: waiters re-raise it, nobody else has to
+            raise
+        except BaseException:
+            fut.cancel()
+            raise
+        finally:
+            if self._loading.get(org_id) is fut:
+                del self._loading[org_id]
+        if self._generation.get(org_id, 0) == generation:
+            self._put(org_id, rules)
+        fut.set_result(rules)
+        return rules
+
+    async def get_many(self, db: AsyncSession, org_ids: set[uuid.UUID]) -> Dict[uuid.UUID, OrgRules]:
+        """Rules for several orgs; all misses are loaded with one query (batch consumers)."""
+        out: Dict[uuid.UUID, OrgRules] = {}
+        missing = []
+        now = time.monotonic()
+        for org_id in org_ids:
+            entry = self._entries.get(org_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(org_id)
+                out[org_id] = entry[1]
+            else:
+                missing.append(org_id)
+        RULE_CACHE_REQUESTS.labels("hit").inc(len(out))
+        if not missing:
+            return out
+        RULE_CACHE_REQUESTS.labels("miss").inc(len(missing))
+        generations = {org_id: self._generation.get(org_id, 0) for org_id in missing}
+        for org_id, rules in (await _load_many(db, missing)).items():
+            if self._generation.get(org_id, 0) == generations[org_id]:
+                self._put(org_id, rules)
+            out[org_id] = rules
+        return out
+
+    def _put(self, org_id: uuid.UUID, rules: OrgRules) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries[org_id] = (time.monotonic() + self.ttl_seconds, rules)
+        self._entries.move_to_end(org_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        RULE_CACHE_SIZE.set(len(self._entries))
+
+    def invalidate(self, org_id: uuid.UUID) -> None:
+        self._generation[org_id] = self._generation.get(org_id, 0) + 1
+        self._entries.pop(org_id, None)
+        self._loading.pop(org_id, None)  # the next miss starts a fresh load
+        RULE_CACHE_SIZE.set(len(self._entries))
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._generation.clear()
+        RULE_CACHE_SIZE.set(0)
+
+_rule_cache: RuleCache | None = None
+
+def get_rule_cache() -> RuleCache:
+    global _rule_cache
+    if _rule_cache is None:
+        _rule_cache = RuleCache(
+            max_entries=settings.rule_cache_max_entries, ttl_seconds=settings.rule_cache_ttl_seconds,
+        )
+    return _rule_cache
+
+async def rules_changed(org_id: uuid.UUID) -> None:
+    """
+    Call after committing a rule write: drop this replica's entry and tell the
+    others via `rules.changed`. Best-effort; the TTL covers a lost event.
+    evt = {"org_id", "origin", "changed_at"}
+    """
+    get_rule_cache().invalidate(org_id)
+    RULE_CACHE_INVALIDATIONS.labels("local").inc()
+    try:
+        await publish_event(settings.nats_subject_rules, {
+            "org_id": str(org_id),
+            "origin": INSTANCE_ID,
+            "changed_at": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+        })
+    except Exception:
+        pass
+
+async def apply_rules_event(evt: dict) -> None:
+    if evt.get("origin") == INSTANCE_ID:
+        return
+    get_rule_cache().invalidate(uuid.UUID(evt["org_id"]))
+    RULE_CACHE_INVALIDATIONS.labels("nats").inc()
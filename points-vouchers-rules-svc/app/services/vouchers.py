@@ -0,0 +1,144 @@
+from __future__ import annotations
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+
+from prometheus_client import Counter
+from sqlalchemy import Uuid, exists, func, insert, literal, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.types import DateTime, String
+
+from ..models import PointsLedger, Redemption, RedemptionStatus, UserPoints, Voucher, VoucherStatus, utcnow
+
+VOUCHER_REDEMPTIONS = Counter(
+    "points_voucher_redemptions_total",
+    "Voucher redemption attempts by outcome",
+    ["result"],  # redeemed | exhausted | insufficient | inactive | not_found
+)
+
+class RedemptionRejected(Exception):
+    def __init__(self, status_code: int, detail: str, outcome: str):
+        super().__init__(detail)
+        self.status_code, self.detail, self.outcome = status_code, detail, outcome
+
+@dataclass
+class RedemptionResult:
+    id: uuid.UUID
+    voucher_id: uuid.UUID
+    user_id: uuid.UUID
+    org_id: uuid.UUID
+    status: str
+    redeemed_at: datetime
+    balance: int
+
+def _reject(status_code: int, detail: str, outcome: str) -> RedemptionRejected:
+    VOUCHER_REDEMPTIONS.labels(outcome).inc()
+    return RedemptionRejected(status_code, detail, outcome)
+
+async def _why_not(db: AsyncSession, voucher_id: uuid.UUID) -> RedemptionRejected:
+    """Reason a conditional redemption matched nothing (read after the fact, off the success path)."""
+    v = (await db.execute(
+        select(Voucher.status, Voucher.total_quantity, Voucher.redeemed_count).where(Voucher.id == voucher_id)
+    )).first()
+    if v is None:
+        return _reject(404, "Voucher not found", "not_found")
+    if v.status != VoucherStatus.ACTIVE:
+        return _reject(400, "Voucher not active", "inactive")
+    if v.total_quantity is not None and v.redeemed_count >= v.total_quantity:
+        return _reject(409, "Voucher exhausted", "exhausted")
+    return _reject(400, "Insufficient points", "insufficient")
+
+async def redeem_voucher(db: AsyncSession, *, voucher_id: uuid.UUID, user_id: uuid.UUID) -> RedemptionResult:
+    """
+    Redeem one unit for `user_id` with conditional updates in one statement,
+    so there is no gap between checking and writing:
+
+        WITH bal   AS (UPDATE user_points SET balance = balance - cost
+                       WHERE user/org match AND balance >= cost RETURNING ...),
+             stock AS (UPDATE vouchers SET redeemed_count = redeemed_count + 1
+                       WHERE id = ... AND status = ACTIVE AND redeemed_count < total_quantity
+                         AND EXISTS (SELECT FROM bal) RETURNING ...),
+             red   AS (INSERT INTO redemptions SELECT ... FROM stock),
+             led   AS (INSERT INTO points_ledger SELECT ... FROM stock)
+        SELECT ...
+
+    Concurrent redemptions queue on the voucher row and re-check the stock
+    condition once it is free, so a limited voucher cannot be oversold; the
+    balance row is handled the same way. If the balance was deducted but no
+    stock was left the transaction is rolled back; once a voucher is visibly
+    sold out, attempts don't touch the balance at all. The voucher row is
+    locked last, so it is held only until the commit right after.
+    """
+    v_t, up_t = Voucher.__table__, UserPoints.__table__
+    now = utcnow()
+    available = (
+        v_t.c.status == VoucherStatus.ACTIVE,
+        or_(v_t.c.total_quantity.is_(None), v_t.c.redeemed_count < v_t.c.total_quantity),
+    )
+    cost = select(v_t.c.points_cost).where(v_t.c.id == voucher_id).scalar_subquery()
+    org = select(v_t.c.org_id).where(v_t.c.id == voucher_id).scalar_subquery()
+
+    bal = (
+        update(up_t)
+        .where(
+            up_t.c.user_id == user_id, up_t.c.org_id == org, up_t.c.balance >= cost,
+            # plain read: once sold out, attempts write nothing (the stock update below decides)
+            exists(select(v_t.c.id).where(v_t.c.id == voucher_id, *available)),
+        )
+        .values(balance=up_t.c.balance - cost, updated_at=now)
+        .returning(up_t.c.balance)
+        .cte("bal")
+    )
+    stock = (
+        update(v_t)
+        .where(
+            v_t.c.id == voucher_id, *available,
+            exists(select(bal.c.balance)),
+        )
+        .values(redeemed_count=v_t.c.redeemed_count + 1, updated_at=now)
+        .returning(v_t.c.id, v_t.c.org_id, v_t.c.code, v_t.c.points_cost)
+        .cte("stock")
+    )
+    redemption_id = uuid.uuid4()
+    red = (
+        insert(Redemption.__table__)
+        .from_select(
+            ["id", "voucher_id", "user_id", "org_id", "status", "redeemed_at"],
+            select(
+                literal(redemption_id, Uuid()), stock.c.id, literal(user_id, Uuid()), stock.c.org_id,
+                literal(RedemptionStatus.REDEEMED, Redemption.__table__.c.status.type),
+                literal(now, DateTime(timezone=True)),
+            ).select_from(stock),
+        )
+        .returning(Redemption.__table__.c.id)
+        .cte("red")
+    )
+    led = (
+        insert(PointsLedger.__table__)
+        .from_select(
+            ["id", "user_id", "org_id", "delta", "reason", "details", "occurred_at"],
+            select(
+                literal(uuid.uuid4(), Uuid()), literal(user_id, Uuid()), stock.c.org_id, -stock.c.points_cost,
+                literal("voucher_redeem", String()), literal("voucher:", String()) + stock.c.code,
+                literal(now, DateTime(timezone=True)),
+            ).select_from(stock),
+        )
+        .returning(PointsLedger.__table__.c.id)
+        .cte("led")
+    )
+    row = (await db.execute(select(
+        select(bal.c.balance).scalar_subquery().label("balance"),
+        select(stock.c.org_id).scalar_subquery().label("org_id"),
+        select(func.count()).select_from(red).scalar_subquery().label("redeemed"),
+        select(func.count()).select_from(led).scalar_subquery().label("logged"),
+    ))).one()
+
+    if not row.redeemed:
+        await db.rollback()  # undo the deduction if only the stock condition failed
+        raise await _why_not(db, voucher_id)
+    await db.commit()
+    VOUCHER_REDEMPTIONS.labels("redeemed").inc()
+    return RedemptionResult(
+        id=redemption_id, voucher_id=voucher_id, user_id=user_id, org_id=row.org_id,
+        status=RedemptionStatus.REDEEMED.value, redeemed_at=now, balance=row.balance,
+    )
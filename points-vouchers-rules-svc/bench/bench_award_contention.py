@@ -0,0 +1,112 @@
+"""
+Contention benchmark for services.points.award_checkin_points.
+
+Fires N concurrent check-in awards for ONE attendee (distinct trails, so every
+award should count and all of them hit the same user_points row), then
+redelivers every event concurrently (as NATS redelivery or the HTTP + NATS
+double path would), against the Postgres in DATABASE_URL. Reports the final
+balance against the expected one, ledger rows, DB round trips per award and
+latency percentiles.
+
+    cd points-vouchers-rules-svc
+    python -m bench.bench_award_contention --awards 500
+    python -m bench.bench_award_contention --awards 500 --legacy   # previous read-modify-write, for comparison
+
+Use a throwaway database; the benchmark org's rows are deleted at the end.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+from sqlalchemy import delete, event, func, select
+
+from app.core.config import get_settings
+from app.db import async_session_maker, engine, init_db
+from app.models import PointsLedger, RuleType, UserPoints
+from app.services.points import _get_or_create_balance, _get_rule_points, award_checkin_points
+
+_round_trips = 0
+
+def _count(*_args, **_kwargs):
+    global _round_trips
+    _round_trips += 1
+
+def _pct(samples: list[float], p: float) -> float:
+    s = sorted(samples)
+    return s[min(len(s) - 1, int(round(p / 100 * (len(s) - 1))))]
+
+async def _legacy_award(db, *, user_id, org_id, trail_id, details=None, dedupe_key=None) -> int:
+    """The pre-dedupe implementation: read balance, add in Python, commit."""
+    pts = await _get_rule_points(db, org_id, RuleType.CHECKIN)
+    bal = await _get_or_create_balance(db, user_id, org_id)
+    bal.balance += pts
+    db.add(PointsLedger(user_id=user_id, org_id=org_id, delta=pts, reason="checkin", trail_id=trail_id, details=details))
+    await db.commit()
+    return pts
+
+async def _wave(award, org_id: uuid.UUID, user_id: uuid.UUID, trails: list[uuid.UUID]) -> tuple[list[float], int, int]:
+    async def one(trail_id: uuid.UUID) -> tuple[float, int, bool]:
+        t0 = time.perf_counter()
+        try:
+            async with async_session_maker() as db:
+                pts = await award(db, user_id=user_id, org_id=org_id, trail_id=trail_id, details="bench")
+            return (time.perf_counter() - t0) * 1000, pts, False
+        except Exception:
+            return (time.perf_counter() - t0) * 1000, 0, True
+
+    res = await asyncio.gather(*(one(t) for t in trails))
+    return [ms for ms, _, _ in res], sum(p for _, p, _ in res), sum(1 for _, _, err in res if err)
+
+async def _state(org_id: uuid.UUID, user_id: uuid.UUID) -> tuple[int, int]:
+    async with async_session_maker() as db:
+        balance = (await db.execute(
+            select(func.coalesce(func.sum(UserPoints.balance), 0)).where(UserPoints.org_id == org_id, UserPoints.user_id == user_id)
+        )).scalar_one()
+        rows = (await db.execute(select(func.count(PointsLedger.id)).where(PointsLedger.org_id == org_id))).scalar_one()
+    return int(balance), int(rows)
+
+def _report(label: str, lat: list[float], awarded: int, errors: int, trips: int, n: int, balance: int, expected: int, rows: int) -> None:
+    print(
+        f"{label:<10} awards={n} awarded_pts={awarded} errors={errors} balance={balance} expected={expected} "
+        f"lost={expected - balance} ledger_rows={rows} round_trips/award={trips / n:.2f} "
+        f"p50={statistics.median(lat):.1f}ms p95={_pct(lat, 95):.1f}ms p99={_pct(lat, 99):.1f}ms max={max(lat):.1f}ms"
+    )
+
+async def main(awards: int, legacy: bool) -> None:
+    global _round_trips
+    await init_db()
+    sync_engine = engine.sync_engine
+    event.listen(sync_engine, "before_cursor_execute", _count)
+    event.listen(sync_engine, "commit", _count)
+    event.listen(sync_engine, "rollback", _count)
+
+    award = _legacy_award if legacy else award_checkin_points
+    pts = get_settings().default_checkin_points  # the benchmark org has no rules
+    org_id, user_id = uuid.uuid4(), uuid.uuid4()
+    trails = [uuid.uuid4() for _ in range(awards)]
+    try:
+        _round_trips = 0
+        lat, awarded, errors = await _wave(award, org_id, user_id, trails)
+        balance, rows = await _state(org_id, user_id)
+        _report("first", lat, awarded, errors, _round_trips, awards, balance, awards * pts, rows)
+
+        _round_trips = 0
+        lat, awarded, errors = await _wave(award, org_id, user_id, trails)  # every event redelivered
+        balance, rows = await _state(org_id, user_id)
+        _report("redelivery", lat, awarded, errors, _round_trips, awards, balance, awards * pts, rows)
+    finally:
+        async with async_session_maker() as db:
+            await db.execute(delete(PointsLedger).where(PointsLedger.org_id == org_id))
+            await db.execute(delete(UserPoints).where(UserPoints.org_id == org_id))
+            await db.commit()
+        await engine.dispose()
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--awards", type=int, default=500)
+    ap.add_argument("--legacy", action="store_true", help="run the previous read-modify-write award instead")
+    args = ap.parse_args()
+    asyncio.run(main(args.awards, args.legacy))
@@ -0,0 +1,130 @@
+"""
+Throughput benchmark for the check-in consumer: N checkins.recorded events
+(spread over a few orgs and attendees, plus a share of redeliveries) pushed
+through CheckinBatcher against the Postgres in DATABASE_URL, compared with
+awarding them one by one as the previous per-message handler did. Reports
+events/s, DB round trips per event, the final balance against the expected
+one and the batch-size distribution.
+
+    cd points-vouchers-rules-svc
+    python -m bench.bench_checkin_batch --events 5000
+    python -m bench.bench_checkin_batch --events 5000 --per-event   # previous handler, for comparison
+    python -m bench.bench_checkin_batch --events 5000 --workers 1   # a single flush task
+    python -m bench.bench_checkin_batch --events 5000 --slow-ms 20  # each transaction also spends 20ms in the DB
+
+Use a throwaway database; the benchmark orgs' rows are deleted at the end.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import random
+import time
+import uuid
+
+from sqlalchemy import delete, event, func, select, text
+
+from app.core.config import get_settings
+from app.db import async_session_maker, engine, init_db
+from app.models import PointsLedger, UserPoints
+from app.services import checkin_batcher
+from app.services.checkin_batcher import BATCH_SIZE, CheckinBatcher
+from app.services.points import award_checkin_points
+
+_round_trips = 0
+
+def _count(*_args, **_kwargs):
+    global _round_trips
+    _round_trips += 1
+
+def _events(n: int, orgs: list[uuid.UUID], users: list[uuid.UUID], redeliver: float) -> list[dict]:
+    out = []
+    for _ in range(n):
+        trail_id, user_id = uuid.uuid4(), random.choice(users)
+        out.append({"trail_id": str(trail_id), "org_id": str(random.choice(orgs)), "user_id": str(user_id),
+                    "idempotency_key": f"{trail_id}:{user_id}"})
+    return out + random.sample(out, int(n * redeliver))
+
+async def _per_event(evts: list[dict], concurrency: int) -> None:
+    sem = asyncio.Semaphore(concurrency)
+    async def one(evt: dict) -> None:
+        async with sem, async_session_maker() as db:
+            await award_checkin_points(
+                db, user_id=uuid.UUID(evt["user_id"]), org_id=uuid.UUID(evt["org_id"]),
+                trail_id=uuid.UUID(evt["trail_id"]), details="bench",
+                dedupe_key=f"checkin:{evt['idempotency_key']}",
+            )
+    await asyncio.gather(*(one(e) for e in evts), return_exceptions=True)
+
+async def _batched(evts: list[dict], max_size: int, max_wait_ms: float, workers: int) -> None:
+    batcher = CheckinBatcher(max_size=max_size, max_wait_ms=max_wait_ms, workers=workers)
+    await batcher.start()
+    for evt in evts:
+        await batcher.submit(evt)
+    await batcher.stop(timeout=300)
+
+def _slow_transactions(ms: float) -> None:
+    """Make every batch transaction hold its connection `ms` longer (lock waits, I/O, a remote DB)."""
+    award = checkin_batcher.award_checkin_batch
+    async def slow(db, events, **kw):
+        await db.execute(text("SELECT pg_sleep(:s)"), {"s": ms / 1000})
+        return await award(db, events, **kw)
+    checkin_batcher.award_checkin_batch = slow
+
+def _batch_sizes() -> str:
+    samples = {s.name: s.value for m in BATCH_SIZE.collect() for s in m.samples}
+    n = samples.get("points_checkin_batch_size_count", 0)
+    return f"batches={int(n)} mean_batch={samples.get('points_checkin_batch_size_sum', 0) / n:.1f}" if n else "batches=0"
+
+async def main(n: int, per_event: bool, max_size: int, max_wait_ms: float, concurrency: int, redeliver: float,
+               workers: int, slow_ms: float) -> None:
+    global _round_trips
+    await init_db()
+    if slow_ms:
+        _slow_transactions(slow_ms)
+    sync_engine = engine.sync_engine
+    event.listen(sync_engine, "before_cursor_execute", _count)
+    event.listen(sync_engine, "commit", _count)
+    event.listen(sync_engine, "rollback", _count)
+
+    orgs = [uuid.uuid4() for _ in range(5)]  # no rules: DEFAULT_CHECKIN_POINTS each
+    users = [uuid.uuid4() for _ in range(200)]
+    evts = _events(n, orgs, users, redeliver)
+    try:
+        _round_trips = 0
+        t0 = time.perf_counter()
+        if per_event:
+            await _per_event(evts, concurrency)
+        else:
+            await _batched(evts, max_size, max_wait_ms, workers)
+        elapsed = time.perf_counter() - t0
+        async with async_session_maker() as db:
+            balance = (await db.execute(
+                select(func.coalesce(func.sum(UserPoints.balance), 0)).where(UserPoints.org_id.in_(orgs))
+            )).scalar_one()
+            rows = (await db.execute(select(func.count(PointsLedger.id)).where(PointsLedger.org_id.in_(orgs)))).scalar_one()
+        expected = n * get_settings().default_checkin_points
+        print(
+            f"{'per-event' if per_event else 'batched':<10} events={len(evts)} ({n} unique) {len(evts) / elapsed:.0f}/s "
+            f"round_trips/event={_round_trips / len(evts):.2f} balance={balance} expected={expected} ledger_rows={rows}"
+            + ("" if per_event else f" workers={workers} slow_ms={slow_ms:g} {_batch_sizes()}")
+        )
+    finally:
+        async with async_session_maker() as db:
+            await db.execute(delete(PointsLedger).where(PointsLedger.org_id.in_(orgs)))
+            await db.execute(delete(UserPoints).where(UserPoints.org_id.in_(orgs)))
+            await db.commit()
+        await engine.dispose()
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--events", type=int, default=5000)
+    ap.add_argument("--per-event", action="store_true", help="award one event per transaction (previous handler)")
+    ap.add_argument("--max-size", type=int, default=200)
+    ap.add_argument("--max-wait-ms", type=float, default=20.0)
+    ap.add_argument("--concurrency", type=int, default=1, help="per-event mode: handlers in flight (core NATS runs one)")
+    ap.add_argument("--workers", type=int, default=0, help="batched mode: worker shards (0 = DB pool size)")
+    ap.add_argument("--slow-ms", type=float, default=0.0, help="batched mode: extra DB time per batch transaction")
+    ap.add_argument("--redeliver", type=float, default=0.1, help="share of events delivered twice")
+    args = ap.parse_args()
+    asyncio.run(main(args.events, args.per_event, args.max_size, args.max_wait_ms, args.concurrency, args.redeliver,
+                     args.workers or engine.pool.size(), args.slow_ms))
@@ -0,0 +1,203 @@
+"""
+End-to-end check of the durable check-in consumer against a throwaway
+nats-server (started here with JetStream on a free port; `nats-server` must be
+on PATH or in NATS_SERVER_BIN) and the Postgres in DATABASE_URL:
+
+  1. N check-ins (plus redeliveries and one malformed message) are published
+     while points-svc is "down" (no consumer running);
+  2. the consumer + batcher start, drain the backlog and are timed;
+  3. the balances must match exactly, the malformed message must be in the
+     dead-letter stream and lag / ack-pending must be back at 0;
+  4. a handler that always fails must be retried with backoff and then
+     dead-lettered after len(NATS_RETRY_BACKOFF_SECONDS) + 1 deliveries;
+  5. deliveries a handler holds for longer than ack_wait (a slow batch) are
+     kept alive with in-progress acks and delivered only once;
+  6. after a restart of the consumer nothing is awarded twice.
+
+    cd points-vouchers-rules-svc
+    python -m bench.bench_checkin_jetstream --events 5000
+
+Exits non-zero if any check fails. Use a throwaway database; the benchmark
+org's rows are deleted at the end.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+# settings are read on first import, so point them at the embedded server first
+_PORT = _free_port()
+os.environ["NATS_URLS"] = f"nats://127.0.0.1:{_PORT}"
+os.environ.setdefault("NATS_RETRY_BACKOFF_SECONDS", "0.2,0.2")
+os.environ.setdefault("NATS_LAG_INTERVAL_SECONDS", "0.2")
+os.environ.setdefault("NATS_ACK_WAIT_SECONDS", "1")
+
+from sqlalchemy import delete, func, select  # noqa: E402
+
+from app.core import nats as nats_mod  # noqa: E402
+from app.core.config import get_settings  # noqa: E402
+from app.db import async_session_maker, engine, init_db  # noqa: E402
+from app.models import PointsLedger, UserPoints  # noqa: E402
+from app.services.checkin_batcher import CheckinBatcher  # noqa: E402
+
+settings = get_settings()
+_failures: list[str] = []
+
+def _check(ok: bool, what: str) -> None:
+    print(f"  {'ok  ' if ok else 'FAIL'} {what}")
+    if not ok:
+        _failures.append(what)
+
+async def _until(pred, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if await pred():
+            return True
+        await asyncio.sleep(0.1)
+    return False
+
+async def _dlq() -> list:
+    js = nats_mod._nats.jetstream()
+    try:
+        info = await js.stream_info(settings.nats_stream_checkins_dlq)
+    except Exception:
+        return []
+    return [await js.get_msg(settings.nats_stream_checkins_dlq, seq)
+            for seq in range(info.state.first_seq, info.state.last_seq + 1) if info.state.messages]
+
+async def _balance(org_id: uuid.UUID) -> tuple[int, int]:
+    async with async_session_maker() as db:
+        bal = (await db.execute(select(func.coalesce(func.sum(UserPoints.balance), 0)).where(UserPoints.org_id == org_id))).scalar_one()
+        rows = (await db.execute(select(func.count(PointsLedger.id)).where(PointsLedger.org_id == org_id))).scalar_one()
+    return int(bal), int(rows)
+
+async def main(n: int) -> None:
+    await init_db()
+    org_id = uuid.uuid4()
+    users = [uuid.uuid4() for _ in range(100)]
+    pts = settings.default_checkin_points
+    try:
+        # 1. published while nobody consumes
+        await nats_mod.ensure_checkin_streams()
+        evts = []
+        for i in range(n):
+            trail_id, user_id = uuid.uuid4(), users[i % len(users)]
+            evts.append({"trail_id": str(trail_id), "org_id": str(org_id), "user_id": str(user_id),
+                         "idempotency_key": f"{trail_id}:{user_id}"})
+        for evt in evts + evts[: n // 10]:
+            await nats_mod._nats.publish(settings.nats_subject_checkin, json.dumps(evt).encode())
+        await nats_mod._nats.publish(settings.nats_subject_checkin, b"not json")
+        await nats_mod._nats.flush()
+        print(f"published {n} check-ins + {n // 10} redeliveries + 1 malformed with no consumer running")
+
+        # 2. consumer comes up and drains the backlog
+        batcher = CheckinBatcher(max_size=settings.points_batch_max_size, max_wait_ms=settings.points_batch_max_wait_ms)
+        await batcher.start()
+        t0 = time.perf_counter()
+        consumer = await nats_mod.subscribe_checkins(batcher.submit)
+        drained = await _until(lambda: _drained(org_id, n * pts), 120)
+        elapsed = time.perf_counter() - t0
+        print(f"drained in {elapsed:.2f}s ({(n + n // 10) / elapsed:.0f} msgs/s)")
+
+        # 3.
+        bal, rows = await _balance(org_id)
+        _check(drained and bal == n * pts, f"balance {bal} == {n * pts}")
+        _check(rows == n, f"ledger rows {rows} == {n}")
+        await _until(lambda: _gauges_zero(), 5)
+        _check(nats_mod.CONSUMER_LAG._value.get() == 0, "consumer lag back to 0")
+        _check(nats_mod.CONSUMER_ACK_PENDING._value.get() == 0, "ack pending back to 0")
+        dlq = await _dlq()
+        _check(len(dlq) == 1 and dlq[0].data == b"not json", f"malformed message dead-lettered ({len(dlq)} in DLQ)")
+        await consumer.stop()
+        await batcher.stop()
+
+        # 4. handler that always fails: retried with backoff, then dead-lettered
+        attempts = []
+        async def failing(evt, delivery):
+            attempts.append(time.monotonic())
+            raise RuntimeError("database unavailable")
+        consumer = await nats_mod.subscribe_checkins(failing)
+        await nats_mod._nats.publish(settings.nats_subject_checkin, json.dumps(evts[0]).encode())
+        expected = len(nats_mod._backoff()) + 1
+        await _until(lambda: _dlq_len_at_least(2), 30)
+        await consumer.stop()
+        dlq = await _dlq()
+        gaps = [round(b - a, 2) for a, b in zip(attempts, attempts[1:])]
+        _check(len(attempts) == expected, f"{len(attempts)} deliveries == {expected}, gaps {gaps}s")
+        _check(len(dlq) == 2 and dlq[-1].headers.get("Dlq-Deliveries") == str(expected),
+               f"dead-lettered with headers {dlq[-1].headers if dlq else None}")
+
+        # 5. slow handler: held for 3x ack_wait, then acked; no redelivery meanwhile
+        seen: list[int] = []
+        async def slow(evt, delivery):
+            seen.append(delivery.num_delivered)
+            async def later():
+                await asyncio.sleep(settings.nats_ack_wait_seconds * 3)
+                await delivery.ack()
+            asyncio.create_task(later())
+        consumer = await nats_mod.subscribe_checkins(slow)
+        for evt in evts[:5]:
+            await nats_mod._nats.publish(settings.nats_subject_checkin, json.dumps(evt).encode())
+        await asyncio.sleep(settings.nats_ack_wait_seconds * 4)
+        await _until(lambda: _gauges_zero(), 5)
+        await consumer.stop()
+        _check(seen == [1] * 5, f"slow deliveries seen once each: {seen}")
+        _check(nats_mod.CONSUMER_ACK_PENDING._value.get() == 0, "slow deliveries acked")
+
+        # 6. restart: nothing awarded twice
+        batcher = CheckinBatcher()
+        await batcher.start()
+        consumer = await nats_mod.subscribe_checkins(batcher.submit)
+        await asyncio.sleep(1.5)
+        await consumer.stop()
+        await batcher.stop()
+        _check(await _balance(org_id) == (n * pts, n), "no double award after restart")
+    finally:
+        async with async_session_maker() as db:
+            await db.execute(delete(PointsLedger).where(PointsLedger.org_id == org_id))
+            await db.execute(delete(UserPoints).where(UserPoints.org_id == org_id))
+            await db.commit()
+        await nats_mod.nats_close()
+        await engine.dispose()
+
+async def _drained(org_id: uuid.UUID, expected: int) -> bool:
+    return (await _balance(org_id))[0] >= expected
+
+async def _gauges_zero() -> bool:
+    return nats_mod.CONSUMER_LAG._value.get() == 0 and nats_mod.CONSUMER_ACK_PENDING._value.get() == 0
+
+async def _dlq_len_at_least(k: int) -> bool:
+    return len(await _dlq()) >= k
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--events", type=int, default=5000)
+    args = ap.parse_args()
+    binary = os.environ.get("NATS_SERVER_BIN") or shutil.which("nats-server")
+    if not binary:
+        sys.exit("nats-server not found (put it on PATH or set NATS_SERVER_BIN)")
+    store = tempfile.mkdtemp(prefix="nats-js-")
+    server = subprocess.Popen([binary, "-js", "-a", "127.0.0.1", "-p", str(_PORT), "-sd", store],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        time.sleep(0.5)
+        asyncio.run(main(args.events))
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(store, ignore_errors=True)
+    if _failures:
+        sys.exit(f"{len(_failures)} check(s) failed")
@@ -0,0 +1,126 @@
+"""
+Flash-voucher benchmark for services.vouchers.redeem_voucher: one voucher with
+--units in stock, N concurrent redemptions from --users attendees (each able
+to afford --afford redemptions), against the Postgres in DATABASE_URL.
+Reports units sold against stock (oversell), per-user balances against their
+redemptions (lost or negative balances), ledger and redemption rows, outcomes
+and latency percentiles.
+
+    cd points-vouchers-rules-svc
+    python -m bench.bench_voucher_redeem --redemptions 1000 --units 50
+    python -m bench.bench_voucher_redeem --redemptions 1000 --units 50 --users 100   # several attempts per user
+    python -m bench.bench_voucher_redeem --redemptions 1000 --units 50 --legacy      # previous read-check-write, for comparison
+
+Use a throwaway database; the benchmark org's rows are deleted at the end.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from collections import Counter
+
+from sqlalchemy import delete, func, select
+
+from app.db import async_session_maker, engine, init_db
+from app.models import PointsLedger, Redemption, UserPoints, Voucher, VoucherStatus
+from app.services.vouchers import RedemptionRejected, redeem_voucher
+
+COST = 10
+
+def _pct(samples: list[float], p: float) -> float:
+    s = sorted(samples)
+    return s[min(len(s) - 1, int(round(p / 100 * (len(s) - 1))))]
+
+async def _legacy_redeem(db, *, voucher_id: uuid.UUID, user_id: uuid.UUID):
+    """The previous router logic: read voucher and balance, check in Python, then mutate both."""
+    v = (await db.execute(select(Voucher).where(Voucher.id == voucher_id))).scalar_one_or_none()
+    if v.total_quantity is not None and v.redeemed_count >= v.total_quantity:
+        raise RedemptionRejected(409, "Voucher exhausted", "exhausted")
+    up = (await db.execute(select(UserPoints).where(UserPoints.user_id == user_id, UserPoints.org_id == v.org_id))).scalar_one_or_none()
+    if not up or up.balance < v.points_cost:
+        raise RedemptionRejected(400, "Insufficient points", "insufficient")
+    up.balance -= v.points_cost
+    v.redeemed_count += 1
+    db.add(Redemption(voucher_id=v.id, user_id=user_id, org_id=v.org_id))
+    db.add(PointsLedger(user_id=user_id, org_id=v.org_id, delta=-v.points_cost, reason="voucher_redeem", details=f"voucher:{v.code}"))
+    await db.commit()
+
+async def main(n: int, units: int, users_n: int, afford: int, legacy: bool) -> None:
+    await init_db()
+    org_id = uuid.uuid4()
+    users = [uuid.uuid4() for _ in range(users_n)]
+    voucher_id = uuid.uuid4()
+    async with async_session_maker() as db:
+        db.add(Voucher(id=voucher_id, org_id=org_id, code=f"bench-{voucher_id.hex[:12]}", name="flash",
+                       points_cost=COST, status=VoucherStatus.ACTIVE, total_quantity=units))
+        db.add_all([UserPoints(user_id=u, org_id=org_id, balance=COST * afford) for u in users])
+        await db.commit()
+
+    redeem = _legacy_redeem if legacy else redeem_voucher
+    start = asyncio.Event()
+
+    async def one(user_id: uuid.UUID) -> tuple[float, str]:
+        await start.wait()
+        t0 = time.perf_counter()
+        try:
+            async with async_session_maker() as db:
+                await redeem(db, voucher_id=voucher_id, user_id=user_id)
+            outcome = "redeemed"
+        except RedemptionRejected as e:
+            outcome = e.outcome
+        except Exception as e:
+            outcome = f"error:{type(e).__name__}"
+        return (time.perf_counter() - t0) * 1000, outcome
+
+    try:
+        tasks = [asyncio.create_task(one(users[i % users_n])) for i in range(n)]
+        await asyncio.sleep(0.1)
+        t0 = time.perf_counter()
+        start.set()
+        res = await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - t0
+
+        async with async_session_maker() as db:
+            sold = (await db.execute(select(Voucher.redeemed_count).where(Voucher.id == voucher_id))).scalar_one()
+            red_rows = dict((await db.execute(
+                select(Redemption.user_id, func.count()).where(Redemption.voucher_id == voucher_id).group_by(Redemption.user_id)
+            )).all())
+            balances = dict((await db.execute(
+                select(UserPoints.user_id, UserPoints.balance).where(UserPoints.org_id == org_id)
+            )).all())
+            ledger = (await db.execute(
+                select(func.count(), func.coalesce(func.sum(PointsLedger.delta), 0)).where(PointsLedger.org_id == org_id)
+            )).one()
+        redeemed = sum(red_rows.values())
+        wrong = sum(1 for u in users if balances[u] != COST * (afford - red_rows.get(u, 0)))
+        negative = sum(1 for b in balances.values() if b < 0)
+        lat = [ms for ms, _ in res]
+        outcomes = Counter(o for _, o in res)
+        print(
+            f"{'legacy' if legacy else 'atomic':<7} attempts={n} users={users_n} units={units} "
+            f"redeemed={redeemed} voucher.redeemed_count={sold} oversold={max(0, redeemed - units)} "
+            f"wrong_balances={wrong} negative_balances={negative} ledger_rows={ledger[0]} ledger_sum={ledger[1]} "
+            f"expected_ledger_sum={-COST * redeemed}"
+        )
+        print(f"        outcomes={dict(outcomes)} wall={elapsed * 1000:.0f}ms "
+              f"p50={statistics.median(lat):.1f}ms p95={_pct(lat, 95):.1f}ms p99={_pct(lat, 99):.1f}ms max={max(lat):.1f}ms")
+    finally:
+        async with async_session_maker() as db:
+            await db.execute(delete(Redemption).where(Redemption.voucher_id == voucher_id))
+            await db.execute(delete(PointsLedger).where(PointsLedger.org_id == org_id))
+            await db.execute(delete(UserPoints).where(UserPoints.org_id == org_id))
+            await db.execute(delete(Voucher).where(Voucher.id == voucher_id))
+            await db.commit()
+        await engine.dispose()
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--redemptions", type=int, default=1000)
+    ap.add_argument("--units", type=int, default=50)
+    ap.add_argument("--users", type=int, default=0, help="distinct attendees (default: one per redemption)")
+    ap.add_argument("--afford", type=int, default=3, help="redemptions each attendee's balance covers")
+    ap.add_argument("--legacy", action="store_true", help="run the previous read-check-write redemption instead")
+    args = ap.parse_args()
+    asyncio.run(main(args.redemptions, args.units, args.users or args.redemptions, args.afford, args.legacy))
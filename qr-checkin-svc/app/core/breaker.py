@@ -0,0 +1,111 @@
+from __future__ import annotations
+import time
+from collections import deque
+from typing import Deque
+
+from prometheus_client import Counter, Gauge
+
+CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+_STATE_NAMES = {CLOSED: "closed", HALF_OPEN: "half_open", OPEN: "open"}
+
+BREAKER_STATE = Gauge(
+    "upstream_circuit_state",
+    "Circuit breaker state per upstream (0 closed, 1 half-open, 2 open)",
+    ["upstream"],
+)
+BREAKER_TRANSITIONS = Counter(
+    "upstream_circuit_transitions_total",
+    "Circuit breaker state changes",
+    ["upstream", "to"],
+)
+BREAKER_REJECTED = Counter(
+    "upstream_circuit_rejected_total",
+    "Calls refused without reaching the upstream because the circuit was open",
+    ["upstream"],
+)
+
+class CircuitOpen(Exception):
+    """The upstream's circuit is open; the call was not attempted."""
+
+class CircuitBreaker:
+    """
+    Count-based breaker over the last `window` calls. A call is bad if it
+    failed or took longer than `slow_call_seconds`, so a slow-but-alive
+    upstream trips it before requests pile up on the full HTTP timeout.
+
+    closed -> open      when bad calls reach `failure_rate` (after `min_calls`)
+    open -> half-open   after `open_seconds`; up to `half_open_probes` calls go through
+    half-open -> closed on a good probe, back to open on a bad one
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        window: int,
+        min_calls: int,
+        failure_rate: float,
+        slow_call_seconds: float,
+        open_seconds: float,
+        half_open_probes: int,
+    ):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self._outcomes: Deque[bool] = deque(maxlen=window)  # True = bad
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        BREAKER_STATE.labels(name).set(CLOSED)
+
+    @property
+    def state(self) -> int:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._transition(HALF_OPEN)
+        return self._state
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == OPEN
+
+    def _transition(self, to: int) -> None:
+        if to == self._state:
+            return
+        self._state = to
+        if to == OPEN:
+            self._opened_at = time.monotonic()
+        if to != HALF_OPEN:
+            self._probes = 0
+        if to == CLOSED:
+            self._outcomes.clear()
+        BREAKER_STATE.labels(self.name).set(to)
+        BREAKER_TRANSITIONS.labels(self.name, _STATE_NAMES[to]).inc()
+
+    def before_call(self) -> None:
+        """Raise CircuitOpen if the call must not go out; otherwise admit it."""
+        state = self.state
+        if state == OPEN or (state == HALF_OPEN and self._probes >= self.half_open_probes):
+            BREAKER_REJECTED.labels(self.name).inc()
+            raise CircuitOpen(f"{self.name} circuit open")
+        if state == HALF_OPEN:
+            self._probes += 1
+
+    def after_call(self, *, ok: bool, elapsed: float) -> None:
+        bad = not ok or elapsed >= self.slow_call_seconds
+        if self._state == HALF_OPEN:
+            self._probes = max(0, self._probes - 1)
+            self._transition(OPEN if bad else CLOSED)
+            return
+        if self._state == OPEN:
+            return  # a straggler from before the trip
+        self._outcomes.append(bad)
+        if len(self._outcomes) >= self.min_calls and sum(self._outcomes) / len(self._outcomes) >= self.failure_rate:
+            self._transition(OPEN)
+
+    def abandon_call(self) -> None:
+        """The call was cancelled before it finished: free its probe slot, record nothing."""
+        if self._state == HALF_OPEN:
+            self._probes = max(0, self._probes - 1)
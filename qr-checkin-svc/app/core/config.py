@@ -1,40 +1,135 @@
 from __future__ import annotations
 from pydantic_settings import BaseSettings
-from pydantic import Field
-import secrets
+from pydantic import BaseModel, Field
+from typing import Dict, List, Literal
+from datetime import datetime
+
+class QRKey(BaseModel):
+    """One HS256 QR signing key. Signs from not_before; verifies until not_after."""
+    kid: str
+    secret: str
+    not_before: datetime | None = None
+    not_after: datetime | None = None
 
 class Settings(BaseSettings):
     database_url: str = Field(..., alias="DATABASE_URL")
 
     auth_jwks_url: str = Field(..., alias="AUTH_JWKS_URL")
     token_issuer: str = Field("authentication-svc", alias="TOKEN_ISSUER")
+    jwks_ttl_seconds: int = Field(default=3600, alias="JWKS_TTL_SECONDS")
+    jwks_refresh_ahead_seconds: int = Field(default=300, alias="JWKS_REFRESH_AHEAD_SECONDS")
+    jwks_unknown_kid_cooldown_seconds: int = Field(default=30, alias="JWKS_UNKNOWN_KID_COOLDOWN_SECONDS")
+    claims_cache_max_entries: int = Field(default=10000, alias="CLAIMS_CACHE_MAX_ENTRIES")
 
     trails_base_url: str = Field("http://localhost:8002", alias="TRAILS_BASE_URL")
     points_base_url: str = Field("http://localhost:8003", alias="POINTS_BASE_URL")
 
+    # Outbound HTTP (pooled keep-alive clients per upstream)
+    http_max_connections: int = Field(default=100, alias="HTTP_MAX_CONNECTIONS")
+    http_max_keepalive: int = Field(default=20, alias="HTTP_MAX_KEEPALIVE")
+    http_keepalive_expiry_seconds: float = Field(default=30.0, alias="HTTP_KEEPALIVE_EXPIRY_SECONDS")
+    http_connect_timeout_seconds: float = Field(default=2.0, alias="HTTP_CONNECT_TIMEOUT_SECONDS")
+    http_read_timeout_seconds: float = Field(default=5.0, alias="HTTP_READ_TIMEOUT_SECONDS")
+    http_pool_timeout_seconds: float = Field(default=1.0, alias="HTTP_POOL_TIMEOUT_SECONDS")
+    http_http2: bool = Field(default=True, alias="HTTP_HTTP2")
+    # circuit breaker per upstream: trips when failure_rate of the last `window` calls failed or were slow
+    breaker_enabled: bool = Field(default=True, alias="BREAKER_ENABLED")
+    breaker_window: int = Field(default=20, alias="BREAKER_WINDOW")
+    breaker_min_calls: int = Field(default=10, alias="BREAKER_MIN_CALLS")
+    breaker_failure_rate: float = Field(default=0.5, alias="BREAKER_FAILURE_RATE")
+    breaker_slow_call_seconds: float = Field(default=1.0, alias="BREAKER_SLOW_CALL_SECONDS")
+    breaker_open_seconds: float = Field(default=15.0, alias="BREAKER_OPEN_SECONDS")
+    breaker_half_open_probes: int = Field(default=2, alias="BREAKER_HALF_OPEN_PROBES")
+
     qr_secret: str | None = Field(default=None, alias="QR_SECRET")
+    # key ring shared by all replicas, JSON:
+    # [{"kid": "2026-10", "secret": "...", "not_before": "2026-10-01T00:00:00Z"}, {"kid": "2026-09", ...}]
+    qr_keys: List[QRKey] = Field(default_factory=list, alias="QR_KEYS")
     qr_ttl_seconds: int = Field(default=120, alias="QR_TTL_SECONDS")
+    # offline kiosk uploads: accept QR tokens up to this long past expiry, and cap batch size
+    batch_qr_max_age_seconds: int = Field(default=86400, alias="BATCH_QR_MAX_AGE_SECONDS")
+    batch_max_items: int = Field(default=500, alias="BATCH_MAX_ITEMS")
+    # roster / history listings: keyset page sizes, rows fetched per server-side cursor round trip
+    roster_page_size: int = Field(default=200, alias="ROSTER_PAGE_SIZE")
+    roster_max_page_size: int = Field(default=1000, alias="ROSTER_MAX_PAGE_SIZE")
+    roster_stream_chunk_size: int = Field(default=500, alias="ROSTER_STREAM_CHUNK_SIZE")
+    # QR image rendering (thread pool + per-token cache)
+    qr_render_workers: int = Field(default=2, alias="QR_RENDER_WORKERS")
+    qr_render_max_pending: int = Field(default=32, alias="QR_RENDER_MAX_PENDING")
+    qr_image_cache_entries: int = Field(default=256, alias="QR_IMAGE_CACHE_ENTRIES")
+    # kiosk SSE stream: tokens minted per batch, rotate when less than this much lifetime is left
+    qr_stream_premint: int = Field(default=4, alias="QR_STREAM_PREMINT")
+    qr_stream_min_remaining_seconds: int = Field(default=15, alias="QR_STREAM_MIN_REMAINING_SECONDS")
+    qr_stream_heartbeat_seconds: float = Field(default=10.0, alias="QR_STREAM_HEARTBEAT_SECONDS")
 
     # Redis
     redis_url: str = Field("redis://127.0.0.1:6379/0", alias="REDIS_URL")
     rl_enabled: bool = Field(default=True, alias="RL_ENABLED")
     rl_window_seconds: int = Field(default=60, alias="RL_WINDOW_SECONDS")
     rl_max_reqs: int = Field(default=60, alias="RL_MAX_REQS")
+    rl_algorithm: Literal["fixed_window", "sliding_window", "token_bucket"] = Field(
+        default="sliding_window", alias="RL_ALGORITHM"
+    )
+    # per-route overrides as JSON, "max/window_seconds": {"checkin.scan": "120/60"}
+    rl_route_limits: Dict[str, str] = Field(default_factory=dict, alias="RL_ROUTE_LIMITS")
+    # composite limits, all checked in one round trip (per window above)
+    rl_sub_max_reqs: int = Field(default=10, alias="RL_SUB_MAX_REQS")
+    rl_trail_max_reqs: int = Field(default=2000, alias="RL_TRAIL_MAX_REQS")
+    # comma-separated CIDRs of venue networks (shared NAT) that get a higher per-IP ceiling
+    rl_venue_cidrs: str = Field(default="", alias="RL_VENUE_CIDRS")
+    rl_venue_max_reqs: int = Field(default=1200, alias="RL_VENUE_MAX_REQS")
+
+    # Idempotency-Key on retried POSTs: stored response TTL, claim TTL while the first
+    # request runs, how long a concurrent duplicate waits for it, largest response kept
+    idempotency_enabled: bool = Field(default=True, alias="IDEMPOTENCY_ENABLED")
+    idempotency_ttl_seconds: int = Field(default=86400, alias="IDEMPOTENCY_TTL_SECONDS")
+    idempotency_lock_seconds: int = Field(default=30, alias="IDEMPOTENCY_LOCK_SECONDS")
+    idempotency_wait_seconds: float = Field(default=10.0, alias="IDEMPOTENCY_WAIT_SECONDS")
+    idempotency_max_body_bytes: int = Field(default=262144, alias="IDEMPOTENCY_MAX_BODY_BYTES")
 
     # NATS
     nats_urls: str = Field("nats://127.0.0.1:4222", alias="NATS_URLS")
     nats_subject_checkin: str = Field("checkins.recorded", alias="NATS_SUBJECT_CHECKIN")
     use_nats_for_points: bool = Field(default=True, alias="USE_NATS_FOR_POINTS")
+    # Outbox relay (DB -> NATS)
+    outbox_batch_size: int = Field(default=500, alias="OUTBOX_BATCH_SIZE")
+    outbox_poll_interval_seconds: float = Field(default=1.0, alias="OUTBOX_POLL_INTERVAL_SECONDS")
+    outbox_coalesce_ms: int = Field(default=5, alias="OUTBOX_COALESCE_MS")
+    outbox_max_backoff_seconds: int = Field(default=60, alias="OUTBOX_MAX_BACKOFF_SECONDS")
+    nats_subject_registrations: str = Field("registrations.changed", alias="NATS_SUBJECT_REGISTRATIONS")
+    nats_subject_trails: str = Field("trails.changed", alias="NATS_SUBJECT_TRAILS")
+
+    # Local (trail_id, user_id) -> registration status projection in Redis
+    elig_cache_enabled: bool = Field(default=True, alias="ELIG_CACHE_ENABLED")
+    elig_cache_ttl_seconds: int = Field(default=900, alias="ELIG_CACHE_TTL_SECONDS")
+    elig_cache_grace_seconds: int = Field(default=3600, alias="ELIG_CACHE_GRACE_SECONDS")
+    # when trails-svc is unreachable (circuit open / errors) on the scan path:
+    #   fail_fast          -> 503, attendee retries
+    #   accept_and_verify  -> record a provisional check-in, verified later by a background task
+    elig_degraded_policy: Literal["fail_fast", "accept_and_verify"] = Field(
+        default="fail_fast", alias="ELIG_DEGRADED_POLICY"
+    )
+    elig_verify_interval_seconds: float = Field(default=10.0, alias="ELIG_VERIFY_INTERVAL_SECONDS")
+    elig_verify_batch_size: int = Field(default=100, alias="ELIG_VERIFY_BATCH_SIZE")
+    # provisional rows that still can't be decided after this long (token expired, no projection entry) are voided
+    elig_verify_max_age_seconds: int = Field(default=86400, alias="ELIG_VERIFY_MAX_AGE_SECONDS")
+
+    # Offline kiosk manifest (GET /checkin/trails/{id}/manifest): full re-read of trails-svc
+    # at most this often, change-log entries kept for deltas, bloom filter false-positive rate
+    manifest_resync_seconds: int = Field(default=300, alias="MANIFEST_RESYNC_SECONDS")
+    manifest_log_max: int = Field(default=5000, alias="MANIFEST_LOG_MAX")
+    manifest_bloom_fpr: float = Field(default=0.01, alias="MANIFEST_BLOOM_FPR")
+
+    # Live per-trail arrival counters in Redis (GET /checkin/trails/{id}/stats)
+    stats_ttl_seconds: int = Field(default=172800, alias="STATS_TTL_SECONDS")
+    stats_reconcile_seconds: int = Field(default=300, alias="STATS_RECONCILE_SECONDS")
+    stats_window_minutes: int = Field(default=30, alias="STATS_WINDOW_MINUTES")
 
     class Config:
         env_file = ".env"
         env_prefix = ""
         case_sensitive = False
 
-    @property
-    def qr_secret_effective(self) -> str:
-        return self.qr_secret or secrets.token_urlsafe(48)
-
 _settings: Settings | None = None
 def get_settings() -> Settings:
     global _settings
@@ -0,0 +1,126 @@
+from __future__ import annotations
+import asyncio
+import importlib.util
+import time
+from typing import Any, Dict
+
+import httpx
+from prometheus_client import Counter, Gauge
+
+from .breaker import CircuitBreaker
+from .config import get_settings
+
+_settings = get_settings()
+
+# h2 is optional; without it httpx only speaks HTTP/1.1
+_HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+HTTP_INFLIGHT = Gauge(
+    "upstream_http_inflight_requests",
+    "Outbound requests currently holding or waiting for a pooled connection",
+    ["upstream"],
+)
+HTTP_POOL_MAX = Gauge(
+    "upstream_http_pool_max_connections",
+    "Configured connection pool size per upstream",
+    ["upstream"],
+)
+HTTP_POOL_TIMEOUTS = Counter(
+    "upstream_http_pool_timeouts_total",
+    "Outbound requests that gave up waiting for a free pooled connection",
+    ["upstream"],
+)
+
+class UpstreamClient:
+    """
+    Long-lived keep-alive client for one upstream service.
+    In-flight / pool-size gauges give saturation (inflight / max) per upstream.
+    Calls go through a circuit breaker: transport errors, 5xx and slow
+    responses count against it, and while it is open request() raises
+    CircuitOpen immediately instead of waiting on the timeout.
+    """
+
+    def __init__(self, name: str, base_url: str):
+        self.name = name
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            http2=_settings.http_http2 and _HTTP2_AVAILABLE,
+            limits=httpx.Limits(
+                max_connections=_settings.http_max_connections,
+                max_keepalive_connections=_settings.http_max_keepalive,
+                keepalive_expiry=_settings.http_keepalive_expiry_seconds,
+            ),
+            timeout=httpx.Timeout(
+                _settings.http_read_timeout_seconds,
+                connect=_settings.http_connect_timeout_seconds,
+                pool=_settings.http_pool_timeout_seconds,
+            ),
+        )
+        HTTP_POOL_MAX.labels(name).set(_settings.http_max_connections)
+        self.breaker = CircuitBreaker(
+            name,
+            window=_settings.breaker_window,
+            min_calls=_settings.breaker_min_calls,
+            failure_rate=_settings.breaker_failure_rate,
+            slow_call_seconds=_settings.breaker_slow_call_seconds,
+            open_seconds=_settings.breaker_open_seconds,
+            half_open_probes=_settings.breaker_half_open_probes,
+        ) if _settings.breaker_enabled else None
+
+    async def request(self, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        breaker = self.breaker
+        if breaker is not None:
+            breaker.before_call()
+        HTTP_INFLIGHT.labels(self.name).inc()
+        started = time.perf_counter()
+        ok: bool | None = False
+        try:
+            r = await self.client.request(method, url, **kwargs)
+            ok = r.status_code < 500
+            return r
+        except httpx.PoolTimeout:
+            HTTP_POOL_TIMEOUTS.labels(self.name).inc()
+            raise
+        except asyncio.CancelledError:
+            ok = None  # caller went away; says nothing about the upstream
+            raise
+        finally:
+            HTTP_INFLIGHT.labels(self.name).dec()
+            if breaker is not None:
+                if ok is None:
+                    breaker.abandon_call()
+                else:
+                    breaker.after_call(ok=ok, elapsed=time.perf_counter() - started)
+
+    async def get(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+_UPSTREAMS: Dict[str, str] = {
+    "trails": _settings.trails_base_url,
+    "points": _settings.points_base_url,
+}
+_clients: Dict[str, UpstreamClient] = {}
+
+def get_http_client(upstream: str) -> UpstreamClient:
+    c = _clients.get(upstream)
+    if c is None:
+        c = _clients[upstream] = UpstreamClient(upstream, _UPSTREAMS[upstream])
+    return c
+
+def http_clients_open() -> None:
+    for name in _UPSTREAMS:
+        get_http_client(name)
+
+async def http_clients_close() -> None:
+    for name in list(_clients):
+        c = _clients.pop(name)
+        try:
+            await c.aclose()
+        except Exception:
+            pass
@@ -0,0 +1,140 @@
+from __future__ import annotations
+import asyncio
+import time
+from typing import Any, Dict
+
+import httpx
+from jwt.algorithms import RSAAlgorithm
+
+from .config import get_settings
+
+_settings = get_settings()
+
+class JWKSKeyStore:
+    """
+    Parsed JWKS public keys indexed by `kid`.
+
+    Keys are parsed once per fetch (not per request). A background task refreshes
+    the set ahead of expiry; all refetches go through one lock so concurrent
+    callers share a single HTTP request instead of piling onto auth-svc.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        *,
+        ttl_seconds: int = 3600,
+        refresh_ahead_seconds: int = 300,
+        unknown_kid_cooldown_seconds: int = 30,
+        timeout: float = 5.0,
+    ):
+        self.url = url
+        self.ttl_seconds = ttl_seconds
+        self.refresh_ahead_seconds = min(refresh_ahead_seconds, ttl_seconds)
+        self.unknown_kid_cooldown_seconds = unknown_kid_cooldown_seconds
+        self.timeout = timeout
+        self._keys: Dict[str, Any] = {}
+        self._default: Any | None = None
+        self._fetched_at: float = 0.0
+        self._generation: int = 0
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def is_stale(self) -> bool:
+        return self._default is None or (time.monotonic() - self._fetched_at) > self.ttl_seconds
+
+    async def _fetch(self) -> None:
+        async with httpx.AsyncClient() as client:
+            r = await client.get(self.url, timeout=self.timeout)
+            r.raise_for_status()
+            jwks = r.json()
+        keys: Dict[str, Any] = {}
+        default: Any | None = None
+        for jwk in jwks.get("keys", []):
+            if jwk.get("kty") != "RSA":
+                continue
+            parsed = RSAAlgorithm.from_jwk(jwk)
+            if default is None:
+                default = parsed
+            if jwk.get("kid"):
+                keys[jwk["kid"]] = parsed
+        if default is None:
+            raise ValueError("JWKS contains no RSA keys")
+        # swap in one step so readers never see a half-built set
+        self._keys, self._default = keys, default
+        self._fetched_at = time.monotonic()
+        self._generation += 1
+
+    async def refresh(self, *, min_age: float = 0.0) -> None:
+        """
+        Single-flight refetch. Callers that queued behind an in-flight refresh
+        return as soon as it lands instead of fetching again.
+        """
+        seen = self._generation
+        async with self._lock:
+            if self._generation != seen:
+                return
+            if self._default is not None and (time.monotonic() - self._fetched_at) < min_age:
+                return
+            await self._fetch()
+
+    async def get_key(self, kid: str | None = None) -> Any | None:
+        if self.is_stale:
+            try:
+                await self.refresh()
+            except Exception:
+                # auth-svc unreachable: fall back to the last good set if we have one
+                if self._default is None:
+                    raise
+        if kid is None:
+            return self._default
+        key = self._keys.get(kid)
+        if key is None:
+            # unknown kid: auth-svc may have rotated; cooldown bounds refetches from junk kids
+            try:
+                await self.refresh(min_age=self.unknown_kid_cooldown_seconds)
+            except Exception:
+                return None
+            key = self._keys.get(kid)
+        return key
+
+    async def _run(self) -> None:
+        while True:
+            if self._default is None:
+                delay = 0.0
+            else:
+                age = time.monotonic() - self._fetched_at
+                delay = max(self.ttl_seconds - self.refresh_ahead_seconds - age, 0.0)
+            await asyncio.sleep(delay)
+            try:
+                await self.refresh()
+            except Exception:
+                # keep serving the current keys; retry shortly
+                await asyncio.sleep(min(self.unknown_kid_cooldown_seconds, self.refresh_ahead_seconds) or 1)
+
+    async def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+
+_keystore: JWKSKeyStore | None = None
+
+def get_keystore() -> JWKSKeyStore:
+    global _keystore
+    if _keystore is None:
+        _keystore = JWKSKeyStore(
+            _settings.auth_jwks_url,
+            ttl_seconds=_settings.jwks_ttl_seconds,
+            refresh_ahead_seconds=_settings.jwks_refresh_ahead_seconds,
+            unknown_kid_cooldown_seconds=_settings.jwks_unknown_kid_cooldown_seconds,
+        )
+    return _keystore
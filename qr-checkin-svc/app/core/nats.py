@@ -1,16 +1,42 @@
 from __future__ import annotations
+import asyncio
 import json
-from typing import Sequence
+from typing import Sequence, Awaitable, Callable
 from nats.aio.client import Client as NATS
 from .config import get_settings
 
 _settings = get_settings()
 _nats = NATS()
+_connect_lock = asyncio.Lock()  # the projection feed and the outbox relay both connect on demand
+_generation = 0  # bumped on every (re)connect: core NATS messages sent in between are lost
+
+async def _on_reconnected():
+    global _generation
+    _generation += 1
 
 async def nats_connect():
-    if not _nats.is_connected:
-        servers: Sequence[str] = [u.strip() for u in _settings.nats_urls.split(",") if u.strip()]
-        await _nats.connect(servers=servers)
+    global _generation
+    if _nats.is_connected:
+        return
+    async with _connect_lock:
+        if not _nats.is_connected:
+            servers: Sequence[str] = [u.strip() for u in _settings.nats_urls.split(",") if u.strip()]
+            await _nats.connect(servers=servers, reconnected_cb=_on_reconnected)
+            _generation += 1
+
+def nats_generation() -> int:
+    """Connection generation; a change means subscribers may have missed messages."""
+    return _generation
+
+def nats_connected() -> bool:
+    return _nats.is_connected
+
+def nats_reconnecting() -> bool:
+    return _nats.is_reconnecting
+
+def nats_closed() -> bool:
+    """True once the client gave up reconnecting (or was closed); its subscriptions are gone."""
+    return _nats.is_closed
 
 async def nats_close():
     try:
@@ -19,15 +45,23 @@ async def nats_close():
     except Exception:
         pass
 
-async def publish_checkin(evt: dict):
-    """
-    evt = {
-      "trail_id": str,
-      "org_id": str,
-      "user_id": str,
-      "checked_at": iso8601,
-      "idempotency_key": "trail_id:user_id"
-    }
-    """
+async def publish_many(msgs: list[tuple[str, bytes]]):
+    """Publish (subject, data) pairs as one burst: buffered publishes, single flush."""
+    if not msgs:
+        return
+    await nats_connect()
+    for subject, data in msgs:
+        await _nats.publish(subject, data)
+    await _nats.flush()
+
+async def subscribe_json(subject: str, cb: Callable[[dict], Awaitable[None]]):
+    """Subscribe to `subject` and invoke cb(evt_dict) for each JSON message."""
     await nats_connect()
-    await _nats.publish(_settings.nats_subject_checkin, json.dumps(evt).encode("utf-8"))
+    async def _handler(msg):
+        try:
+            data = json.loads(msg.data)
+            await cb(data)
+        except Exception:
+            # swallow to avoid breaking subscription
+            pass
+    await _nats.subscribe(subject, cb=_handler)
@@ -1,11 +1,13 @@
 from __future__ import annotations
 from datetime import datetime, timedelta, timezone
-from typing import Any, Dict, Tuple
+from typing import Any, Dict, List, Tuple
+import hashlib
+import hmac
 import secrets
 import uuid
 import jwt
 
-from ..core.config import get_settings
+from ..core.config import QRKey, get_settings
 settings = get_settings()
 
 QR_AUD = "trail-checkin"
@@ -14,12 +16,88 @@ QR_ISS = "qr-checkin-svc"
 def _now():
     return datetime.now(timezone.utc)
 
-def sign_qr(*, trail_id: uuid.UUID, org_id: uuid.UUID, issuer_id: uuid.UUID, ttl_seconds: int | None = None) -> Tuple[str, int]:
+def _utc(dt: datetime | None) -> datetime | None:
+    if dt is not None and dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt
+
+class QRKeyRing:
+    """
+    HS256 keys for QR tokens, selected by the `kid` header. Every replica
+    loads the same ring, so any replica verifies what another signed.
+
+    Rotation: add the new key with a future not_before (replicas accept it
+    before anyone signs with it), then give the old key a not_after beyond
+    the last token it may have signed (QR TTL + offline batch window).
+    """
+
+    def __init__(self, keys: List[QRKey]):
+        if not keys:
+            raise ValueError("QR key ring is empty")
+        self._keys: Dict[str, QRKey] = {}
+        for k in keys:
+            self._keys[k.kid] = k.model_copy(update={
+                "not_before": _utc(k.not_before), "not_after": _utc(k.not_after),
+            })
+        # newest first, so the signing key is the first one already in force
+        self._order = sorted(
+            self._keys.values(),
+            key=lambda k: k.not_before or datetime.min.replace(tzinfo=timezone.utc),
+            reverse=True,
+        )
+
+    def signing_key(self) -> QRKey:
+        now = _now()
+        for k in self._order:
+            if (k.not_before is None or k.not_before <= now) and (k.not_after is None or now < k.not_after):
+                return k
+        raise RuntimeError("no QR signing key is currently valid")
+
+    def verification_key(self, kid: str | None) -> QRKey | None:
+        k = self._keys.get(kid or "default")
+        if k is None:
+            return None
+        if k.not_after is not None and _now() >= k.not_after:
+            return None
+        return k
+
+def _load_keys() -> List[QRKey]:
+    if settings.qr_keys:
+        return list(settings.qr_keys)
+    if settings.qr_secret:
+        return [QRKey(kid="default", secret=settings.qr_secret)]
+    # dev only: one random key per process, so a single replica still works
+    return [QRKey(kid="default", secret=secrets.token_urlsafe(48))]
+
+_keyring: QRKeyRing | None = None
+
+def get_qr_keyring() -> QRKeyRing:
+    global _keyring
+    if _keyring is None:
+        _keyring = QRKeyRing(_load_keys())
+    return _keyring
+
+def manifest_key(kid: str | None = None) -> Tuple[str, bytes]:
+    """
+    (kid, HMAC key) for offline kiosk manifests: derived from the QR key so it
+    rotates with the ring, but kiosks provisioned with it cannot mint QR tokens.
+    Without `kid`, the current signing key's.
+    """
+    ring = get_qr_keyring()
+    k = ring.signing_key() if kid is None else ring.verification_key(kid)
+    if k is None:
+        raise KeyError(kid)
+    return k.kid, hmac.new(k.secret.encode("utf-8"), b"trail-manifest", hashlib.sha256).digest()
+
+def sign_qr(
+    *, trail_id: uuid.UUID, org_id: uuid.UUID, issuer_id: uuid.UUID,
+    ttl_seconds: int | None = None, jti: str | None = None,
+) -> Tuple[str, int]:
     exp = _now() + timedelta(seconds=ttl_seconds or settings.qr_ttl_seconds)
     payload: Dict[str, Any] = {
         "aud": QR_AUD,
         "iss": QR_ISS,
-        "jti": secrets.token_urlsafe(16),
+        "jti": jti or secrets.token_urlsafe(16),
         "iat": int(_now().timestamp()),
         "exp": int(exp.timestamp()),
         "scope": "checkin",
@@ -27,15 +105,21 @@ def sign_qr(*, trail_id: uuid.UUID, org_id: uuid.UUID, issuer_id: uuid.UUID, ttl
         "org_id": str(org_id),
         "issuer_id": str(issuer_id),  # organiser who generated the QR
     }
-    token = jwt.encode(payload, settings.qr_secret_effective, algorithm="HS256")
+    key = get_qr_keyring().signing_key()
+    token = jwt.encode(payload, key.secret, algorithm="HS256", headers={"kid": key.kid})
     return token, int(exp.timestamp())
 
-def verify_qr(token: str) -> Dict[str, Any]:
+def verify_qr(token: str, *, leeway: int = 0) -> Dict[str, Any]:
+    # leeway > 0 only for offline kiosk uploads, where scans are replayed after the QR expired
+    key = get_qr_keyring().verification_key(jwt.get_unverified_header(token).get("kid"))
+    if key is None:
+        raise jwt.InvalidTokenError("unknown or retired QR key")
     payload = jwt.decode(
         token,
-        settings.qr_secret_effective,
+        key.secret,
         algorithms=["HS256"],
         audience=QR_AUD,
+        leeway=leeway,
         options={"require": ["exp", "aud", "iss"]},
     )
     if payload.get("iss") != QR_ISS:
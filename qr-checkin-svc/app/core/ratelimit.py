@@ -0,0 +1,231 @@
+from __future__ import annotations
+import ipaddress
+import secrets
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Sequence
+
+from prometheus_client import Counter
+from redis.exceptions import NoScriptError
+
+from .config import get_settings
+from .redis import get_redis
+
+_settings = get_settings()
+
+RL_DECISIONS = Counter(
+    "rate_limit_decisions_total",
+    "Rate-limit decisions per route",
+    ["route", "algorithm", "result"],  # result: allowed | rejected | error
+)
+RL_REJECTIONS = Counter(
+    "rate_limit_rejections_total",
+    "Rejected requests by the limit scope that was exhausted",
+    ["route", "scope"],  # scope: ip | venue | sub | trail
+)
+
+@dataclass(frozen=True)
+class Limit:
+    max_reqs: int
+    window_seconds: int
+
+# Each script takes N keys with (max, window_ms) per key and is all-or-nothing:
+# a request is admitted and counted against every key only if every key has room.
+# Returns {allowed, index_of_first_exhausted_key (1-based, 0 if allowed)}.
+# Server TIME is used so replicas with skewed clocks share one timeline.
+
+_FIXED_WINDOW_LUA = """
+for i = 1, #KEYS do
+  local n = tonumber(redis.call('GET', KEYS[i]) or '0')
+  if n >= tonumber(ARGV[2*i-1]) then return {0, i} end
+end
+for i = 1, #KEYS do
+  if redis.call('INCR', KEYS[i]) == 1 then
+    redis.call('PEXPIRE', KEYS[i], ARGV[2*i])
+  end
+end
+return {1, 0}
+"""
+
+_SLIDING_WINDOW_LOG_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+for i = 1, #KEYS do
+  local window = tonumber(ARGV[2*i])
+  redis.call('ZREMRANGEBYSCORE', KEYS[i], '-inf', now - window)
+  if redis.call('ZCARD', KEYS[i]) >= tonumber(ARGV[2*i-1]) then return {0, i} end
+end
+local member = ARGV[#ARGV]
+for i = 1, #KEYS do
+  redis.call('ZADD', KEYS[i], now, member)
+  redis.call('PEXPIRE', KEYS[i], ARGV[2*i])
+end
+return {1, 0}
+"""
+
+_TOKEN_BUCKET_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local tokens = {}
+for i = 1, #KEYS do
+  local cap = tonumber(ARGV[2*i-1])
+  local rate = cap / tonumber(ARGV[2*i])  -- tokens per ms
+  local b = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+  local have = tonumber(b[1]) or cap
+  local ts = tonumber(b[2]) or now
+  have = math.min(cap, have + math.max(0, now - ts) * rate)
+  if have < 1 then return {0, i} end
+  tokens[i] = have
+end
+for i = 1, #KEYS do
+  redis.call('HSET', KEYS[i], 'tokens', tostring(tokens[i] - 1), 'ts', now)
+  redis.call('PEXPIRE', KEYS[i], ARGV[2*i])
+end
+return {1, 0}
+"""
+
+_SCRIPTS = {
+    "fixed_window": _FIXED_WINDOW_LUA,
+    "sliding_window": _SLIDING_WINDOW_LOG_LUA,
+    "token_bucket": _TOKEN_BUCKET_LUA,
+}
+
+class RedisLimiter:
+    """
+    One atomic server-side script per decision (EVALSHA, one round trip),
+    whatever the algorithm or number of keys.
+    """
+
+    def __init__(self, algorithm: str):
+        if algorithm not in _SCRIPTS:
+            raise ValueError(f"unknown rate-limit algorithm: {algorithm}")
+        self.algorithm = algorithm
+        self._script = get_redis().register_script(_SCRIPTS[algorithm])
+
+    def _call(self, keys: Sequence[str], limits: Sequence[Limit]) -> tuple[list[str], list[int | str]]:
+        args: list[int | str] = []
+        for lim in limits:
+            args += [lim.max_reqs, lim.window_seconds * 1000]
+        if self.algorithm == "sliding_window":
+            args.append(secrets.token_hex(8))  # unique ZSET member per request
+        return [f"rl:{self.algorithm}:{k}" for k in keys], args
+
+    async def hit(self, keys: Sequence[str], limits: Sequence[Limit]) -> tuple[bool, int]:
+        """Returns (allowed, index of the exhausted key or -1)."""
+        full_keys, args = self._call(keys, limits)
+        allowed, idx = await self._script(keys=full_keys, args=args)
+        return bool(allowed), int(idx) - 1
+
+    def queue(self, pipe: Any, keys: Sequence[str], limits: Sequence[Limit]) -> None:
+        """
+        Queue the decision on a caller's pipeline as a bare EVALSHA, so it shares
+        that round trip (no SCRIPT EXISTS pre-flight). A NOSCRIPT reply means it
+        did not run; see queue_request.
+        """
+        full_keys, args = self._call(keys, limits)
+        pipe.evalsha(self._script.sha, len(full_keys), *full_keys, *args)
+
+_route_limits: Dict[str, Limit] | None = None
+_venue_networks: list[ipaddress.IPv4Network | ipaddress.IPv6Network] | None = None
+_limiter: RedisLimiter | None = None
+
+def route_limit(route_key: str) -> Limit:
+    """Per-route override from RL_ROUTE_LIMITS, e.g. {"checkin.scan": "120/60"} (max/window_seconds)."""
+    global _route_limits
+    if _route_limits is None:
+        parsed: Dict[str, Limit] = {}
+        for route, spec in _settings.rl_route_limits.items():
+            max_reqs, window = spec.split("/", 1)
+            parsed[route] = Limit(int(max_reqs), int(window))
+        _route_limits = parsed
+    return _route_limits.get(route_key) or Limit(_settings.rl_max_reqs, _settings.rl_window_seconds)
+
+def is_venue_ip(ip: str) -> bool:
+    """True if ip is inside an allow-listed venue range (RL_VENUE_CIDRS)."""
+    global _venue_networks
+    if _venue_networks is None:
+        _venue_networks = [
+            ipaddress.ip_network(c.strip(), strict=False)
+            for c in _settings.rl_venue_cidrs.split(",") if c.strip()
+        ]
+    if not _venue_networks:
+        return False
+    try:
+        addr = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    return any(addr in net for net in _venue_networks)
+
+def get_limiter() -> RedisLimiter:
+    global _limiter
+    if _limiter is None:
+        _limiter = RedisLimiter(_settings.rl_algorithm)
+    return _limiter
+
+def _scopes(
+    ip: str, route_key: str, sub: str | None, trail_id: str | None
+) -> list[tuple[str, str, Limit]]:
+    """(scope, key, limit) for every dimension that applies to this request."""
+    base = route_limit(route_key)
+    window = base.window_seconds
+    if is_venue_ip(ip):
+        scopes = [("venue", f"{route_key}:ip:{ip}", Limit(max(_settings.rl_venue_max_reqs, base.max_reqs), window))]
+    else:
+        scopes = [("ip", f"{route_key}:ip:{ip}", base)]
+    if sub:
+        scopes.append(("sub", f"{route_key}:sub:{sub}", Limit(_settings.rl_sub_max_reqs, window)))
+    if trail_id:
+        scopes.append(("trail", f"{route_key}:trail:{trail_id}", Limit(_settings.rl_trail_max_reqs, window)))
+    return scopes
+
+def _settle(route_key: str, limiter: RedisLimiter, scopes: list[tuple[str, str, Limit]], reply: Any) -> bool:
+    if isinstance(reply, Exception):
+        # Redis down: fail open rather than block every check-in
+        RL_DECISIONS.labels(route_key, limiter.algorithm, "error").inc()
+        return True
+    allowed, idx = bool(reply[0]), int(reply[1]) - 1
+    RL_DECISIONS.labels(route_key, limiter.algorithm, "allowed" if allowed else "rejected").inc()
+    if not allowed:
+        RL_REJECTIONS.labels(route_key, scopes[idx][0]).inc()
+    return allowed
+
+async def allow_request(
+    ip: str, route_key: str, *, sub: str | None = None, trail_id: str | None = None
+) -> bool:
+    """
+    Composite limit: per IP (higher ceiling for venue ranges behind one NAT),
+    per authenticated sub and per trail. All keys are checked and counted in
+    one script call; a request is admitted only if every scope has room.
+    """
+    if not _settings.rl_enabled:
+        return True
+    limiter = get_limiter()
+    scopes = _scopes(ip, route_key, sub, trail_id)
+    try:
+        allowed, idx = await limiter.hit([k for _, k, _ in scopes], [lim for _, _, lim in scopes])
+        reply: Any = (int(allowed), idx + 1)
+    except Exception as e:
+        reply = e
+    return _settle(route_key, limiter, scopes, reply)
+
+def queue_request(
+    pipe: Any, ip: str, route_key: str, *, sub: str | None = None, trail_id: str | None = None
+) -> Callable[[Any], Awaitable[bool]]:
+    """
+    allow_request for callers batching several Redis commands into one pipeline
+    (executed with raise_on_error=False). Returns a coroutine function that turns
+    the pipeline's reply for this command into the decision.
+    """
+    if not _settings.rl_enabled:
+        async def _allowed(_reply: Any) -> bool:
+            return True
+        return _allowed
+    limiter = get_limiter()
+    scopes = _scopes(ip, route_key, sub, trail_id)
+    limiter.queue(pipe, [k for _, k, _ in scopes], [lim for _, _, lim in scopes])
+
+    async def _decide(reply: Any) -> bool:
+        if isinstance(reply, NoScriptError):
+            # script cache flushed (Redis restart): run it standalone, which reloads it
+            return await allow_request(ip, route_key, sub=sub, trail_id=trail_id)
+        return _settle(route_key, limiter, scopes, reply)
+    return _decide
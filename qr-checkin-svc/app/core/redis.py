@@ -21,6 +21,9 @@ async def ping_redis() -> bool:
         return False
 
 # ---- Replay guard for QR JTI ----
+def qr_jti_key(jti: str) -> str:
+    return f"qr:jti:{jti}"
+
 async def used_qr_once(jti: str, ttl_seconds: int) -> bool:
     """
     Return True if we successfully mark this JTI as used (first time),
@@ -29,21 +32,33 @@ async def used_qr_once(jti: str, ttl_seconds: int) -> bool:
     r = get_redis()
     # SET if Not eXists with EXpire
     # NX ensures first caller wins, others see False
-    ok = await r.set(f"qr:jti:{jti}", "1", ex=ttl_seconds, nx=True)
+    ok = await r.set(qr_jti_key(jti), "1", ex=ttl_seconds, nx=True)
     return bool(ok)
 
-# ---- Simple fixed-window rate limit per IP/route ----
-async def allow_request(ip: str, route_key: str) -> bool:
+async def release_qr(jti: str) -> None:
+    """Undo used_qr_once when the scan that claimed the JTI failed afterwards."""
+    try:
+        await get_redis().delete(qr_jti_key(jti))
+    except Exception:
+        pass
+
+async def used_qr_many(jtis: list[str], ttl_seconds: int) -> list[bool]:
     """
-    Fixed window: increment a counter key; allow if <= max.
+    Bulk variant of used_qr_once: one pipelined round trip of SET NX EX.
+    Result[i] is True if jtis[i] was claimed by this call.
     """
-    if not _settings.rl_enabled:
-        return True
-    r = get_redis()
-    key = f"rl:{route_key}:{ip}"
-    # INCR, set expire on first increment in a window
-    pipe = r.pipeline()
-    pipe.incr(key)
-    pipe.expire(key, _settings.rl_window_seconds)
-    count, _ = await pipe.execute()
-    return int(count) <= _settings.rl_max_reqs
+    if not jtis:
+        return []
+    pipe = get_redis().pipeline(transaction=False)
+    for jti in jtis:
+        pipe.set(qr_jti_key(jti), "1", ex=ttl_seconds, nx=True)
+    return [bool(ok) for ok in await pipe.execute()]
+
+async def release_qr_many(jtis: list[str]) -> None:
+    """Undo used_qr_many for the JTIs whose batch insert failed afterwards."""
+    if not jtis:
+        return
+    try:
+        await get_redis().delete(*(qr_jti_key(jti) for jti in jtis))
+    except Exception:
+        pass
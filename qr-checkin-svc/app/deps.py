@@ -1,42 +1,39 @@
 from __future__ import annotations
 from typing import Any, Dict, AsyncGenerator
 from fastapi import Header, HTTPException, status
-import time
-import httpx
 import jwt
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from .db import get_session
 from .core.config import get_settings
+from .core.jwks import get_keystore
+from .core.claims_cache import get_claims_cache
+from .core.http_clients import get_http_client
 
 settings = get_settings()
 
-_JWKS: Dict[str, Any] | None = None
-_JWKS_TS: float = 0.0
-_JWKS_TTL: int = 3600
-
-async def fetch_jwks() -> Dict[str, Any]:
-    global _JWKS, _JWKS_TS
-    now = time.time()
-    if _JWKS is None or (now - _JWKS_TS) > _JWKS_TTL:
-        async with httpx.AsyncClient() as client:
-            r = await client.get(settings.auth_jwks_url, timeout=5.0)
-            r.raise_for_status()
-            _JWKS = r.json()
-            _JWKS_TS = now
-    return _JWKS
-
-async def get_signing_key():
-    from jwt.algorithms import RSAAlgorithm
-    jwks = await fetch_jwks()
-    key = jwks["keys"][0]
-    return RSAAlgorithm.from_jwk(key)
+async def get_signing_key(kid: str | None = None):
+    """Pre-parsed RSA public key for `kid` (first key if the token carries none)."""
+    return await get_keystore().get_key(kid)
 
 async def get_claims(authorization: str | None = Header(default=None)) -> Dict[str, Any]:
     if not authorization or not authorization.lower().startswith("bearer "):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing token")
     token = authorization.split(" ", 1)[1].strip()
-    key = await get_signing_key()
+    cache = get_claims_cache()
+    cached = cache.get(token)
+    if cached is not None:
+        return cached
+    try:
+        kid = jwt.get_unverified_header(token).get("kid")
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+    try:
+        key = await get_signing_key(kid)
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Auth keys unavailable")
+    if key is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unknown signing key")
     try:
         payload = jwt.decode(token, key=key, algorithms=["RS256"], options={"verify_aud": False})
     except Exception:
@@ -45,6 +42,7 @@ async def get_claims(authorization: str | None = Header(default=None)) -> Dict[s
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token payload")
     if "org_ids" not in payload or not isinstance(payload["org_ids"], list):
         payload["org_ids"] = []
+    cache.put(token, payload)
     return payload
 
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
@@ -53,22 +51,26 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
 
 # --- outbound clients ---
 
+# trails-svc answered 4xx for the registration lookup: definitely not registered
+NOT_REGISTERED = "not_registered"
+
 async def trails_get_registration_status(*, token: str, trail_id: str, user_id: str) -> str | None:
-    """Return status string or None."""
-    url = f"{settings.trails_base_url}/trails/{trail_id}/registrations/by-user/{user_id}"
+    """
+    Registration status string, NOT_REGISTERED on a 4xx answer, or None if a 200
+    carried no status; raises httpx.HTTPError / CircuitOpen if trails-svc is unavailable.
+    """
     headers = {"Authorization": f"Bearer {token}"}
-    async with httpx.AsyncClient() as client:
-        r = await client.get(url, headers=headers, timeout=5.0)
-        if r.status_code == 200:
-            return r.json().get("status")
-        return None
+    r = await get_http_client("trails").get(f"/trails/{trail_id}/registrations/by-user/{user_id}", headers=headers)
+    if r.status_code == 200:
+        return r.json().get("status")
+    if r.status_code >= 500:
+        r.raise_for_status()  # upstream trouble, not "not registered"
+    return NOT_REGISTERED
 
 async def points_award_checkin(*, token: str, trail_id: str, user_id: str, org_id: str, checked_at: str):
-    url = f"{settings.points_base_url}/points/ingest/checkin"
     headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
     payload = {"trail_id": trail_id, "user_id": user_id, "org_id": org_id, "checked_at": checked_at}
-    async with httpx.AsyncClient() as client:
-        try:
-            await client.post(url, headers=headers, json=payload, timeout=5.0)
-        except Exception:
-            pass  # non-blocking for check-in path
+    try:
+        await get_http_client("points").post("/points/ingest/checkin", headers=headers, json=payload)
+    except Exception:
+        pass  # non-blocking for check-in path
@@ -7,21 +7,49 @@ from prometheus_fastapi_instrumentator import Instrumentator
 from .db import init_db
 from .routers import checkins
 from .core.redis import ping_redis
-from .core.nats import nats_connect, nats_close
+from .core.nats import nats_close
+from .core.config import get_settings
+from .services.eligibility import feed as projection_feed
+from .core.jwks import get_keystore
+from .core.qr import get_qr_keyring
+from .core.idempotency import IdempotencyMiddleware
+from .deps import get_claims
+from .core.http_clients import http_clients_open, http_clients_close
+from .services.outbox import relay as outbox_relay
+from .services.provisional import verifier as provisional_verifier
+from .services.qr_images import qr_renderer_close
+
+settings = get_settings()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
-    # best-effort connect to infra; service still runs if these fail
-    try:
-        await nats_connect()
-    except Exception:
-        pass
+    # QR key ring is parsed once; a bad QR_KEYS fails startup rather than the first scan
+    get_qr_keyring()
+    # JWKS keys are fetched and refreshed ahead of expiry in the background
+    await get_keystore().start()
+    # keep-alive pools to trails/points, reused across scans
+    http_clients_open()
+    # keeps the eligibility projection fresh from trails-activities-svc events
+    # (retries until NATS is reachable; lookups bypass the projection until then)
+    await projection_feed.start()
+    # best-effort connect to infra; service still runs if this fails
     try:
         await ping_redis()
     except Exception:
         pass
+    # drains checkins.recorded from the outbox table to NATS (retries until NATS is back)
+    await outbox_relay.start()
+    # settles check-ins accepted provisionally while trails-svc was unreachable
+    if settings.elig_degraded_policy == "accept_and_verify":
+        await provisional_verifier.start()
     yield
+    await provisional_verifier.stop()
+    await outbox_relay.stop()
+    await projection_feed.stop()
+    qr_renderer_close()
+    await get_keystore().stop()
+    await http_clients_close()
     try:
         await nats_close()
     except Exception:
@@ -29,6 +57,11 @@ async def lifespan(app: FastAPI):
 
 app = FastAPI(title="qr-checkin-svc", lifespan=lifespan)
 
+# retried scans / check-in uploads with the same Idempotency-Key replay the first response (added before CORS so CORS wraps replays too)
+app.add_middleware(IdempotencyMiddleware, routes=[
+    ("POST", "/checkin/scan"), ("POST", "/checkin/scan:batch"), ("POST", r"/checkin/trails/[^/]+/manual"),
+], claims=get_claims)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -40,6 +73,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # roster / history pages carry the next-page cursor in a header browsers must be allowed to read
+    expose_headers=["X-Next-Cursor"],
 )
 
 app.include_router(checkins.router)
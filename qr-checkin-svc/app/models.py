@@ -2,11 +2,14 @@ from __future__ import annotations
 import uuid
 from datetime import datetime, timezone
 from sqlalchemy.orm import declarative_base, Mapped, mapped_column
-from sqlalchemy import UniqueConstraint, Index
-from sqlalchemy.types import DateTime, String
+from sqlalchemy import UniqueConstraint, Index, BigInteger, Integer, text
+from sqlalchemy.types import DateTime, String, Text
 
 Base = declarative_base()
 
+# check-in recorded while trails-svc was unreachable; see services/provisional.py
+PROVISIONAL_METHOD = "qr-provisional"
+
 def utcnow():
     return datetime.now(timezone.utc)
 
@@ -23,4 +26,28 @@ class Checkin(Base):
     __table_args__ = (
         UniqueConstraint("trail_id", "user_id", name="uq_checkin_per_user_per_trail"),
         Index("ix_checkins_trail_user", "trail_id", "user_id"),
+        # keyset pagination for roster / attendee history on (checked_at, id)
+        Index("ix_checkins_trail_checked", "trail_id", "checked_at", "id"),
+        Index("ix_checkins_user_checked", "user_id", "checked_at", "id"),
+        # tiny partial index the provisional verifier polls
+        Index(
+            "ix_checkins_provisional", "checked_at",
+            postgresql_where=text(f"method = '{PROVISIONAL_METHOD}'"),
+            sqlite_where=text(f"method = '{PROVISIONAL_METHOD}'"),
+        ),
+    )
+
+# Transactional outbox: written in the same transaction as the Checkin, drained to NATS by a relay
+class OutboxEvent(Base):
+    __tablename__ = "outbox_events"
+    id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    subject: Mapped[str] = mapped_column(String(128), nullable=False)
+    payload: Mapped[str] = mapped_column(Text, nullable=False)  # JSON
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow, nullable=False)
+    available_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow, nullable=False)  # next attempt
+    attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+
+    __table_args__ = (
+        Index("ix_outbox_available", "available_at", "id"),
     )
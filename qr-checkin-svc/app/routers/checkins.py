@@ -1,28 +1,50 @@
 from __future__ import annotations
+import asyncio
+import time
 import uuid
+from collections import defaultdict
 from datetime import datetime, timezone
-from fastapi import APIRouter, Depends, HTTPException, status, Response, Header, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Response, Header, Request, BackgroundTasks, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
 
-from ..deps import get_db, get_claims, trails_get_registration_status, points_award_checkin
+from ..deps import get_db, get_claims, points_award_checkin
 from ..core.qr import sign_qr, verify_qr
-from ..schemas import QRCreateResponse, CheckinCreate, CheckinRead
+from ..schemas import (
+    QRCreateResponse, CheckinCreate, CheckinRead,
+    CheckinBatchCreate, CheckinBatchItemResult, CheckinBatchResponse, ManualCheckinCreate,
+    ArrivalsPerMinute, TrailStats,
+)
 from ..models import Checkin
-from ..services.checkins import record_checkin
-from ..core.redis import used_qr_once, allow_request
-from ..core.nats import publish_checkin
+from ..services.checkins import record_checkins_bulk, checkin_event
+from ..services.outbox import outbox_notify
+from ..services.qr_stream import qr_stream
+from ..services.scan import ScanRejected, run_scan
+from ..services.trail_stats import get_trail_stats, record_arrivals
+from ..services.roster import (
+    InvalidCursor, MEDIA_TYPES as ROSTER_MEDIA_TYPES, decode_cursor, export as roster_export, page as roster_page,
+)
+from ..services.qr_images import (
+    ImageFormat, MEDIA_TYPES, QR_IMAGE_LATENCY, RenderBusy, etag_for, get_qr_renderer,
+)
+from ..services.eligibility import get_registration_statuses, get_trail_meta, warm_trail
+from ..services.manifest import MEDIA_TYPE as MANIFEST_MEDIA_TYPE, ManifestFormat, ManifestUnavailable, build_manifest
+from ..core.redis import release_qr_many, used_qr_many
+from ..core.ratelimit import allow_request
 from ..core.config import get_settings
 
 settings = get_settings()
 router = APIRouter(prefix="/checkin", tags=["checkin"])
 
-def _now_iso():
-    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
-
 # --- 1) Organiser generates a signed QR token for a trail (short TTL)
 @router.post("/trails/{trail_id}/qr", response_model=QRCreateResponse, status_code=201)
-async def create_qr_for_trail(trail_id: uuid.UUID, claims: dict = Depends(get_claims), db: AsyncSession = Depends(get_db)):
+async def create_qr_for_trail(
+    trail_id: uuid.UUID,
+    background: BackgroundTasks,
+    claims: dict = Depends(get_claims),
+    db: AsyncSession = Depends(get_db),
+    authorization: str | None = Header(default=None),
+):
     if claims.get("role") != "organiser":
         raise HTTPException(status_code=403, detail="Organiser role required")
     org_ids = [uuid.UUID(x) for x in claims.get("org_ids", [])]
@@ -30,118 +52,408 @@ async def create_qr_for_trail(trail_id: uuid.UUID, claims: dict = Depends(get_cl
         raise HTTPException(status_code=400, detail="Organiser has no organisations")
     org_id = org_ids[0]
     token, exp = sign_qr(trail_id=trail_id, org_id=org_id, issuer_id=uuid.UUID(claims["sub"]))
+    # warm the local eligibility projection so scans skip the trails-svc call
+    background.add_task(warm_trail, token=authorization.split(" ", 1)[1].strip(), trail_id=trail_id)
     url = f"/checkin/scan?token={token}"
     return QRCreateResponse(token=token, expires_at=exp, url=url)
 
-# (Optional) PNG for kiosk demo
-@router.get("/trails/{trail_id}/qr.png")
-async def create_qr_png(trail_id: uuid.UUID, claims: dict = Depends(get_claims)):
-    import qrcode
+# Kiosk display: PNG / SVG of a QR, rendered off the event loop and cached per token
+async def _qr_image(
+    fmt: ImageFormat, trail_id: uuid.UUID, claims: dict, token: str | None, if_none_match: str | None
+) -> Response:
+    started = time.perf_counter()
     if claims.get("role") != "organiser":
         raise HTTPException(status_code=403, detail="Organiser role required")
     org_ids = claims.get("org_ids", [])
     if not org_ids:
         raise HTTPException(status_code=400, detail="No org")
-    token, _ = sign_qr(trail_id=trail_id, org_id=uuid.UUID(org_ids[0]), issuer_id=uuid.UUID(claims["sub"]))
-    img = qrcode.make(f"/checkin/scan?token={token}")
-    from io import BytesIO
-    b = BytesIO(); img.save(b, format="PNG")
-    return Response(content=b.getvalue(), media_type="image/png")
+    if token:
+        # re-display an already minted QR (kiosk refresh): cacheable until it expires
+        try:
+            qr = verify_qr(token)
+        except Exception:
+            raise HTTPException(status_code=400, detail="Invalid or expired QR")
+        if qr["trail_id"] != str(trail_id) or qr["org_id"] not in {str(x) for x in org_ids}:
+            raise HTTPException(status_code=403, detail="QR not in your organisation")
+        exp = int(qr["exp"])
+        etag = etag_for(token, fmt)
+        if if_none_match == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        headers = {
+            "ETag": etag,
+            "Cache-Control": f"private, max-age={max(0, exp - int(time.time()))}",
+        }
+    else:
+        token, exp = sign_qr(trail_id=trail_id, org_id=uuid.UUID(org_ids[0]), issuer_id=uuid.UUID(claims["sub"]))
+        headers = {"Cache-Control": "no-store"}  # a fresh QR on every call
+    try:
+        body, hit = await get_qr_renderer().image(token, exp, fmt)
+    except RenderBusy:
+        raise HTTPException(status_code=503, detail="QR renderer busy", headers={"Retry-After": "1"})
+    QR_IMAGE_LATENCY.labels(fmt, "hit" if hit else "miss").observe(time.perf_counter() - started)
+    return Response(content=body, media_type=MEDIA_TYPES[fmt], headers=headers)
+
+@router.get("/trails/{trail_id}/qr.png")
+async def create_qr_png(
+    trail_id: uuid.UUID,
+    token: str | None = None,
+    claims: dict = Depends(get_claims),
+    if_none_match: str | None = Header(default=None),
+):
+    return await _qr_image("png", trail_id, claims, token, if_none_match)
+
+@router.get("/trails/{trail_id}/qr.svg")
+async def create_qr_svg(
+    trail_id: uuid.UUID,
+    token: str | None = None,
+    claims: dict = Depends(get_claims),
+    if_none_match: str | None = Header(default=None),
+):
+    return await _qr_image("svg", trail_id, claims, token, if_none_match)
+
+# Kiosk display: one long-lived SSE stream that pushes a fresh QR whenever the shown one is used
+@router.get("/trails/{trail_id}/qr/stream")
+async def stream_qr_for_trail(
+    trail_id: uuid.UUID,
+    request: Request,
+    claims: dict = Depends(get_claims),
+):
+    if claims.get("role") != "organiser":
+        raise HTTPException(status_code=403, detail="Organiser role required")
+    org_ids = [uuid.UUID(x) for x in claims.get("org_ids", [])]
+    if not org_ids:
+        raise HTTPException(status_code=400, detail="Organiser has no organisations")
+    events = qr_stream(
+        trail_id=trail_id,
+        org_id=org_ids[0],
+        issuer_id=uuid.UUID(claims["sub"]),
+        session_exp=claims.get("exp"),
+        is_disconnected=request.is_disconnected,
+    )
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"},
+    )
 
-# --- 2) Attendee scans QR: POST with token; verify+record check-in with replay-guard and rate-limit
+# --- 2) Attendee scans QR: POST with token; staged verify -> precheck -> eligibility -> claim -> record
 @router.post("/scan", response_model=CheckinRead, status_code=201)
 async def scan_and_checkin(
     payload: CheckinCreate,
     request: Request,
+    background: BackgroundTasks,
+    claims: dict = Depends(get_claims),
+    db: AsyncSession = Depends(get_db),
+    authorization: str | None = Header(default=None),
+):
+    ip = request.client.host if request.client else "unknown"
+    try:
+        result = await run_scan(db, qr_token=payload.token, claims=claims, ip=ip, authorization=authorization)
+    except ScanRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    # arrival counters and the points HTTP fallback run after the response is sent
+    background.add_task(result.after)
+    return _to_read(result.checkin)
+
+# --- 2b) Kiosk batch upload: many (QR token, attendee) scans queued while offline
+@router.post("/scan:batch", response_model=CheckinBatchResponse)
+async def scan_batch(
+    payload: CheckinBatchCreate,
+    request: Request,
     claims: dict = Depends(get_claims),
     db: AsyncSession = Depends(get_db),
     authorization: str | None = Header(default=None),
 ):
-    # basic rate-limit per IP on scan
+    """
+    Bulk version of /scan for organiser-operated kiosks. Per-item results are
+    returned in request order; one bad item never fails the batch.
+    Replay guard is per (QR jti, attendee): an offline kiosk cannot rotate its
+    QR on consumption, so several attendees may legitimately share one token.
+    """
+    if claims.get("role") != "organiser":
+        raise HTTPException(status_code=403, detail="Organiser role required")
+    if len(payload.items) > settings.batch_max_items:
+        raise HTTPException(status_code=413, detail=f"At most {settings.batch_max_items} items per batch")
     ip = request.client.host if request.client else "unknown"
-    if not await allow_request(ip, "checkin.scan"):
+    if not await allow_request(ip, "checkin.scan_batch", sub=claims.get("sub")):
         raise HTTPException(status_code=429, detail="Too many requests")
+    if not authorization or not authorization.lower().startswith("bearer "):
+        raise HTTPException(status_code=401, detail="Missing token header")
+    raw_token = authorization.split(" ", 1)[1].strip()
+    org_scope = {str(x) for x in claims.get("org_ids", [])}
+    organiser_id = uuid.UUID(claims["sub"])
+    now = datetime.now(timezone.utc)
+
+    results: list[CheckinBatchItemResult | None] = [None] * len(payload.items)
+    def reject(i: int, status_txt: str):
+        results[i] = CheckinBatchItemResult(index=i, status=status_txt)
 
-    # a) verify QR token
+    # a) verify all QR tokens (local HMAC; expired tokens accepted up to the offline window)
+    accepted: list[tuple[int, uuid.UUID, uuid.UUID, str, datetime]] = []
+    for i, item in enumerate(payload.items):
+        try:
+            qr = verify_qr(item.token, leeway=settings.batch_qr_max_age_seconds)
+        except Exception:
+            reject(i, "invalid_qr"); continue
+        if qr["org_id"] not in org_scope:
+            reject(i, "forbidden"); continue
+        if not qr.get("jti"):
+            reject(i, "invalid_qr"); continue
+        scanned_at = item.scanned_at or now
+        if scanned_at.tzinfo is None:
+            scanned_at = scanned_at.replace(tzinfo=timezone.utc)
+        accepted.append((i, uuid.UUID(qr["trail_id"]), uuid.UUID(qr["org_id"]), qr["jti"], min(scanned_at, now)))
+
+    # b) eligibility: one grouped lookup for every (trail, attendee) in the batch
+    wanted: dict[uuid.UUID, set[uuid.UUID]] = defaultdict(set)
+    for i, trail_id, _, _, _ in accepted:
+        wanted[trail_id].add(payload.items[i].user_id)
+    statuses = await get_registration_statuses(token=raw_token, wanted=wanted) if wanted else {}
+    eligible = []
+    for row in accepted:
+        i, trail_id = row[0], row[1]
+        key = (trail_id, payload.items[i].user_id)
+        if key not in statuses:
+            reject(i, "unavailable")  # trails-svc unreachable: kiosk should retry
+        elif statuses[key] != "confirmed":
+            reject(i, "not_confirmed")
+        else:
+            eligible.append(row)
+
+    # c) replay guard, one pipelined round trip
+    replay_keys = [f"{jti}:{payload.items[i].user_id}" for i, _, _, jti, _ in eligible]
+    claimed = await used_qr_many(replay_keys, settings.qr_ttl_seconds + settings.batch_qr_max_age_seconds)
+    to_insert, claimed_keys = [], []
+    for row, key, ok in zip(eligible, replay_keys, claimed):
+        if ok:
+            to_insert.append(row)
+            claimed_keys.append(key)
+        else:
+            reject(row[0], "replayed")
+
+    # d) single multi-row idempotent insert (uq_checkin_per_user_per_trail)
+    rows, seen = [], set()
+    for i, trail_id, org_id, _, scanned_at in to_insert:
+        pair = (trail_id, payload.items[i].user_id)
+        if pair in seen:
+            continue
+        seen.add(pair)
+        rows.append({
+            "trail_id": trail_id, "org_id": org_id, "user_id": pair[1],
+            "checked_by": organiser_id, "method": "kiosk", "checked_at": scanned_at,
+        })
     try:
-        qr = verify_qr(payload.token)
-    except Exception:
-        raise HTTPException(status_code=400, detail="Invalid or expired QR")
+        created, existing = await record_checkins_bulk(db, rows)
+    except BaseException:
+        await release_qr_many(claimed_keys)  # the insert failed; let the kiosk retry the batch
+        raise
+    created_by_pair = {(c.trail_id, c.user_id): c for c in created}
+    existing_by_pair = {(c.trail_id, c.user_id): c for c in existing}
+    first_seen: set[tuple[uuid.UUID, uuid.UUID]] = set()
+    for i, trail_id, _, _, _ in to_insert:
+        pair = (trail_id, payload.items[i].user_id)
+        obj = created_by_pair.get(pair)
+        if obj is not None and pair not in first_seen:
+            first_seen.add(pair)
+            results[i] = CheckinBatchItemResult(index=i, status="created", checkin=_to_read(obj))
+        else:
+            obj = obj or existing_by_pair.get(pair)
+            results[i] = CheckinBatchItemResult(index=i, status="duplicate", checkin=_to_read(obj) if obj else None)
 
-    trail_id = uuid.UUID(qr["trail_id"])
-    org_id = uuid.UUID(qr["org_id"])
-    attendee_id = uuid.UUID(claims["sub"])
+    # e) events were committed to the outbox with the rows; the relay publishes them in one burst
+    await _after_bulk_insert(created, raw_token)
+    return _batch_response(results)
 
-    # b) replay guard on QR JTI (Redis)
-    jti = qr.get("jti")
-    ttl = settings.qr_ttl_seconds
-    if not jti or not await used_qr_once(jti, ttl):
-        # Already used by someone in TTL window → block
-        raise HTTPException(status_code=409, detail="QR already used")
+async def _after_bulk_insert(created: list[Checkin], raw_token: str) -> None:
+    if created:
+        outbox_notify()
+        await record_arrivals((c.trail_id, c.checked_at) for c in created)
+    if not settings.use_nats_for_points and created:
+        evts = [checkin_event(c) for c in created]
+        await asyncio.gather(*(points_award_checkin(
+            token=raw_token, trail_id=e["trail_id"], user_id=e["user_id"],
+            org_id=e["org_id"], checked_at=e["checked_at"],
+        ) for e in evts), return_exceptions=True)
 
-    # c) eligibility: must be confirmed in trails-activities-svc
-    if not authorization or not authorization.lower().startswith("bearer "):
-        raise HTTPException(status_code=401, detail="Missing token header")
+def _batch_response(results: list[CheckinBatchItemResult | None]) -> CheckinBatchResponse:
+    final = [r for r in results if r is not None]
+    n_created = sum(1 for r in final if r.status == "created")
+    n_dup = sum(1 for r in final if r.status == "duplicate")
+    return CheckinBatchResponse(
+        created=n_created, duplicates=n_dup, rejected=len(final) - n_created - n_dup, results=final,
+    )
+
+# --- 2c) Organiser marks attendees present from a paper list (method="manual")
+@router.post("/trails/{trail_id}/manual", response_model=CheckinBatchResponse)
+async def manual_checkin(
+    trail_id: uuid.UUID,
+    payload: ManualCheckinCreate,
+    request: Request,
+    claims: dict = Depends(get_claims),
+    db: AsyncSession = Depends(get_db),
+    authorization: str | None = Header(default=None),
+):
+    """
+    Bulk manual check-in. results[i] refers to user_ids[i]; users listed
+    twice are reported as duplicates. Same grouped eligibility lookup,
+    multi-row insert and single outbox burst as the kiosk batch upload.
+    """
+    if claims.get("role") != "organiser":
+        raise HTTPException(status_code=403, detail="Organiser role required")
+    if len(payload.user_ids) > settings.batch_max_items:
+        raise HTTPException(status_code=413, detail=f"At most {settings.batch_max_items} users per request")
+    ip = request.client.host if request.client else "unknown"
+    if not await allow_request(ip, "checkin.manual", sub=claims.get("sub"), trail_id=str(trail_id)):
+        raise HTTPException(status_code=429, detail="Too many requests")
     raw_token = authorization.split(" ", 1)[1].strip()
 
-    status_txt = await trails_get_registration_status(
-        token=raw_token, trail_id=str(trail_id), user_id=str(attendee_id)
-    )
-    if status_txt != "confirmed":
-        raise HTTPException(status_code=403, detail="Not confirmed for this trail")
+    # the trail's organisation, from the projection (warmed from trails-svc on a miss)
+    await warm_trail(token=raw_token, trail_id=trail_id)
+    meta = await get_trail_meta(trail_id)
+    if meta is None or not meta["org_id"]:
+        raise HTTPException(status_code=503, detail="Trail details unavailable, try again shortly")
+    if meta["org_id"] not in {str(x) for x in claims.get("org_ids", [])}:
+        raise HTTPException(status_code=403, detail="Trail not in your organisation")
+    org_id = uuid.UUID(meta["org_id"])
+    now = datetime.now(timezone.utc)
+    checked_at = payload.checked_at or now
+    if checked_at.tzinfo is None:
+        checked_at = checked_at.replace(tzinfo=timezone.utc)
+    checked_at = min(checked_at, now)
 
-    # d) write check-in (DB idempotency guarantees one per user+trail)
-    obj, created = await record_checkin(
-        db,
-        trail_id=trail_id,
-        org_id=org_id,
-        user_id=attendee_id,
-        checked_by=None,
-        method="qr",
-    )
+    results: list[CheckinBatchItemResult | None] = [None] * len(payload.user_ids)
+    first_index: dict[uuid.UUID, int] = {}
+    for i, user_id in enumerate(payload.user_ids):
+        first_index.setdefault(user_id, i)
 
-    # e) Emit event on NATS (idempotency key helps consumers)
-    try:
-        await publish_checkin({
-            "trail_id": str(trail_id),
-            "org_id": str(org_id),
-            "user_id": str(attendee_id),
-            "checked_at": _now_iso(),
-            "idempotency_key": f"{trail_id}:{attendee_id}"
-        })
-    except Exception:
-        # non-fatal for the check-in HTTP response
-        pass
+    # one grouped eligibility lookup for the whole list
+    statuses = await get_registration_statuses(token=raw_token, wanted={trail_id: set(first_index)})
+    rows = []
+    for user_id, i in first_index.items():
+        if (trail_id, user_id) not in statuses:
+            results[i] = CheckinBatchItemResult(index=i, status="unavailable")  # trails-svc unreachable: retry
+        elif statuses[(trail_id, user_id)] != "confirmed":
+            results[i] = CheckinBatchItemResult(index=i, status="not_confirmed")
+        else:
+            rows.append({
+                "trail_id": trail_id, "org_id": org_id, "user_id": user_id,
+                "checked_by": uuid.UUID(claims["sub"]), "method": "manual", "checked_at": checked_at,
+            })
 
-    # f) Award points: NATS-only or HTTP fallback
-    if not settings.use_nats_for_points:
-        try:
-            await points_award_checkin(
-                token=raw_token,
-                trail_id=str(trail_id),
-                user_id=str(attendee_id),
-                org_id=str(org_id),
-                checked_at=_now_iso(),
+    # single multi-row idempotent insert; outbox events commit with the rows
+    created, existing = await record_checkins_bulk(db, rows)
+    for obj, status_txt in [(c, "created") for c in created] + [(c, "duplicate") for c in existing]:
+        i = first_index[obj.user_id]
+        results[i] = CheckinBatchItemResult(index=i, status=status_txt, checkin=_to_read(obj))
+    for i, user_id in enumerate(payload.user_ids):
+        if results[i] is None:  # listed more than once
+            first = results[first_index[user_id]]
+            results[i] = CheckinBatchItemResult(
+                index=i, status="duplicate" if first.checkin else first.status, checkin=first.checkin,
             )
-        except Exception:
-            pass
 
+    await _after_bulk_insert(created, raw_token)
+    return _batch_response(results)
+
+def _to_read(r: Checkin) -> CheckinRead:
     return CheckinRead(
-        id=obj.id, trail_id=obj.trail_id, org_id=obj.org_id, user_id=obj.user_id,
-        method=obj.method, checked_at=obj.checked_at, checked_by=obj.checked_by
+        id=r.id, trail_id=r.trail_id, org_id=r.org_id, user_id=r.user_id,
+        method=r.method, checked_at=r.checked_at, checked_by=r.checked_by,
     )
 
 # --- 3) Organiser roster
+# Keyset-paginated JSON (next page cursor in X-Next-Cursor), or the whole list streamed as NDJSON/CSV.
+async def _checkin_listing(
+    db: AsyncSession, where, *, desc: bool, cursor: str | None, limit: int, fmt: str, response: Response,
+):
+    try:
+        if cursor:
+            decode_cursor(cursor)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if fmt in ROSTER_MEDIA_TYPES:
+        return StreamingResponse(
+            roster_export(where, desc=desc, cursor=cursor, fmt=fmt),
+            media_type=ROSTER_MEDIA_TYPES[fmt],
+        )
+    rows, next_cursor = await roster_page(db, where, desc=desc, cursor=cursor, limit=limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return [CheckinRead(**r) for r in rows]
+
 @router.get("/trails/{trail_id}/roster", response_model=list[CheckinRead])
-async def roster(trail_id: uuid.UUID, claims: dict = Depends(get_claims), db: AsyncSession = Depends(get_db)):
+async def roster(
+    trail_id: uuid.UUID,
+    response: Response,
+    cursor: str | None = None,
+    limit: int = Query(default=settings.roster_page_size, ge=1, le=settings.roster_max_page_size),
+    fmt: str = Query(default="json", alias="format", pattern="^(json|ndjson|csv)$"),
+    claims: dict = Depends(get_claims),
+    db: AsyncSession = Depends(get_db),
+):
+    if claims.get("role") != "organiser":
+        raise HTTPException(status_code=403, detail="Organiser role required")
+    return await _checkin_listing(
+        db, Checkin.trail_id == trail_id, desc=False, cursor=cursor, limit=limit, fmt=fmt, response=response,
+    )
+
+# --- 3b) Live arrival counters (Redis), cheap enough to poll during an event
+@router.get("/trails/{trail_id}/stats", response_model=TrailStats)
+async def trail_stats(trail_id: uuid.UUID, claims: dict = Depends(get_claims), db: AsyncSession = Depends(get_db)):
     if claims.get("role") != "organiser":
         raise HTTPException(status_code=403, detail="Organiser role required")
-    rows = (await db.execute(select(Checkin).where(Checkin.trail_id == trail_id).order_by(Checkin.checked_at.asc()))).scalars().all()
-    return [CheckinRead(id=r.id, trail_id=r.trail_id, org_id=r.org_id, user_id=r.user_id, method=r.method, checked_at=r.checked_at, checked_by=r.checked_by) for r in rows]
+    snap, source = await get_trail_stats(db, trail_id)
+    def _dt(ts: int | None) -> datetime | None:
+        return datetime.fromtimestamp(ts, timezone.utc) if ts is not None else None
+    return TrailStats(
+        trail_id=trail_id,
+        checked_in=snap["count"],
+        first_arrival_at=_dt(snap["first_at"]),
+        last_arrival_at=_dt(snap["last_at"]),
+        arrivals_per_minute=[ArrivalsPerMinute(minute=_dt(m * 60), count=n) for m, n in snap["per_minute"]],
+        source=source,
+    )
+
+# --- 3c) Offline kiosk manifest: signed, versioned list of confirmed attendees (full or delta)
+@router.get("/trails/{trail_id}/manifest")
+async def trail_manifest(
+    trail_id: uuid.UUID,
+    format: ManifestFormat = "packed",
+    since: int | None = Query(default=None, ge=0),
+    claims: dict = Depends(get_claims),
+    authorization: str | None = Header(default=None),
+    if_none_match: str | None = Header(default=None),
+):
+    if claims.get("role") != "organiser":
+        raise HTTPException(status_code=403, detail="Organiser role required")
+    token = authorization.split(" ", 1)[1].strip()
+    await warm_trail(token=token, trail_id=trail_id)
+    meta = await get_trail_meta(trail_id)
+    if meta is not None and meta["org_id"] not in {str(x) for x in claims.get("org_ids", [])}:
+        raise HTTPException(status_code=403, detail="Trail not in your organisation")
+    try:
+        body, version, kind = await build_manifest(token=token, trail_id=trail_id, fmt=format, since=since)
+    except ManifestUnavailable:
+        raise HTTPException(status_code=503, detail="Attendee list unavailable, try again shortly")
+    except Exception:
+        raise HTTPException(status_code=503, detail="Manifest store unavailable")
+    etag = f'"{version}-{kind}"'
+    headers = {"ETag": etag, "X-Manifest-Version": str(version), "X-Manifest-Kind": kind, "Cache-Control": "private, no-cache"}
+    if if_none_match == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=MANIFEST_MEDIA_TYPE, headers=headers)
 
 # --- 4) Attendee history
 @router.get("/users/me", response_model=list[CheckinRead])
-async def my_checkins(claims: dict = Depends(get_claims), db: AsyncSession = Depends(get_db)):
+async def my_checkins(
+    response: Response,
+    cursor: str | None = None,
+    limit: int = Query(default=settings.roster_page_size, ge=1, le=settings.roster_max_page_size),
+    fmt: str = Query(default="json", alias="format", pattern="^(json|ndjson|csv)$"),
+    claims: dict = Depends(get_claims),
+    db: AsyncSession = Depends(get_db),
+):
     uid = uuid.UUID(claims["sub"])
-    rows = (await db.execute(select(Checkin).where(Checkin.user_id == uid).order_by(Checkin.checked_at.desc()))).scalars().all()
-    return [CheckinRead(id=r.id, trail_id=r.trail_id, org_id=r.org_id, user_id=r.user_id, method=r.method, checked_at=r.checked_at, checked_by=r.checked_by) for r in rows]
+    return await _checkin_listing(
+        db, Checkin.user_id == uid, desc=True, cursor=cursor, limit=limit, fmt=fmt, response=response,
+    )
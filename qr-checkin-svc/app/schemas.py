@@ -19,3 +19,41 @@ class CheckinRead(BaseModel):
     method: str
     checked_at: datetime
     checked_by: UUID | None = None
+
+# --- batch ingest (kiosks syncing queued scans)
+class CheckinBatchItem(BaseModel):
+    token: str  # QR token the kiosk displayed when the attendee scanned
+    user_id: UUID  # attendee
+    scanned_at: datetime | None = None  # kiosk-local scan time; defaults to upload time
+
+class CheckinBatchCreate(BaseModel):
+    items: list[CheckinBatchItem] = Field(min_length=1)
+
+# --- organiser manual check-in (paper list); results use CheckinBatchResponse
+class ManualCheckinCreate(BaseModel):
+    user_ids: list[UUID] = Field(min_length=1)
+    checked_at: datetime | None = None  # when they were seen; defaults to now
+
+class CheckinBatchItemResult(BaseModel):
+    index: int
+    status: str  # created | duplicate | invalid_qr | forbidden | replayed | not_confirmed | unavailable
+    checkin: CheckinRead | None = None
+
+class CheckinBatchResponse(BaseModel):
+    created: int
+    duplicates: int
+    rejected: int
+    results: list[CheckinBatchItemResult]
+
+# --- live arrival counters
+class ArrivalsPerMinute(BaseModel):
+    minute: datetime
+    count: int
+
+class TrailStats(BaseModel):
+    trail_id: UUID
+    checked_in: int
+    first_arrival_at: datetime | None = None
+    last_arrival_at: datetime | None = None
+    arrivals_per_minute: list[ArrivalsPerMinute]  # last STATS_WINDOW_MINUTES, oldest first, zeros included
+    source: str  # live | reconciled | db
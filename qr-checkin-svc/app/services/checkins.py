@@ -1,8 +1,46 @@
 from __future__ import annotations
+import json
 import uuid
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from ..models import Checkin
+from sqlalchemy import select, text, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from ..core.config import get_settings
+from ..models import Checkin, utcnow
+from .outbox import enqueue
+
+settings = get_settings()
+
+def checkin_event(obj: Checkin) -> dict:
+    """checkins.recorded payload (idempotency key lets consumers dedupe redeliveries)."""
+    return {
+        "trail_id": str(obj.trail_id),
+        "org_id": str(obj.org_id),
+        "user_id": str(obj.user_id),
+        "checked_at": obj.checked_at.isoformat().replace("+00:00", "Z"),
+        "idempotency_key": f"{obj.trail_id}:{obj.user_id}",
+    }
+
+_CHECKIN_COLS = ("id", "trail_id", "org_id", "user_id", "checked_by", "method", "checked_at")
+
+# Hand-written because SQLAlchemy never caches the compiled form of a
+# postgresql insert(...).on_conflict_*() construct (its Insert sets
+# inherit_cache = False): built in Core, this statement was recompiled on every
+# scan, which cost more than the database round trip itself.
+_RECORD_CHECKIN = text(f"""
+WITH ins AS (
+    INSERT INTO checkins ({", ".join(_CHECKIN_COLS)})
+    VALUES (:id, :trail_id, :org_id, :user_id, :checked_by, :method, :checked_at)
+    ON CONFLICT (trail_id, user_id) DO NOTHING
+    RETURNING {", ".join(_CHECKIN_COLS)}
+), ob AS (
+    INSERT INTO outbox_events (subject, payload, created_at, available_at, attempts)
+    SELECT :subject, :payload, :checked_at, :checked_at, 0 FROM ins WHERE :emit_event
+)
+SELECT ins.*, true AS created FROM ins
+UNION ALL
+SELECT {", ".join("c." + col for col in _CHECKIN_COLS)}, false FROM checkins c
+WHERE c.trail_id = :trail_id AND c.user_id = :user_id AND NOT EXISTS (SELECT 1 FROM ins)
+""")
 
 async def record_checkin(
     db: AsyncSession,
@@ -12,16 +50,72 @@ async def record_checkin(
     user_id: uuid.UUID,
     checked_by: uuid.UUID | None = None,
     method: str = "qr",
-):
-    # idempotent: if exists, return existing
+    emit_event: bool = True,
+) -> tuple[Checkin, bool]:
+    """
+    Idempotent check-in write in one statement:
+
+        WITH ins AS (INSERT INTO checkins ... ON CONFLICT (trail_id, user_id) DO NOTHING RETURNING ...),
+             ob  AS (INSERT INTO outbox_events ... SELECT ... FROM ins)
+        SELECT ins.*, true FROM ins
+        UNION ALL
+        SELECT ..., false FROM checkins WHERE trail_id = ... AND user_id = ... AND NOT EXISTS (SELECT 1 FROM ins)
+
+    The outbox row only materialises when the check-in did. On conflict
+    (already checked in) the existing row comes back from the same statement
+    and the transaction is rolled back, as nothing was written; no
+    IntegrityError can surface. A row committed by a concurrent scan after the
+    statement started is not in its snapshot and is read back separately.
+    With emit_event=False (provisional check-ins) no outbox row is written;
+    the verifier emits it once confirmed.
+    """
+    row = {
+        "id": uuid.uuid4(), "trail_id": trail_id, "org_id": org_id, "user_id": user_id,
+        "checked_by": checked_by, "method": method, "checked_at": utcnow(),
+    }
+    found = (await db.execute(_RECORD_CHECKIN, {
+        **row, "subject": settings.nats_subject_checkin, "emit_event": emit_event,
+        "payload": json.dumps(checkin_event(Checkin(**row))),
+    })).first()
+    if found is not None and found.created:
+        await db.commit()
+    else:
+        await db.rollback()
+    if found is not None:
+        return Checkin(**{col: getattr(found, col) for col in _CHECKIN_COLS}), bool(found.created)
+
     existing = (await db.execute(
         select(Checkin).where(Checkin.trail_id == trail_id, Checkin.user_id == user_id)
-    )).scalar_one_or_none()
-    if existing:
-        return existing, False
+    )).scalar_one()
+    return existing, False
 
-    obj = Checkin(trail_id=trail_id, org_id=org_id, user_id=user_id, checked_by=checked_by, method=method)
-    db.add(obj)
+async def record_checkins_bulk(db: AsyncSession, rows: list[dict]) -> tuple[list[Checkin], list[Checkin]]:
+    """
+    Multi-row idempotent insert for batch ingestion.
+    rows: dicts with trail_id, org_id, user_id, checked_by, method, checked_at.
+    One INSERT ... ON CONFLICT (trail_id, user_id) DO NOTHING RETURNING for the
+    whole batch, then one SELECT for the pairs that already existed.
+    Outbox events for created rows commit in the same transaction.
+    Returns (created, existing).
+    """
+    if not rows:
+        return [], []
+    values = [{"id": uuid.uuid4(), **r} for r in rows]
+    stmt = (
+        pg_insert(Checkin)
+        .values(values)
+        .on_conflict_do_nothing(index_elements=["trail_id", "user_id"])
+        .returning(Checkin)
+    )
+    created = list((await db.execute(stmt)).scalars().all())
+    created_pairs = {(c.trail_id, c.user_id) for c in created}
+    missing = [(r["trail_id"], r["user_id"]) for r in rows if (r["trail_id"], r["user_id"]) not in created_pairs]
+    existing: list[Checkin] = []
+    if missing:
+        existing = list((await db.execute(
+            select(Checkin).where(tuple_(Checkin.trail_id, Checkin.user_id).in_(missing))
+        )).scalars().all())
+    for c in created:
+        enqueue(db, settings.nats_subject_checkin, checkin_event(c))
     await db.commit()
-    await db.refresh(obj)
-    return obj, True
+    return created, existing
@@ -0,0 +1,368 @@
+from __future__ import annotations
+import asyncio
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, Tuple
+
+import httpx
+from prometheus_client import Counter, Gauge
+
+from ..core.config import get_settings
+from ..core.redis import get_redis
+from ..core.breaker import CircuitOpen
+from ..core.http_clients import get_http_client
+from ..core.nats import nats_closed, nats_connect, nats_connected, nats_generation, nats_reconnecting, subscribe_json
+from ..deps import NOT_REGISTERED, trails_get_registration_status
+
+settings = get_settings()
+
+# Projection of trails-activities-svc registrations, shared by all replicas:
+#   elig:trail:{trail_id}       hash user_id -> registration status, expires ELIG_CACHE_TTL_SECONDS
+#                               after it was (re)created so a missed event only stays stale that long
+#   elig:trail:{trail_id}:meta  hash org_id / status / starts_at / ends_at / warmed_at
+# Both are dropped whenever a replica (re)subscribes to the events feeding them.
+ELIG_LOOKUPS = Counter(
+    "checkin_eligibility_lookups_total",
+    "Registration-status lookups on the scan path",
+    ["result"],  # hit | miss | error
+)
+
+ELIG_FEED_UP = Gauge(
+    "checkin_eligibility_feed_up",
+    "1 while this replica is subscribed to the registration / trail events feeding the projection",
+)
+
+class EligibilityUnavailable(Exception):
+    """trails-activities-svc could not be asked (circuit open, timeout, 5xx)."""
+
+def _elig_key(trail_id: uuid.UUID | str) -> str:
+    return f"elig:trail:{trail_id}"
+
+def _meta_key(trail_id: uuid.UUID | str) -> str:
+    return f"elig:trail:{trail_id}:meta"
+
+def _parse_dt(v: str | None) -> datetime | None:
+    if not v:
+        return None
+    try:
+        return datetime.fromisoformat(v.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+def _expire_at(ends_at: str | None) -> int:
+    """Keep a trail's projection until it ends (+grace), else a flat TTL."""
+    now = int(datetime.now(timezone.utc).timestamp())
+    end = _parse_dt(ends_at)
+    if end is None:
+        return now + settings.elig_cache_ttl_seconds
+    return max(int(end.timestamp()) + settings.elig_cache_grace_seconds, now + 60)
+
+def _status_expire_at(expire_at: int) -> int:
+    """Registration statuses are re-read at least every ELIG_CACHE_TTL_SECONDS."""
+    return min(expire_at, int(datetime.now(timezone.utc).timestamp()) + settings.elig_cache_ttl_seconds)
+
+async def _fetch_confirmed(*, token: str, trail_id: uuid.UUID) -> Dict[str, str] | None:
+    """Confirmed attendees of a trail as {user_id: "confirmed"}; None if trails-svc refused."""
+    r = await get_http_client("trails").get(
+        f"/trails/{trail_id}/attendees", headers={"Authorization": f"Bearer {token}"}
+    )
+    if r.status_code != 200:
+        return None
+    return {str(row["user_id"]): row["status"] for row in r.json()}
+
+def queue_replace_statuses(pipe: Any, trail_id: uuid.UUID | str, statuses: Dict[str, str], expire_at: int) -> None:
+    """
+    Queue a full replacement of a trail's projection with a fresh attendee list
+    (on a MULTI pipeline). Merging would keep users whose cancellation event
+    was missed as "confirmed"; the DEL drops them.
+    """
+    pipe.delete(_elig_key(trail_id))
+    if statuses:
+        pipe.hset(_elig_key(trail_id), mapping=statuses)
+        pipe.expireat(_elig_key(trail_id), _status_expire_at(expire_at))
+
+async def warm_trail(*, token: str, trail_id: uuid.UUID) -> None:
+    """
+    Load trail metadata and its confirmed attendees into the projection.
+    Runs as a background task after an organiser generates a QR; no-op if
+    the trail is already warm. Never raises.
+    """
+    if not settings.elig_cache_enabled:
+        return
+    try:
+        r = get_redis()
+        if await r.hexists(_meta_key(trail_id), "warmed_at"):
+            return
+        client = get_http_client("trails")
+        tr = await client.get(f"/trails/{trail_id}")
+        if tr.status_code != 200:
+            return
+        t = tr.json()
+        statuses = await _fetch_confirmed(token=token, trail_id=trail_id)
+        if statuses is None:
+            return
+        exp = _expire_at(t.get("ends_at"))
+        pipe = r.pipeline(transaction=True)
+        if feed.live:
+            queue_replace_statuses(pipe, trail_id, statuses, exp)
+        pipe.hset(_meta_key(trail_id), mapping={
+            "org_id": str(t.get("org_id", "")),
+            "status": t.get("status", ""),
+            "starts_at": t.get("starts_at", ""),
+            "ends_at": t.get("ends_at", ""),
+            "warmed_at": datetime.now(timezone.utc).isoformat(),
+        })
+        pipe.expireat(_meta_key(trail_id), exp)
+        await pipe.execute()
+    except Exception:
+        pass
+
+def _use_projection() -> bool:
+    """Projection enabled and kept current by this replica's event subscriptions."""
+    return settings.elig_cache_enabled and feed.live
+
+async def cached_status(trail_id: uuid.UUID, user_id: uuid.UUID) -> str | None:
+    """Projection value only, no HTTP fallback; None while the projection is bypassed."""
+    if not _use_projection():
+        return None
+    return await get_redis().hget(_elig_key(trail_id), str(user_id))
+
+def queue_cached_status(pipe: Any, trail_id: uuid.UUID, user_id: uuid.UUID) -> bool:
+    """Queue the projection lookup on a caller's pipeline; False if the projection is bypassed."""
+    if not _use_projection():
+        return False
+    pipe.hget(_elig_key(trail_id), str(user_id))
+    return True
+
+async def resolve_registration_status(
+    *, token: str, trail_id: uuid.UUID, user_id: uuid.UUID, cached: Any
+) -> str | None:
+    """
+    Registration status for the scan path, given the projection reply (or the
+    error it raised). A cached "confirmed" is trusted (kept fresh by
+    registrations.changed events, and at most ELIG_CACHE_TTL_SECONDS old);
+    anything else — miss, Redis error, or a non-confirmed status that may
+    since have changed — is re-checked against trails-activities-svc over
+    HTTP and written back. Raises
+    EligibilityUnavailable if trails-svc can't answer.
+    """
+    if isinstance(cached, Exception):
+        cached = None
+        ELIG_LOOKUPS.labels("error").inc()
+    if cached == "confirmed":
+        ELIG_LOOKUPS.labels("hit").inc()
+        return cached
+    ELIG_LOOKUPS.labels("miss").inc()
+    try:
+        status_txt = await trails_get_registration_status(token=token, trail_id=str(trail_id), user_id=str(user_id))
+    except (CircuitOpen, httpx.HTTPError) as e:
+        raise EligibilityUnavailable(str(e)) from e
+    if status_txt not in (None, NOT_REGISTERED) and _use_projection():
+        await _set_status(trail_id, user_id, status_txt)
+    return status_txt
+
+async def get_registration_statuses(
+    *, token: str, wanted: Dict[uuid.UUID, set[uuid.UUID]]
+) -> Dict[Tuple[uuid.UUID, uuid.UUID], str | None]:
+    """
+    Grouped variant for batch check-in: one pipelined HMGET across all trails,
+    then at most one attendee-list call per trail that still has unresolved
+    users (organiser token). Pairs whose trail could not be resolved at all are
+    left out of the result so callers can report them as retryable.
+    """
+    out: Dict[Tuple[uuid.UUID, uuid.UUID], str | None] = {}
+    order = [(trail_id, list(users)) for trail_id, users in wanted.items()]
+    cached: list[list[str | None]] | None = None
+    use_projection = _use_projection()
+    if use_projection:
+        try:
+            pipe = get_redis().pipeline(transaction=False)
+            for trail_id, users in order:
+                pipe.hmget(_elig_key(trail_id), [str(u) for u in users])
+            cached = await pipe.execute()
+        except Exception:
+            ELIG_LOOKUPS.labels("error").inc()
+
+    unresolved: Dict[uuid.UUID, list[uuid.UUID]] = {}
+    for i, (trail_id, users) in enumerate(order):
+        values = cached[i] if cached is not None else [None] * len(users)
+        for user_id, v in zip(users, values):
+            if v == "confirmed":
+                out[(trail_id, user_id)] = v
+            else:
+                unresolved.setdefault(trail_id, []).append(user_id)
+    ELIG_LOOKUPS.labels("hit").inc(len(out))
+    if not unresolved:
+        return out
+
+    async def _resolve(trail_id: uuid.UUID) -> Tuple[uuid.UUID, Dict[str, str] | None]:
+        try:
+            return trail_id, await _fetch_confirmed(token=token, trail_id=trail_id)
+        except Exception:
+            return trail_id, None
+
+    fetched = await asyncio.gather(*(_resolve(t) for t in unresolved))
+    for trail_id, statuses in fetched:
+        users = unresolved[trail_id]
+        ELIG_LOOKUPS.labels("miss").inc(len(users))
+        if statuses is None:
+            continue
+        for user_id in users:
+            out[(trail_id, user_id)] = statuses.get(str(user_id))
+        if statuses and use_projection:
+            try:
+                pipe = get_redis().pipeline(transaction=True)
+                pipe.hset(_elig_key(trail_id), mapping=statuses)
+                pipe.expire(_elig_key(trail_id), settings.elig_cache_ttl_seconds, nx=True)
+                await pipe.execute()
+            except Exception:
+                pass
+    return out
+
+async def get_trail_meta(trail_id: uuid.UUID) -> Dict[str, Any] | None:
+    """Cached trail metadata (org_id, status, starts_at, ends_at) if warmed."""
+    try:
+        meta = await get_redis().hgetall(_meta_key(trail_id))
+    except Exception:
+        return None
+    if not meta:
+        return None
+    return {
+        "org_id": meta.get("org_id") or None,
+        "status": meta.get("status") or None,
+        "starts_at": _parse_dt(meta.get("starts_at")),
+        "ends_at": _parse_dt(meta.get("ends_at")),
+    }
+
+async def _set_status(trail_id: uuid.UUID | str, user_id: uuid.UUID | str, status_txt: str) -> None:
+    try:
+        pipe = get_redis().pipeline(transaction=True)
+        pipe.hset(_elig_key(trail_id), str(user_id), status_txt)
+        # keep the TTL from the last full load; events must not extend it
+        pipe.expire(_elig_key(trail_id), settings.elig_cache_ttl_seconds, nx=True)
+        await pipe.execute()
+    except Exception:
+        pass
+
+# ---- NATS event handlers (trails-activities-svc -> qr-checkin-svc) ----
+
+async def apply_registration_event(evt: dict) -> None:
+    """
+    evt = {"trail_id", "user_id", "org_id", "status", "changed_at"}
+    """
+    trail_id = uuid.UUID(evt["trail_id"])
+    user_id = uuid.UUID(evt["user_id"])
+    await _set_status(trail_id, user_id, str(evt["status"]))
+
+async def apply_trail_event(evt: dict) -> None:
+    """
+    evt = {"trail_id", "org_id", "status", "starts_at", "ends_at", "changed_at"}
+    Cancelled trails drop their projection; otherwise metadata and its expiry
+    are refreshed for trails that are already warm (statuses keep their short TTL).
+    """
+    trail_id = uuid.UUID(evt["trail_id"])
+    r = get_redis()
+    if evt.get("status") == "cancelled":
+        await r.delete(_elig_key(trail_id), _meta_key(trail_id))
+        return
+    if not await r.hexists(_meta_key(trail_id), "warmed_at"):
+        return
+    exp = _expire_at(evt.get("ends_at"))
+    pipe = r.pipeline(transaction=True)
+    pipe.hset(_meta_key(trail_id), mapping={
+        "org_id": str(evt.get("org_id", "")),
+        "status": evt.get("status", ""),
+        "starts_at": evt.get("starts_at", ""),
+        "ends_at": evt.get("ends_at", ""),
+    })
+    pipe.expireat(_meta_key(trail_id), exp)
+    await pipe.execute()
+
+# feed health check interval, and the cap on its retry backoff while NATS is unreachable
+_FEED_CHECK_SECONDS = 5.0
+_FEED_RETRY_MAX_SECONDS = 30.0
+
+async def drop_projection() -> int:
+    """Delete every trail's projection (statuses and metadata); they are rebuilt on demand."""
+    r = get_redis()
+    n = 0
+    batch: list[str] = []
+    async for key in r.scan_iter(match="elig:trail:*", count=500):
+        batch.append(key)
+        if len(batch) >= 500:
+            n += await r.delete(*batch)
+            batch.clear()
+    if batch:
+        n += await r.delete(*batch)
+    return n
+
+class ProjectionFeed:
+    """
+    Keeps this replica subscribed to registrations.changed / trails.changed,
+    retrying in the background until NATS is reachable (and again if the
+    client gives up reconnecting). Until then the projection is bypassed:
+    events may have been missed, so a cached "confirmed" can't be trusted.
+    Events are core NATS, so every new connection (first subscribe, reconnect)
+    drops the projection before it is used again.
+    """
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+        self._subscribed: set[str] = set()
+        self._generation = 0  # nats_generation() the projection was last dropped for
+
+    def _subjects(self) -> Dict[str, Any]:
+        return {
+            settings.nats_subject_registrations: apply_registration_event,
+            settings.nats_subject_trails: apply_trail_event,
+        }
+
+    @property
+    def live(self) -> bool:
+        return (
+            self._subscribed.issuperset(self._subjects())
+            and nats_connected()
+            and self._generation == nats_generation()
+        )
+
+    async def _run(self) -> None:
+        attempts = 0
+        while True:
+            try:
+                if nats_closed():
+                    self._subscribed.clear()
+                if not nats_reconnecting():
+                    await nats_connect()
+                    for subject, cb in self._subjects().items():
+                        if subject not in self._subscribed:
+                            await subscribe_json(subject, cb)
+                            self._subscribed.add(subject)
+                    gen = nats_generation()
+                    if gen != self._generation and nats_connected():
+                        await drop_projection()
+                        self._generation = gen
+                attempts = 0
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                attempts += 1
+            ELIG_FEED_UP.set(1 if self.live else 0)
+            await asyncio.sleep(min(2 ** attempts, _FEED_RETRY_MAX_SECONDS) if attempts else _FEED_CHECK_SECONDS)
+
+    async def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+        self._subscribed.clear()
+        self._generation = 0
+        ELIG_FEED_UP.set(0)
+
+feed = ProjectionFeed()
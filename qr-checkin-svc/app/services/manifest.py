@@ -0,0 +1,206 @@
+from __future__ import annotations
+import hashlib
+import hmac
+import math
+import struct
+import time
+import uuid
+from typing import Iterable, Literal, Tuple
+
+from prometheus_client import Counter
+
+from ..core.config import get_settings
+from ..core.qr import manifest_key
+from ..core.redis import get_redis
+from .eligibility import _elig_key, _expire_at, _fetch_confirmed, feed, get_trail_meta, queue_replace_statuses
+
+settings = get_settings()
+
+# Offline kiosk manifest: the confirmed attendees of a trail as a signed binary
+# snapshot, versioned so kiosks can catch up with small deltas.
+#   manifest:trail:{id}:members    set of user_ids in the current version
+#   manifest:trail:{id}:ver        current version (seeded from the clock, +1 per change)
+#   manifest:trail:{id}:log        list "ver:+user_id" / "ver:-user_id", oldest first, capped
+#   manifest:trail:{id}:base       oldest version a delta can start from (the log is complete after it)
+#   manifest:trail:{id}:synced_at  set for MANIFEST_RESYNC_SECONDS after a full re-read of trails-svc
+# The member list comes from the eligibility projection, re-read from
+# trails-svc every MANIFEST_RESYNC_SECONDS in case an event was missed.
+#
+# Wire format (big-endian), HMAC-SHA256 over everything before the last 32 bytes:
+#   "TMF1" | kind u8 | kid_len u8 | kid | trail_id 16 | version u64 | since u64 | issued_at u32
+#   kind 1 packed: count u32 | count x 16-byte user_id, sorted (binary search)
+#   kind 2 bloom:  count u32 | k u8 | m_bits u32 | m_bits/8 bytes; bit i of byte i//8 is (0x80 >> i%8);
+#                  positions (h1 + j*h2) % m_bits for j < k, h1/h2 = first/second u64 of sha256(user_id)
+#   kind 3 delta:  added u32 | removed u32 | added x 16 sorted | removed x 16 sorted (since -> version)
+#   | hmac 32
+MAGIC = b"TMF1"
+KIND_PACKED, KIND_BLOOM, KIND_DELTA = 1, 2, 3
+MEDIA_TYPE = "application/vnd.trails.manifest"
+ManifestFormat = Literal["packed", "bloom"]
+
+MANIFEST_SERVED = Counter(
+    "checkin_manifest_served_total",
+    "Offline kiosk manifests served by kind",
+    ["kind"],  # packed | bloom | delta
+)
+
+# diff the current confirmed set against the stored one; bump the version and
+# log the changes only if something changed (all kiosks share one sequence)
+_SYNC_LUA = """
+local cur = {}
+for i = 4, #ARGV do cur[ARGV[i]] = true end
+local ver = redis.call('GET', KEYS[2])
+if not ver then
+  redis.call('DEL', KEYS[1], KEYS[3])
+  ver = ARGV[3]
+  redis.call('SET', KEYS[2], ver)
+  redis.call('SET', KEYS[4], ver)
+  for i = 4, #ARGV, 1000 do
+    redis.call('SADD', KEYS[1], unpack(ARGV, i, math.min(i + 999, #ARGV)))
+  end
+else
+  local ops = {}
+  for _, id in ipairs(redis.call('SMEMBERS', KEYS[1])) do
+    if cur[id] then cur[id] = nil else table.insert(ops, '-' .. id) end
+  end
+  for id in pairs(cur) do table.insert(ops, '+' .. id) end
+  if #ops > 0 then
+    ver = tostring(redis.call('INCR', KEYS[2]))
+    for _, op in ipairs(ops) do
+      redis.call('RPUSH', KEYS[3], ver .. ':' .. op)
+      if string.sub(op, 1, 1) == '+' then
+        redis.call('SADD', KEYS[1], string.sub(op, 2))
+      else
+        redis.call('SREM', KEYS[1], string.sub(op, 2))
+      end
+    end
+    if redis.call('LLEN', KEYS[3]) > tonumber(ARGV[2]) then
+      -- trimmed: the first retained version may have lost some of its entries
+      redis.call('LTRIM', KEYS[3], -tonumber(ARGV[2]), -1)
+      local first = redis.call('LINDEX', KEYS[3], 0)
+      redis.call('SET', KEYS[4], string.sub(first, 1, string.find(first, ':') - 1))
+    end
+  end
+end
+for i = 1, 4 do redis.call('EXPIREAT', KEYS[i], ARGV[1]) end
+return {ver, redis.call('GET', KEYS[4])}
+"""
+_sync_script = None
+
+class ManifestUnavailable(Exception):
+    """Neither the projection nor trails-activities-svc could provide the attendee list."""
+
+def _key(trail_id: uuid.UUID, part: str) -> str:
+    return f"manifest:trail:{trail_id}:{part}"
+
+def _script():
+    global _sync_script
+    if _sync_script is None:
+        _sync_script = get_redis().register_script(_SYNC_LUA)
+    return _sync_script
+
+async def _confirmed(*, token: str, trail_id: uuid.UUID, warm: bool, expire_at: int) -> list[str]:
+    """
+    Confirmed user_ids: from trails-svc when a resync is due (replacing the
+    projection, so missed cancellations are repaired) or the projection has
+    expired or been dropped, else from the projection.
+    While this replica isn't subscribed to registration events the projection
+    is bypassed: every build asks trails-svc.
+    """
+    r = get_redis()
+    live = feed.live
+    if not live or await r.exists(_key(trail_id, "synced_at"), _elig_key(trail_id)) < 2:
+        try:
+            statuses = await _fetch_confirmed(token=token, trail_id=trail_id)
+        except Exception:
+            statuses = None
+        if statuses is not None:
+            if live:
+                pipe = r.pipeline(transaction=True)
+                queue_replace_statuses(pipe, trail_id, statuses, expire_at)
+                pipe.set(_key(trail_id, "synced_at"), int(time.time()), ex=settings.manifest_resync_seconds)
+                await pipe.execute()
+            return [u for u, s in statuses.items() if s == "confirmed"]
+        if not warm or not live:
+            raise ManifestUnavailable(str(trail_id))
+    # between resyncs (or while trails-svc is down) the event-fed projection is current enough
+    return [u for u, s in (await r.hgetall(_elig_key(trail_id))).items() if s == "confirmed"]
+
+def _bloom(ids: list[bytes]) -> Tuple[int, int, bytes]:
+    n = max(len(ids), 1)
+    m = max(64, math.ceil(-n * math.log(settings.manifest_bloom_fpr) / (math.log(2) ** 2)))
+    m = (m + 7) // 8 * 8
+    k = min(16, max(1, round(m / n * math.log(2))))
+    bits = bytearray(m // 8)
+    for raw in ids:
+        h1, h2 = struct.unpack("!QQ", hashlib.sha256(raw).digest()[:16])
+        for j in range(k):
+            pos = (h1 + j * h2) % m
+            bits[pos // 8] |= 0x80 >> (pos % 8)
+    return k, m, bytes(bits)
+
+def _packed(ids: Iterable[str]) -> list[bytes]:
+    return sorted(uuid.UUID(u).bytes for u in ids)
+
+def _encode(kind: int, trail_id: uuid.UUID, version: int, since: int, payload: bytes) -> bytes:
+    kid, secret = manifest_key()
+    kid_b = kid.encode("utf-8")
+    body = MAGIC + struct.pack("!BB", kind, len(kid_b)) + kid_b + trail_id.bytes + struct.pack(
+        "!QQI", version, since, int(time.time())
+    ) + payload
+    return body + hmac.new(secret, body, hashlib.sha256).digest()
+
+def _delta(entries: list[str], since: int, version: int, base: int) -> Tuple[list[str], list[str]] | None:
+    """Net changes (added, removed) from `since` to `version`, or None if the log no longer covers it."""
+    if since == version:
+        return [], []
+    if not base <= since < version:
+        return None  # trimmed out of the log, or from before the manifest was rebuilt
+    added: set[str] = set()
+    removed: set[str] = set()
+    for e in entries:
+        v, op = e.split(":", 1)
+        if int(v) <= since or int(v) > version:
+            continue
+        user_id = op[1:]
+        if op[0] == "+":
+            added.add(user_id)
+            removed.discard(user_id)
+        else:
+            removed.add(user_id)
+            added.discard(user_id)
+    return list(added), list(removed)
+
+async def build_manifest(
+    *, token: str, trail_id: uuid.UUID, fmt: ManifestFormat = "packed", since: int | None = None
+) -> Tuple[bytes, int, str]:
+    """
+    (signed manifest, version, kind). With `since`, a delta from that version
+    when the change log still covers it, otherwise a full snapshot in `fmt`.
+    """
+    meta = await get_trail_meta(trail_id)
+    exp = _expire_at(meta["ends_at"].isoformat() if meta and meta["ends_at"] else None)
+    users = await _confirmed(token=token, trail_id=trail_id, warm=meta is not None, expire_at=exp)
+    version, base = map(int, await _script()(
+        keys=[_key(trail_id, "members"), _key(trail_id, "ver"), _key(trail_id, "log"), _key(trail_id, "base")],
+        args=[exp, settings.manifest_log_max, int(time.time() * 1000), *users],
+    ))
+
+    if since is not None:
+        change = _delta(await get_redis().lrange(_key(trail_id, "log"), 0, -1), since, version, base)
+        if change is not None:
+            added, removed = _packed(change[0]), _packed(change[1])
+            payload = struct.pack("!II", len(added), len(removed)) + b"".join(added) + b"".join(removed)
+            MANIFEST_SERVED.labels("delta").inc()
+            return _encode(KIND_DELTA, trail_id, version, since, payload), version, "delta"
+
+    ids = _packed(users)
+    if fmt == "bloom":
+        k, m, bits = _bloom(ids)
+        payload = struct.pack("!IBI", len(ids), k, m) + bits
+        kind = KIND_BLOOM
+    else:
+        payload = struct.pack("!I", len(ids)) + b"".join(ids)
+        kind = KIND_PACKED
+    MANIFEST_SERVED.labels(fmt).inc()
+    return _encode(kind, trail_id, version, 0, payload), version, fmt
@@ -0,0 +1,168 @@
+from __future__ import annotations
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import httpx
+from prometheus_client import Counter, Gauge
+from sqlalchemy import delete, func, select, tuple_, update
+
+from ..core.breaker import CircuitOpen
+from ..core.config import get_settings
+from ..core.http_clients import get_http_client
+from ..core.redis import get_redis
+from ..db import async_session_maker
+from ..deps import trails_get_registration_status
+from ..models import PROVISIONAL_METHOD, Checkin, utcnow
+from .checkins import checkin_event
+from .eligibility import cached_status
+from .outbox import enqueue, outbox_notify
+
+settings = get_settings()
+
+# Degraded mode (ELIG_DEGRADED_POLICY=accept_and_verify): while trails-svc is
+# unreachable, scans are recorded with method="qr-provisional" and no
+# checkins.recorded event. The verifier below confirms them later (method ->
+# "qr", event emitted, points awarded) or voids them (row deleted). Once the
+# attendee's token has expired only the projection can decide; rows it never
+# answers for are voided after ELIG_VERIFY_MAX_AGE_SECONDS ("expired").
+#   elig:verify:token:{checkin_id}  attendee bearer token, kept until it expires
+PROVISIONAL = Counter(
+    "checkin_provisional_total",
+    "Provisional (unverified) check-ins by outcome",
+    ["result"],  # accepted | confirmed | voided | expired
+)
+PROVISIONAL_PENDING = Gauge("checkin_provisional_pending", "Provisional check-ins awaiting verification")
+
+def _token_key(checkin_id: uuid.UUID | str) -> str:
+    return f"elig:verify:token:{checkin_id}"
+
+async def hold_for_verification(checkin_id: uuid.UUID, token: str, ttl_seconds: int) -> None:
+    """Keep the attendee's token so the verifier can ask trails-svc on their behalf."""
+    PROVISIONAL.labels("accepted").inc()
+    if ttl_seconds <= 0:
+        return
+    try:
+        await get_redis().set(_token_key(checkin_id), token, ex=ttl_seconds)
+    except Exception:
+        pass
+
+async def _status(row: Checkin) -> tuple[str | None, bool]:
+    """
+    (registration status, can still be asked) for a provisional row. A None
+    status means it can't be decided yet (trails-svc unavailable); with False,
+    only a projection entry can still decide it, as the attendee's token has
+    expired. A 4xx from trails-svc comes back as NOT_REGISTERED and voids the row.
+    """
+    cached = await cached_status(row.trail_id, row.user_id)
+    if cached == "confirmed":
+        return cached, True
+    token = await get_redis().get(_token_key(row.id))
+    if not token:
+        return cached, False  # token expired: only the event-fed projection can decide
+    try:
+        status_txt = await trails_get_registration_status(token=token, trail_id=str(row.trail_id), user_id=str(row.user_id))
+    except (CircuitOpen, httpx.HTTPError):
+        return None, True
+    return status_txt, True
+
+def _aware(dt: datetime) -> datetime:
+    return dt if dt.tzinfo is not None else dt.replace(tzinfo=timezone.utc)
+
+async def verify_once(after: tuple | None = None) -> tuple[int, tuple | None]:
+    """
+    Settle one page of provisional check-ins, oldest first, starting after the
+    (checked_at, id) key `after`. Returns (settled, key to continue from or None
+    when done), so rows that can't be decided yet never starve newer ones.
+    """
+    breaker = get_http_client("trails").breaker
+    if breaker is not None and breaker.is_open:
+        return 0, None
+    settled = confirmed = 0
+    cutoff = utcnow() - timedelta(seconds=settings.elig_verify_max_age_seconds)
+    async with async_session_maker() as db:
+        stmt = select(Checkin).where(Checkin.method == PROVISIONAL_METHOD)
+        if after is not None:
+            stmt = stmt.where(tuple_(Checkin.checked_at, Checkin.id) > tuple_(*after))
+        rows = (await db.execute(
+            stmt.order_by(Checkin.checked_at, Checkin.id).limit(settings.elig_verify_batch_size)
+        )).scalars().all()
+        for row in rows:
+            status_txt, askable = await _status(row)
+            if status_txt == "confirmed":
+                res = await db.execute(
+                    update(Checkin)
+                    .where(Checkin.id == row.id, Checkin.method == PROVISIONAL_METHOD)
+                    .values(method="qr")
+                )
+                if res.rowcount:  # another replica may have settled it first
+                    enqueue(db, settings.nats_subject_checkin, checkin_event(row))
+                    PROVISIONAL.labels("confirmed").inc()
+                    confirmed += 1
+            elif status_txt is not None:
+                res = await db.execute(
+                    delete(Checkin).where(Checkin.id == row.id, Checkin.method == PROVISIONAL_METHOD)
+                )
+                if res.rowcount:
+                    PROVISIONAL.labels("voided").inc()
+            elif not askable and _aware(row.checked_at) < cutoff:
+                # nothing left that could confirm it: don't keep it pending forever
+                res = await db.execute(
+                    delete(Checkin).where(Checkin.id == row.id, Checkin.method == PROVISIONAL_METHOD)
+                )
+                if res.rowcount:
+                    PROVISIONAL.labels("expired").inc()
+            else:
+                continue
+            settled += 1
+            try:
+                await get_redis().delete(_token_key(row.id))
+            except Exception:
+                pass
+        await db.commit()
+    if confirmed:
+        outbox_notify()
+    if len(rows) < settings.elig_verify_batch_size:
+        return settled, None
+    return settled, (rows[-1].checked_at, rows[-1].id)
+
+async def refresh_pending_gauge() -> None:
+    async with async_session_maker() as db:
+        pending = (await db.execute(
+            select(func.count(Checkin.id)).where(Checkin.method == PROVISIONAL_METHOD)
+        )).scalar_one()
+    PROVISIONAL_PENDING.set(pending)
+
+class ProvisionalVerifier:
+    """Background task settling provisional check-ins once trails-svc answers again."""
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                _, after = await verify_once()
+                while after is not None:
+                    _, after = await verify_once(after)
+                await refresh_pending_gauge()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                pass  # Redis/DB hiccup; try again on the next tick
+            await asyncio.sleep(settings.elig_verify_interval_seconds)
+
+    async def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+
+verifier = ProvisionalVerifier()
@@ -0,0 +1,126 @@
+from __future__ import annotations
+import asyncio
+import hashlib
+import io
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Literal, Tuple
+
+from prometheus_client import Counter, Histogram
+
+from ..core.config import get_settings
+
+settings = get_settings()
+
+ImageFormat = Literal["png", "svg"]
+MEDIA_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+QR_IMAGE_LATENCY = Histogram(
+    "checkin_qr_image_request_seconds",
+    "QR image endpoint latency",
+    ["format", "cache"],  # cache: hit | miss
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+QR_RENDER_REJECTED = Counter(
+    "checkin_qr_render_rejected_total",
+    "QR renders refused because the render pool queue was full",
+)
+
+class RenderBusy(Exception):
+    """Render pool is saturated; caller should answer 503."""
+
+def _render(data: str, fmt: ImageFormat) -> bytes:
+    # qrcode is pure CPU work (PIL if installed, else pypng) — runs in the pool, never on the loop
+    import qrcode
+    if fmt == "svg":
+        from qrcode.image.svg import SvgPathImage
+        return qrcode.make(data, image_factory=SvgPathImage).to_string()
+    b = io.BytesIO()
+    qrcode.make(data).save(b)
+    return b.getvalue()
+
+class QRImageCache:
+    """
+    Small LRU of rendered images keyed by (token digest, format). An entry is
+    dropped once its QR token expires, since the image is useless after that.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[bytes, str], Tuple[float, bytes]]" = OrderedDict()
+
+    @staticmethod
+    def _key(token: str, fmt: str) -> Tuple[bytes, str]:
+        return hashlib.sha256(token.encode("utf-8")).digest(), fmt
+
+    def get(self, token: str, fmt: str) -> bytes | None:
+        key = self._key(token, fmt)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        exp, body = entry
+        if exp <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return body
+
+    def put(self, token: str, fmt: str, exp: float, body: bytes) -> None:
+        if self.max_entries <= 0:
+            return
+        key = self._key(token, fmt)
+        self._entries[key] = (exp, body)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+class QRRenderer:
+    """
+    Bounded thread pool for QR rendering. At most `workers` renders run at a
+    time and at most `max_pending` more may wait; beyond that callers get
+    RenderBusy instead of piling work onto the pool.
+    """
+
+    def __init__(self, workers: int, max_pending: int, cache_entries: int):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="qr-render")
+        self._slots = asyncio.Semaphore(workers + max_pending)
+        self.cache = QRImageCache(cache_entries)
+
+    async def image(self, token: str, exp: int, fmt: ImageFormat) -> Tuple[bytes, bool]:
+        """Rendered image for a scan URL carrying `token`; returns (body, cache_hit)."""
+        cached = self.cache.get(token, fmt)
+        if cached is not None:
+            return cached, True
+        if self._slots.locked():
+            QR_RENDER_REJECTED.inc()
+            raise RenderBusy()
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            body = await loop.run_in_executor(self._pool, _render, f"/checkin/scan?token={token}", fmt)
+        self.cache.put(token, fmt, exp, body)
+        return body, False
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+_renderer: QRRenderer | None = None
+
+def get_qr_renderer() -> QRRenderer:
+    global _renderer
+    if _renderer is None:
+        _renderer = QRRenderer(
+            workers=settings.qr_render_workers,
+            max_pending=settings.qr_render_max_pending,
+            cache_entries=settings.qr_image_cache_entries,
+        )
+    return _renderer
+
+def qr_renderer_close() -> None:
+    global _renderer
+    if _renderer is not None:
+        _renderer.shutdown()
+        _renderer = None
+
+def etag_for(token: str, fmt: str) -> str:
+    return '"' + hashlib.sha256(f"{fmt}:{token}".encode("utf-8")).hexdigest()[:32] + '"'
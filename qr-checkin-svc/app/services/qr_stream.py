@@ -0,0 +1,130 @@
+from __future__ import annotations
+import asyncio
+import json
+import secrets
+import time
+import uuid
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Deque, Tuple
+
+from prometheus_client import Counter, Gauge
+
+from ..core.config import get_settings
+from ..core.qr import sign_qr
+from ..core.redis import get_redis, qr_jti_key
+
+settings = get_settings()
+
+# Scans publish the consumed JTI here; kiosk streams for that trail rotate on it.
+#   qr:consumed:{trail_id}  pub/sub channel, message = jti
+QR_STREAMS_OPEN = Gauge("checkin_qr_streams_open", "Kiosk QR streams currently connected")
+QR_STREAM_ROTATIONS = Counter(
+    "checkin_qr_stream_rotations_total",
+    "QR tokens pushed to kiosk streams",
+    ["reason"],  # initial | consumed | expiring
+)
+
+def _channel(trail_id: uuid.UUID | str) -> str:
+    return f"qr:consumed:{trail_id}"
+
+async def publish_consumed(trail_id: uuid.UUID | str, jti: str) -> None:
+    """Tell kiosk streams for this trail that `jti` was just burned. Best-effort."""
+    try:
+        await get_redis().publish(_channel(trail_id), jti)
+    except Exception:
+        pass
+
+def _rotate_margin() -> int:
+    """Rotate when this little lifetime is left; never more than half the QR TTL."""
+    return min(settings.qr_stream_min_remaining_seconds, settings.qr_ttl_seconds // 2)
+
+async def _jti_used(jti: str) -> bool:
+    try:
+        return bool(await get_redis().exists(qr_jti_key(jti)))
+    except Exception:
+        return False
+
+class _TokenBatch:
+    """Pre-minted QR tokens; stale ones (too close to expiry) are skipped."""
+
+    def __init__(self, *, trail_id: uuid.UUID, org_id: uuid.UUID, issuer_id: uuid.UUID):
+        self.trail_id, self.org_id, self.issuer_id = trail_id, org_id, issuer_id
+        self._tokens: Deque[Tuple[str, str, int]] = deque()
+
+    def next(self) -> Tuple[str, str, int]:
+        """(token, jti, exp) with more than the rotation margin left."""
+        horizon = time.time() + _rotate_margin()
+        while self._tokens and self._tokens[0][2] <= horizon:
+            self._tokens.popleft()
+        if not self._tokens:
+            for _ in range(max(1, settings.qr_stream_premint)):
+                jti = secrets.token_urlsafe(16)
+                token, exp = sign_qr(trail_id=self.trail_id, org_id=self.org_id, issuer_id=self.issuer_id, jti=jti)
+                self._tokens.append((token, jti, exp))
+        return self._tokens.popleft()
+
+def _event(token: str, exp: int) -> str:
+    data = {"token": token, "expires_at": exp, "url": f"/checkin/scan?token={token}"}
+    return f"event: qr\ndata: {json.dumps(data)}\n\n"
+
+async def qr_stream(
+    *,
+    trail_id: uuid.UUID,
+    org_id: uuid.UUID,
+    issuer_id: uuid.UUID,
+    session_exp: float | None,
+    is_disconnected: Callable[[], Awaitable[bool]],
+) -> AsyncIterator[str]:
+    """
+    Server-sent events for a kiosk display: one `qr` event with a fresh token
+    now, then another whenever the shown JTI is consumed (pub/sub signal) or
+    is about to expire. Pub/sub is fire-and-forget, so each idle tick also
+    checks the JTI's replay-guard key in case a signal was missed. The stream
+    ends when the organiser's access token expires; the kiosk reconnects.
+    """
+    batch = _TokenBatch(trail_id=trail_id, org_id=org_id, issuer_id=issuer_id)
+    margin = _rotate_margin()
+    pubsub = get_redis().pubsub()
+    try:
+        await pubsub.subscribe(_channel(trail_id))
+    except Exception:
+        pubsub = None  # Redis unavailable: fall back to polling the replay-guard key
+    QR_STREAMS_OPEN.inc()
+    try:
+        token, jti, exp = batch.next()
+        QR_STREAM_ROTATIONS.labels("initial").inc()
+        yield _event(token, exp)
+        while True:
+            now = time.time()
+            if session_exp is not None and now >= session_exp:
+                return
+            if await is_disconnected():
+                return
+            timeout = max(0.0, min(exp - margin - now, settings.qr_stream_heartbeat_seconds))
+            msg = None
+            if pubsub is not None:
+                msg = await pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+            else:
+                await asyncio.sleep(timeout)
+            reason = None
+            if msg is not None:
+                if msg.get("data") == jti:
+                    reason = "consumed"
+            elif time.time() >= exp - margin:
+                reason = "expiring"
+            elif await _jti_used(jti):
+                reason = "consumed"
+            else:
+                yield ": ping\n\n"  # keeps proxies from closing an idle stream
+            if reason:
+                token, jti, exp = batch.next()
+                QR_STREAM_ROTATIONS.labels(reason).inc()
+                yield _event(token, exp)
+    finally:
+        QR_STREAMS_OPEN.dec()
+        if pubsub is not None:
+            try:
+                await pubsub.unsubscribe()
+                await pubsub.aclose()
+            except Exception:
+                pass
@@ -0,0 +1,94 @@
+from __future__ import annotations
+import base64
+import csv
+import io
+import json
+import uuid
+from datetime import datetime
+from typing import AsyncIterator, Literal, Tuple
+
+from sqlalchemy import Select, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import ColumnElement
+
+from ..core.config import get_settings
+from ..db import async_session_maker
+from ..models import Checkin
+
+settings = get_settings()
+
+ExportFormat = Literal["ndjson", "csv"]
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+_COLUMNS = ("id", "trail_id", "org_id", "user_id", "method", "checked_at", "checked_by")
+
+class InvalidCursor(ValueError):
+    pass
+
+def encode_cursor(checked_at: datetime, id_: uuid.UUID) -> str:
+    raw = json.dumps([checked_at.isoformat(), str(id_)]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        ts, id_ = json.loads(raw)
+        return datetime.fromisoformat(ts), uuid.UUID(id_)
+    except Exception:
+        raise InvalidCursor("invalid cursor")
+
+def _keyset(where: ColumnElement[bool], *, desc: bool, cursor: str | None) -> Select:
+    """
+    Rows matching `where` in (checked_at, id) order, strictly after `cursor`.
+    The row-value comparison lets the (…, checked_at, id) index seek straight
+    to the page instead of scanning an OFFSET.
+    """
+    cols = [getattr(Checkin, c) for c in _COLUMNS]
+    stmt = select(*cols).where(where)
+    key = tuple_(Checkin.checked_at, Checkin.id)
+    if cursor:
+        after = tuple_(*decode_cursor(cursor))
+        stmt = stmt.where(key < after if desc else key > after)
+    if desc:
+        return stmt.order_by(Checkin.checked_at.desc(), Checkin.id.desc())
+    return stmt.order_by(Checkin.checked_at.asc(), Checkin.id.asc())
+
+async def page(
+    db: AsyncSession, where: ColumnElement[bool], *, desc: bool, cursor: str | None, limit: int
+) -> Tuple[list[dict], str | None]:
+    """One page of check-ins plus the cursor for the next one (None on the last page)."""
+    rows = (await db.execute(_keyset(where, desc=desc, cursor=cursor).limit(limit + 1))).mappings().all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(rows[-1]["checked_at"], rows[-1]["id"]) if more else None
+    return [dict(r) for r in rows], next_cursor
+
+def _ndjson(rows) -> str:
+    return "".join(
+        json.dumps({k: (v.isoformat() if isinstance(v, datetime) else str(v) if v is not None else None)
+                    for k, v in r.items()}) + "\n"
+        for r in rows
+    )
+
+def _csv(rows, *, header: bool) -> str:
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    if header:
+        w.writerow(_COLUMNS)
+    for r in rows:
+        w.writerow(["" if r[c] is None else (r[c].isoformat() if isinstance(r[c], datetime) else r[c]) for c in _COLUMNS])
+    return buf.getvalue()
+
+async def export(where: ColumnElement[bool], *, desc: bool, cursor: str | None, fmt: ExportFormat) -> AsyncIterator[str]:
+    """
+    Stream every matching check-in as NDJSON or CSV. Uses its own session and
+    a server-side cursor fetched in chunks, so memory stays flat however large
+    the roster is (the request's session is closed before the body streams).
+    """
+    chunk = settings.roster_stream_chunk_size
+    stmt = _keyset(where, desc=desc, cursor=cursor).execution_options(yield_per=chunk)
+    async with async_session_maker() as db:
+        result = await db.stream(stmt)
+        if fmt == "csv":
+            yield _csv([], header=True)
+        async for rows in result.mappings().partitions(chunk):
+            yield _csv(rows, header=False) if fmt == "csv" else _ndjson(rows)
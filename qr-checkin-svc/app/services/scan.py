@@ -0,0 +1,177 @@
+from __future__ import annotations
+import asyncio
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Iterator
+
+from prometheus_client import Counter, Histogram
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.config import get_settings
+from ..core.qr import verify_qr
+from ..core.ratelimit import queue_request
+from ..core.redis import get_redis, qr_jti_key, release_qr, used_qr_once
+from ..deps import points_award_checkin
+from ..models import PROVISIONAL_METHOD, Checkin
+from .checkins import checkin_event, record_checkin
+from .eligibility import EligibilityUnavailable, queue_cached_status, resolve_registration_status
+from .outbox import outbox_notify
+from .provisional import hold_for_verification
+from .qr_stream import publish_consumed
+from .trail_stats import record_arrivals
+
+settings = get_settings()
+
+# Stages of POST /checkin/scan, in order:
+#   verify       QR HMAC + bearer header (local, no I/O)
+#   precheck     one Redis round trip: rate limit + cached eligibility + JTI already used?
+#   eligibility  trails-svc HTTP, only when the projection had no "confirmed";
+#                if trails-svc is unavailable, ELIG_DEGRADED_POLICY applies
+#   claim        SET NX on the JTI — only once the scan is known to be acceptable
+#   record       check-in + outbox row (one statement); once it is written, the kiosk rotation signal
+#   after        arrival counters / points HTTP fallback, after the response is sent
+SCAN_STAGE_SECONDS = Histogram(
+    "checkin_scan_stage_seconds",
+    "Time spent in each stage of the scan pipeline",
+    ["stage"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+SCAN_OUTCOMES = Counter(
+    "checkin_scan_outcomes_total",
+    "Scan results by outcome",
+    ["outcome"],  # created | provisional | duplicate | rate_limited | invalid_qr | replayed | not_confirmed | unavailable | unauthenticated | error
+)
+
+class ScanRejected(Exception):
+    def __init__(self, status_code: int, detail: str, outcome: str):
+        super().__init__(detail)
+        self.status_code, self.detail, self.outcome = status_code, detail, outcome
+
+@dataclass
+class ScanResult:
+    checkin: Checkin
+    created: bool
+    after: Callable[[], Awaitable[None]]  # post-response work (BackgroundTasks)
+
+@contextmanager
+def _stage(name: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        SCAN_STAGE_SECONDS.labels(name).observe(time.perf_counter() - started)
+
+def _reject(status_code: int, detail: str, outcome: str) -> ScanRejected:
+    SCAN_OUTCOMES.labels(outcome).inc()
+    return ScanRejected(status_code, detail, outcome)
+
+async def run_scan(
+    db: AsyncSession, *, qr_token: str, claims: dict, ip: str, authorization: str | None
+) -> ScanResult:
+    """
+    Attendee scan pipeline. Nothing is written — in particular the JTI is not
+    burned — until the scan has passed rate limit, QR and eligibility checks,
+    and the JTI is released again if the DB write fails.
+    """
+    with _stage("verify"):
+        try:
+            qr = verify_qr(qr_token)
+        except Exception:
+            qr = None
+        raw_token = None
+        if authorization and authorization.lower().startswith("bearer "):
+            raw_token = authorization.split(" ", 1)[1].strip()
+
+    attendee_id = uuid.UUID(claims["sub"])
+    trail_id = uuid.UUID(qr["trail_id"]) if qr else None
+    jti = qr.get("jti") if qr else None
+
+    with _stage("precheck"):
+        # composite rate-limit: per IP (venue ranges get a higher ceiling), per attendee, per trail
+        pipe = get_redis().pipeline(transaction=False)
+        decide = queue_request(pipe, ip, "checkin.scan", sub=claims.get("sub"), trail_id=qr["trail_id"] if qr else None)
+        limited = len(pipe) > 0  # False when rate limiting is disabled
+        check_elig = bool(qr and raw_token) and queue_cached_status(pipe, trail_id, attendee_id)
+        if jti:
+            pipe.exists(qr_jti_key(jti))
+        queued = len(pipe)
+        try:
+            replies = list(await pipe.execute(raise_on_error=False)) if queued else []
+        except Exception as e:
+            replies = [e] * queued  # connection failed: treat every command as errored
+        allowed = await decide(replies.pop(0) if limited else None)
+        cached = replies.pop(0) if check_elig else None
+        seen = replies.pop(0) if jti else None
+    if not allowed:
+        raise _reject(429, "Too many requests", "rate_limited")
+    if qr is None:
+        raise _reject(400, "Invalid or expired QR", "invalid_qr")
+    if not jti or (isinstance(seen, int) and seen > 0):
+        raise _reject(409, "QR already used", "replayed")
+    if raw_token is None:
+        raise _reject(401, "Missing token header", "unauthenticated")
+
+    # eligibility: must be confirmed in trails-activities-svc (local projection, HTTP on miss)
+    provisional = False
+    with _stage("eligibility"):
+        try:
+            status_txt = await resolve_registration_status(
+                token=raw_token, trail_id=trail_id, user_id=attendee_id, cached=cached,
+            )
+        except EligibilityUnavailable:
+            # trails-svc down or circuit open: degraded policy decides
+            if settings.elig_degraded_policy != "accept_and_verify":
+                raise _reject(503, "Eligibility check unavailable, try again shortly", "unavailable")
+            status_txt, provisional = "confirmed", True
+    if status_txt != "confirmed":
+        raise _reject(403, "Not confirmed for this trail", "not_confirmed")
+
+    # replay guard: authoritative, atomic claim; first caller wins
+    with _stage("claim"):
+        if not await used_qr_once(jti, settings.qr_ttl_seconds):
+            raise _reject(409, "QR already used", "replayed")
+
+    # write check-in (DB idempotency guarantees one per user+trail)
+    with _stage("record"):
+        try:
+            obj, created = await record_checkin(
+                db,
+                trail_id=trail_id,
+                org_id=uuid.UUID(qr["org_id"]),
+                user_id=attendee_id,
+                checked_by=None,
+                method=PROVISIONAL_METHOD if provisional else "qr",
+                emit_event=not provisional,  # provisional: the verifier emits it once confirmed
+            )
+        except Exception:
+            await release_qr(jti)  # the scan failed; let the attendee retry with the same QR
+            SCAN_OUTCOMES.labels("error").inc()
+            raise
+    # the QR is burned for good only now: kiosk streams for the trail rotate it away
+    await publish_consumed(trail_id, jti)
+
+    # checkins.recorded was committed to the outbox with the row; wake the relay
+    if created and not provisional:
+        outbox_notify()
+    SCAN_OUTCOMES.labels(("provisional" if provisional else "created") if created else "duplicate").inc()
+
+    async def after() -> None:
+        if not created:
+            return
+        with _stage("after"):
+            steps: list[Awaitable[Any]] = [record_arrivals([(obj.trail_id, obj.checked_at)])]
+            if provisional:
+                ttl = int(claims.get("exp", 0) - time.time())
+                steps.append(hold_for_verification(obj.id, raw_token, ttl))
+            # award points: NATS via the outbox, or the HTTP fallback (provisional: once verified)
+            elif not settings.use_nats_for_points:
+                evt = checkin_event(obj)
+                steps.append(points_award_checkin(
+                    token=raw_token, trail_id=evt["trail_id"], user_id=evt["user_id"],
+                    org_id=evt["org_id"], checked_at=evt["checked_at"],
+                ))
+            await asyncio.gather(*steps, return_exceptions=True)
+
+    return ScanResult(checkin=obj, created=created, after=after)
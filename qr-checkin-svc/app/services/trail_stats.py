@@ -0,0 +1,142 @@
+from __future__ import annotations
+import time
+import uuid
+from collections import Counter as Tally
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.config import get_settings
+from ..core.redis import get_redis
+from ..models import Checkin
+
+settings = get_settings()
+
+# Live arrival counters per trail, maintained on the scan path:
+#   stats:trail:{trail_id}     hash count / first_at / last_at (epoch s) / reconciled_at
+#   stats:trail:{trail_id}:pm  hash minute (epoch s // 60) -> arrivals in that minute
+# The checkins table stays the source of truth; counters are rebuilt from it
+# when missing (cold start, eviction) and every STATS_RECONCILE_SECONDS.
+
+_RECORD_LUA = """
+local ts = tonumber(ARGV[1])
+redis.call('HINCRBY', KEYS[1], 'count', 1)
+local first = tonumber(redis.call('HGET', KEYS[1], 'first_at'))
+if not first or ts < first then redis.call('HSET', KEYS[1], 'first_at', ts) end
+local last = tonumber(redis.call('HGET', KEYS[1], 'last_at'))
+if not last or ts > last then redis.call('HSET', KEYS[1], 'last_at', ts) end
+redis.call('HINCRBY', KEYS[2], math.floor(ts / 60), 1)
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+return 1
+"""
+
+_record_script = None
+
+def _stats_key(trail_id: uuid.UUID | str) -> str:
+    return f"stats:trail:{trail_id}"
+
+def _pm_key(trail_id: uuid.UUID | str) -> str:
+    return f"stats:trail:{trail_id}:pm"
+
+def _epoch(dt: datetime) -> int:
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+def _script():
+    global _record_script
+    if _record_script is None:
+        _record_script = get_redis().register_script(_RECORD_LUA)
+    return _record_script
+
+async def record_arrivals(arrivals: Iterable[Tuple[uuid.UUID, datetime]]) -> None:
+    """
+    Count newly created check-ins (trail_id, checked_at). One atomic script per
+    arrival, pipelined into a single round trip. Best-effort: a lost update is
+    repaired by the next reconciliation.
+    """
+    arrivals = list(arrivals)
+    if not arrivals:
+        return
+    try:
+        script = _script()
+        pipe = get_redis().pipeline(transaction=False)
+        for trail_id, checked_at in arrivals:
+            await script(
+                keys=[_stats_key(trail_id), _pm_key(trail_id)],
+                args=[_epoch(checked_at), settings.stats_ttl_seconds],
+                client=pipe,
+            )
+        await pipe.execute()
+    except Exception:
+        pass
+
+async def _from_db(db: AsyncSession, trail_id: uuid.UUID, since_minute: int) -> Dict[str, Any]:
+    count, first, last = (await db.execute(
+        select(func.count(Checkin.id), func.min(Checkin.checked_at), func.max(Checkin.checked_at))
+        .where(Checkin.trail_id == trail_id)
+    )).one()
+    recent = (await db.execute(
+        select(Checkin.checked_at)
+        .where(Checkin.trail_id == trail_id, Checkin.checked_at >= datetime.fromtimestamp(since_minute * 60, timezone.utc))
+    )).scalars().all()
+    return {
+        "count": int(count or 0),
+        "first_at": _epoch(first) if first else None,
+        "last_at": _epoch(last) if last else None,
+        "per_minute": dict(Tally(_epoch(ts) // 60 for ts in recent)),
+    }
+
+async def _reconcile(db: AsyncSession, trail_id: uuid.UUID, since_minute: int) -> Dict[str, Any]:
+    """Rebuild the counters from the checkins table and store them."""
+    snap = await _from_db(db, trail_id, since_minute)
+    try:
+        fields: Dict[str, Any] = {"count": snap["count"], "reconciled_at": int(time.time())}
+        if snap["first_at"] is not None:
+            fields["first_at"] = snap["first_at"]
+            fields["last_at"] = snap["last_at"]
+        pipe = get_redis().pipeline(transaction=True)
+        pipe.delete(_stats_key(trail_id), _pm_key(trail_id))
+        pipe.hset(_stats_key(trail_id), mapping=fields)
+        if snap["per_minute"]:
+            pipe.hset(_pm_key(trail_id), mapping=snap["per_minute"])
+        pipe.expire(_stats_key(trail_id), settings.stats_ttl_seconds)
+        pipe.expire(_pm_key(trail_id), settings.stats_ttl_seconds)
+        await pipe.execute()
+    except Exception:
+        pass
+    return snap
+
+def _window() -> list[int]:
+    now_minute = int(time.time()) // 60
+    return list(range(now_minute - settings.stats_window_minutes + 1, now_minute + 1))
+
+def _with_window(snap: Dict[str, Any], minutes: list[int]) -> Dict[str, Any]:
+    """per_minute as [(minute, count)] over the window, oldest first, zeros included."""
+    return {**snap, "per_minute": [(m, snap["per_minute"].get(m, 0)) for m in minutes]}
+
+async def get_trail_stats(db: AsyncSession, trail_id: uuid.UUID) -> Tuple[Dict[str, Any], str]:
+    """
+    Counters for the stats endpoint and where they came from:
+    "live" (Redis), "reconciled" (rebuilt from the DB just now) or "db" (Redis down).
+    """
+    minutes = _window()
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.hgetall(_stats_key(trail_id))
+        pipe.hmget(_pm_key(trail_id), [str(m) for m in minutes])
+        live, buckets = await pipe.execute()
+    except Exception:
+        return _with_window(await _from_db(db, trail_id, minutes[0]), minutes), "db"
+    reconciled_at = int(live.get("reconciled_at") or 0)
+    if not live or time.time() - reconciled_at > settings.stats_reconcile_seconds:
+        return _with_window(await _reconcile(db, trail_id, minutes[0]), minutes), "reconciled"
+    return {
+        "count": int(live.get("count") or 0),
+        "first_at": int(live["first_at"]) if live.get("first_at") else None,
+        "last_at": int(live["last_at"]) if live.get("last_at") else None,
+        "per_minute": [(m, int(v or 0)) for m, v in zip(minutes, buckets)],
+    }, "live"
@@ -0,0 +1,83 @@
+"""
+Concurrency benchmark for services.checkins.record_checkin.
+
+Fires N concurrent scans (distinct attendees, one trail) plus a second wave
+of duplicate scans, against the Postgres in DATABASE_URL, and reports DB
+round trips per scan and latency percentiles.
+
+    cd qr-checkin-svc
+    python -m bench.bench_checkin_insert --scans 500
+
+Round trips are counted at the DBAPI layer: every cursor execute plus every
+COMMIT/ROLLBACK (including the reset when a connection returns to the
+pool). Use a throwaway database; the trail's rows are deleted at the end.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+from sqlalchemy import delete, event
+
+from app.db import async_session_maker, engine, init_db
+from app.models import Checkin, OutboxEvent
+from app.services.checkins import record_checkin
+
+_round_trips = 0
+
+def _count(*_args, **_kwargs):
+    global _round_trips
+    _round_trips += 1
+
+def _pct(samples: list[float], p: float) -> float:
+    s = sorted(samples)
+    return s[min(len(s) - 1, int(round(p / 100 * (len(s) - 1))))]
+
+async def _wave(trail_id: uuid.UUID, org_id: uuid.UUID, users: list[uuid.UUID]) -> tuple[list[float], int]:
+    async def one(uid: uuid.UUID) -> tuple[float, bool]:
+        t0 = time.perf_counter()
+        async with async_session_maker() as db:
+            _, created = await record_checkin(db, trail_id=trail_id, org_id=org_id, user_id=uid)
+        return (time.perf_counter() - t0) * 1000, created
+
+    res = await asyncio.gather(*(one(u) for u in users))
+    return [ms for ms, _ in res], sum(1 for _, c in res if c)
+
+def _report(label: str, lat: list[float], created: int, trips: int, n: int) -> None:
+    print(
+        f"{label:<10} scans={n} created={created} round_trips/scan={trips / n:.2f} "
+        f"p50={statistics.median(lat):.1f}ms p95={_pct(lat, 95):.1f}ms p99={_pct(lat, 99):.1f}ms max={max(lat):.1f}ms"
+    )
+
+async def main(scans: int) -> None:
+    global _round_trips
+    await init_db()
+    sync_engine = engine.sync_engine
+    event.listen(sync_engine, "before_cursor_execute", _count)
+    event.listen(sync_engine, "commit", _count)
+    event.listen(sync_engine, "rollback", _count)
+
+    trail_id, org_id = uuid.uuid4(), uuid.uuid4()
+    users = [uuid.uuid4() for _ in range(scans)]
+    try:
+        _round_trips = 0
+        lat, created = await _wave(trail_id, org_id, users)
+        _report("first", lat, created, _round_trips, scans)
+
+        _round_trips = 0
+        lat, created = await _wave(trail_id, org_id, users)  # every scan now conflicts
+        _report("duplicate", lat, created, _round_trips, scans)
+    finally:
+        async with async_session_maker() as db:
+            await db.execute(delete(Checkin).where(Checkin.trail_id == trail_id))
+            await db.execute(delete(OutboxEvent).where(OutboxEvent.payload.contains(str(trail_id))))
+            await db.commit()
+        await engine.dispose()
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--scans", type=int, default=500)
+    args = ap.parse_args()
+    asyncio.run(main(args.scans))
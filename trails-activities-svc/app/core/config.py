@@ -7,12 +7,36 @@ class Settings(BaseSettings):
     database_url: str = Field(..., alias="DATABASE_URL")
     auth_jwks_url: str = Field(..., alias="AUTH_JWKS_URL")
     token_issuer: str = Field("authentication-svc", alias="TOKEN_ISSUER")
+    jwks_ttl_seconds: int = Field(default=3600, alias="JWKS_TTL_SECONDS")
+    jwks_refresh_ahead_seconds: int = Field(default=300, alias="JWKS_REFRESH_AHEAD_SECONDS")
+    jwks_unknown_kid_cooldown_seconds: int = Field(default=30, alias="JWKS_UNKNOWN_KID_COOLDOWN_SECONDS")
+    claims_cache_max_entries: int = Field(default=10000, alias="CLAIMS_CACHE_MAX_ENTRIES")
 
     # Invitations
     invite_secret: str | None = Field(default=None, alias="INVITE_SECRET")
     invite_ttl_hours: int = Field(default=168, alias="INVITE_TTL_HOURS")
     invite_base_url: str = Field(default="http://localhost:8002/invites", alias="INVITE_BASE_URL")
 
+    # NATS (registration / trail change events)
+    nats_urls: str = Field("nats://127.0.0.1:4222", alias="NATS_URLS")
+    nats_subject_registrations: str = Field("registrations.changed", alias="NATS_SUBJECT_REGISTRATIONS")
+    nats_subject_trails: str = Field("trails.changed", alias="NATS_SUBJECT_TRAILS")
+    enable_nats_events: bool = Field(default=True, alias="ENABLE_NATS_EVENTS")
+    # events are written to an outbox table with the change and relayed to NATS in batches
+    outbox_batch_size: int = Field(default=500, alias="OUTBOX_BATCH_SIZE")
+    outbox_poll_interval_seconds: float = Field(default=1.0, alias="OUTBOX_POLL_INTERVAL_SECONDS")
+    outbox_max_backoff_seconds: int = Field(default=60, alias="OUTBOX_MAX_BACKOFF_SECONDS")
+
+    # Redis (Idempotency-Key records)
+    redis_url: str = Field("redis://127.0.0.1:6379/0", alias="REDIS_URL")
+    # Idempotency-Key on retried POSTs: stored response TTL, claim TTL while the first
+    # request runs, how long a concurrent duplicate waits for it, largest response kept
+    idempotency_enabled: bool = Field(default=True, alias="IDEMPOTENCY_ENABLED")
+    idempotency_ttl_seconds: int = Field(default=86400, alias="IDEMPOTENCY_TTL_SECONDS")
+    idempotency_lock_seconds: int = Field(default=30, alias="IDEMPOTENCY_LOCK_SECONDS")
+    idempotency_wait_seconds: float = Field(default=10.0, alias="IDEMPOTENCY_WAIT_SECONDS")
+    idempotency_max_body_bytes: int = Field(default=262144, alias="IDEMPOTENCY_MAX_BODY_BYTES")
+
     class Config:
         env_file = ".env"
         env_prefix = ""
@@ -0,0 +1,33 @@
+from __future__ import annotations
+import json
+from typing import Sequence
+from nats.aio.client import Client as NATS
+from .config import get_settings
+
+_settings = get_settings()
+_nats = NATS()
+
+async def nats_connect():
+    if not _nats.is_connected:
+        servers: Sequence[str] = [u.strip() for u in _settings.nats_urls.split(",") if u.strip()]
+        await _nats.connect(servers=servers)
+
+async def nats_close():
+    try:
+        if _nats.is_connected:
+            await _nats.drain()
+    except Exception:
+        pass
+
+async def publish_event(subject: str, evt: dict):
+    await nats_connect()
+    await _nats.publish(subject, json.dumps(evt).encode("utf-8"))
+
+async def publish_many(msgs: list[tuple[str, bytes]]):
+    """Publish (subject, data) pairs as one burst: buffered publishes, single flush."""
+    if not msgs:
+        return
+    await nats_connect()
+    for subject, data in msgs:
+        await _nats.publish(subject, data)
+    await _nats.flush()
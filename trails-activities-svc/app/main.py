@@ -5,15 +5,38 @@ from fastapi.middleware.cors import CORSMiddleware
 from prometheus_fastapi_instrumentator import Instrumentator
 
 from .db import init_db
+from .core.jwks import get_keystore
+from .core.idempotency import IdempotencyMiddleware
+from .deps import get_claims
+from .core.nats import nats_connect, nats_close
+from .services.outbox import relay as outbox_relay
 from .routers import trails, registrations, users, invites  
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
+    # JWKS keys are fetched and refreshed ahead of expiry in the background
+    await get_keystore().start()
+    # registration/trail events sit in the outbox until NATS is reachable
+    try:
+        await nats_connect()
+    except Exception:
+        pass
+    await outbox_relay.start()
     yield
+    await outbox_relay.stop()
+    await get_keystore().stop()
+    try:
+        await nats_close()
+    except Exception:
+        pass
 
 app = FastAPI(title="trails-activities-svc", lifespan=lifespan)
 
+# retried self-registrations with the same Idempotency-Key replay the first response
+# (added before CORS so CORS wraps replays too)
+app.add_middleware(IdempotencyMiddleware, routes=[("POST", r"/registrations/trails/[^/]+/self")], claims=get_claims)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -5,6 +5,7 @@ from datetime import datetime, timezone
 from enum import Enum
 
 from sqlalchemy import (
+    BigInteger,
     CheckConstraint,
     Enum as SqlEnum,
     ForeignKey,
@@ -87,3 +88,19 @@ class Registration(Base):
     )
 
     trail: Mapped[Trail] = relationship("Trail", back_populates="registrations")
+
+# Transactional outbox: registrations.changed / trails.changed rows written in the same
+# transaction as the change, drained to NATS by a relay (services/outbox.py)
+class OutboxEvent(Base):
+    __tablename__ = "outbox_events"
+    id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    subject: Mapped[str] = mapped_column(String(128), nullable=False)
+    payload: Mapped[str] = mapped_column(Text, nullable=False)  # JSON
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+    available_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)  # next attempt
+    attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+
+    __table_args__ = (
+        Index("ix_outbox_available", "available_at", "id"),
+    )
@@ -9,6 +9,8 @@ from ..core.config import get_settings
 from ..core.invite import sign_invite, verify_invite
 from ..models import Trail, TrailStatus, Registration, RegStatus
 from ..schemas import RegistrationRead
+from ..services.events import registration_changed
+from ..services.outbox import outbox_notify
 
 router = APIRouter(prefix="/invites", tags=["invites"])
 settings = get_settings()
@@ -117,8 +119,10 @@ async def accept_invite(
         note="via invite",
     )
     db.add(reg)
+    registration_changed(db, reg)
     await db.commit()
     await db.refresh(reg)
+    outbox_notify()
     return RegistrationRead(
         id=reg.id, trail_id=reg.trail_id, user_id=reg.user_id, org_id=reg.org_id,
         status=reg.status.value, note=reg.note
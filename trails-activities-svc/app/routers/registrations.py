@@ -9,6 +9,8 @@ from sqlalchemy import select, func
 from ..deps import get_db, get_claims
 from ..models import Trail, TrailStatus, Registration, RegStatus
 from ..schemas import RegistrationCreateSelf, RegistrationCreateByOrganiser, RegistrationRead
+from ..services.events import registration_changed
+from ..services.outbox import outbox_notify
 
 router = APIRouter(prefix="/registrations", tags=["registrations"])
 
@@ -50,8 +52,10 @@ async def self_register(
 
     reg = Registration(trail_id=t.id, user_id=user_id, org_id=t.org_id, status=status_val, note=payload.note)
     db.add(reg)
+    registration_changed(db, reg)
     await db.commit()
     await db.refresh(reg)
+    outbox_notify()
     return RegistrationRead(
         id=reg.id, trail_id=reg.trail_id, user_id=reg.user_id, org_id=reg.org_id,
         status=reg.status.value, note=reg.note
@@ -82,8 +86,10 @@ async def organiser_register(
 
     reg = Registration(trail_id=t.id, user_id=payload.user_id, org_id=t.org_id, status=status_val, note=payload.note)
     db.add(reg)
+    registration_changed(db, reg)
     await db.commit()
     await db.refresh(reg)
+    outbox_notify()
     return RegistrationRead(
         id=reg.id, trail_id=reg.trail_id, user_id=reg.user_id, org_id=reg.org_id,
         status=reg.status.value, note=reg.note
@@ -104,7 +110,9 @@ async def approve_registration(
     if reg.status not in (RegStatus.PENDING, RegStatus.WAITLISTED):
         raise HTTPException(status_code=400, detail="Only pending/waitlisted can be approved")
     reg.status = RegStatus.APPROVED
+    registration_changed(db, reg)
     await db.commit(); await db.refresh(reg)
+    outbox_notify()
     return RegistrationRead(
         id=reg.id, trail_id=reg.trail_id, user_id=reg.user_id, org_id=reg.org_id,
         status=reg.status.value, note=reg.note
@@ -133,7 +141,9 @@ async def confirm_registration(
         raise HTTPException(status_code=409, detail="Trail capacity full")
 
     reg.status = RegStatus.CONFIRMED
+    registration_changed(db, reg)
     await db.commit(); await db.refresh(reg)
+    outbox_notify()
     return RegistrationRead(
         id=reg.id, trail_id=reg.trail_id, user_id=reg.user_id, org_id=reg.org_id,
         status=reg.status.value, note=reg.note
@@ -154,7 +164,9 @@ async def reject_registration(
     if reg.status not in (RegStatus.PENDING, RegStatus.APPROVED, RegStatus.WAITLISTED):
         raise HTTPException(status_code=400, detail="Only pending/approved/waitlisted can be rejected")
     reg.status = RegStatus.REJECTED
+    registration_changed(db, reg)
     await db.commit(); await db.refresh(reg)
+    outbox_notify()
     return RegistrationRead(
         id=reg.id, trail_id=reg.trail_id, user_id=reg.user_id, org_id=reg.org_id,
         status=reg.status.value, note=reg.note
@@ -175,7 +187,9 @@ async def organiser_cancel_registration(
     if reg.status in (RegStatus.CANCELLED, RegStatus.REJECTED):
         raise HTTPException(status_code=400, detail="Already inactive")
     reg.status = RegStatus.CANCELLED
+    registration_changed(db, reg)
     await db.commit(); await db.refresh(reg)
+    outbox_notify()
     return RegistrationRead(
         id=reg.id, trail_id=reg.trail_id, user_id=reg.user_id, org_id=reg.org_id,
         status=reg.status.value, note=reg.note
@@ -193,5 +207,7 @@ async def cancel_own_registration(
     if str(reg.user_id) != claims["sub"]:
         raise HTTPException(status_code=403, detail="Not your registration")
     reg.status = RegStatus.CANCELLED
+    registration_changed(db, reg)
     await db.commit()
+    outbox_notify()
     return
\ No newline at end of file
@@ -10,6 +10,8 @@ from sqlalchemy import select
 from ..deps import get_db, get_claims
 from ..models import Trail, TrailStatus, Registration, RegStatus
 from ..schemas import TrailCreate, TrailUpdate, TrailRead
+from ..services.events import trail_changed
+from ..services.outbox import outbox_notify
 
 router = APIRouter(prefix="/trails", tags=["trails"])
 
@@ -99,8 +101,11 @@ async def create_trail(
         created_by=uuid.UUID(claims["sub"]),
     )
     db.add(t)
+    await db.flush()  # assigns t.id for the event
+    trail_changed(db, t)
     await db.commit()
     await db.refresh(t)
+    outbox_notify()
     return TrailRead(
         id=t.id, org_id=t.org_id, title=t.title, description=t.description,
         starts_at=t.starts_at, ends_at=t.ends_at, location=t.location,
@@ -134,8 +139,10 @@ async def update_trail(
         except Exception:
             raise HTTPException(status_code=400, detail="Invalid status")
 
+    trail_changed(db, t)
     await db.commit()
     await db.refresh(t)
+    outbox_notify()
     return TrailRead(
         id=t.id, org_id=t.org_id, title=t.title, description=t.description,
         starts_at=t.starts_at, ends_at=t.ends_at, location=t.location,
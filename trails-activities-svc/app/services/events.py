@@ -0,0 +1,47 @@
+from __future__ import annotations
+from datetime import datetime, timezone
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.config import get_settings
+from ..models import Registration, Trail
+from .outbox import enqueue
+
+settings = get_settings()
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+def registration_changed(db: AsyncSession, reg: Registration) -> None:
+    """
+    Queue a `registrations.changed` event in the caller's transaction (outbox) so
+    consumers (qr-checkin-svc) can keep a local (trail_id, user_id) -> status
+    projection. Call before commit; a cancellation is never lost to a NATS outage.
+    evt = {"trail_id", "user_id", "org_id", "status", "changed_at"}
+    """
+    if not settings.enable_nats_events:
+        return
+    enqueue(db, settings.nats_subject_registrations, {
+        "trail_id": str(reg.trail_id),
+        "user_id": str(reg.user_id),
+        "org_id": str(reg.org_id),
+        "status": reg.status.value,
+        "changed_at": _now_iso(),
+    })
+
+def trail_changed(db: AsyncSession, t: Trail) -> None:
+    """
+    Queue a `trails.changed` event carrying schedule/status metadata in the
+    caller's transaction. t.id must be assigned (flush first for new trails).
+    evt = {"trail_id", "org_id", "status", "starts_at", "ends_at", "changed_at"}
+    """
+    if not settings.enable_nats_events:
+        return
+    enqueue(db, settings.nats_subject_trails, {
+        "trail_id": str(t.id),
+        "org_id": str(t.org_id),
+        "status": t.status.value,
+        "starts_at": t.starts_at.isoformat(),
+        "ends_at": t.ends_at.isoformat(),
+        "changed_at": _now_iso(),
+    })
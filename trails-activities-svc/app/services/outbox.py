@@ -0,0 +1,123 @@
+from __future__ import annotations
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+
+from prometheus_client import Counter, Gauge
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.config import get_settings
+from ..core.nats import publish_many
+from ..db import async_session_maker
+from ..models import OutboxEvent
+
+settings = get_settings()
+
+OUTBOX_DEPTH = Gauge("trails_outbox_depth", "Outbox events waiting to be published")
+OUTBOX_LAG = Gauge("trails_outbox_lag_seconds", "Age of the oldest unpublished outbox event")
+OUTBOX_PUBLISHED = Counter("trails_outbox_published_total", "Outbox events published to NATS")
+OUTBOX_FAILURES = Counter("trails_outbox_publish_failures_total", "Outbox relay batches that failed to publish")
+
+_wakeup = asyncio.Event()
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+def enqueue(db: AsyncSession, subject: str, evt: dict) -> None:
+    """Stage an event in the caller's transaction; it is published only if that commits."""
+    db.add(OutboxEvent(subject=subject, payload=json.dumps(evt)))
+
+def outbox_notify() -> None:
+    """Nudge the relay after a commit instead of waiting for the next poll."""
+    _wakeup.set()
+
+def _backoff(attempts: int) -> timedelta:
+    return timedelta(seconds=min(2 ** attempts, settings.outbox_max_backoff_seconds))
+
+async def drain_once(batch_size: int | None = None) -> int:
+    """
+    Publish one batch of due events, in commit order, and delete them. SKIP LOCKED
+    lets several replicas drain concurrently without double-sending. Delivery is
+    at-least-once: events carry the full current status, so a replay is harmless.
+    """
+    n = batch_size or settings.outbox_batch_size
+    async with async_session_maker() as db:
+        rows = (await db.execute(
+            select(OutboxEvent)
+            .where(OutboxEvent.available_at <= _now())
+            .order_by(OutboxEvent.id)
+            .limit(n)
+            .with_for_update(skip_locked=True)
+        )).scalars().all()
+        if not rows:
+            return 0
+        try:
+            await publish_many([(r.subject, r.payload.encode("utf-8")) for r in rows])
+        except Exception as e:
+            OUTBOX_FAILURES.inc()
+            for r in rows:
+                r.attempts += 1
+                r.available_at = _now() + _backoff(r.attempts)
+                r.last_error = str(e)[:500]
+            await db.commit()
+            return 0
+        await db.execute(delete(OutboxEvent).where(OutboxEvent.id.in_([r.id for r in rows])))
+        await db.commit()
+        OUTBOX_PUBLISHED.inc(len(rows))
+        return len(rows)
+
+async def refresh_gauges() -> None:
+    async with async_session_maker() as db:
+        depth, oldest = (await db.execute(
+            select(func.count(OutboxEvent.id), func.min(OutboxEvent.created_at))
+        )).one()
+    OUTBOX_DEPTH.set(depth or 0)
+    if oldest is not None and oldest.tzinfo is None:
+        oldest = oldest.replace(tzinfo=timezone.utc)
+    OUTBOX_LAG.set((_now() - oldest).total_seconds() if oldest else 0.0)
+
+class OutboxRelay:
+    """
+    Background task draining the outbox to NATS. Wakes on outbox_notify() or
+    every poll interval, so events queued while NATS was down go out once it is back.
+    """
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                while await drain_once() >= settings.outbox_batch_size:
+                    pass  # backlog: keep draining without waiting
+                await refresh_gauges()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                pass  # DB hiccup; try again on the next tick
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout=settings.outbox_poll_interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            _wakeup.clear()
+
+    async def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+        # last attempt so a clean shutdown doesn't leave fresh events behind
+        try:
+            await drain_once()
+        except Exception:
+            pass
+
+relay = OutboxRelay()